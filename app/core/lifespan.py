@@ -1,52 +1,93 @@
 # app/core/lifespan.py
 import asyncio
 from contextlib import asynccontextmanager
+from typing import List, Tuple
 from fastapi import FastAPI
 
-from app.core.scheduler import scheduler
-from app.db.connection import create_connection
-from app.utils.app_state import get_user_db, set_fin_db, set_user_db, get_fin_db, get_tickers, get_sql_path
-from app.utils.file import open_sql_file
+from app.core.scheduler import schedule_job, scheduler
+from app.core.startup import StartupStep, run_startup_pipeline
+from app.db.connection import create_connection_pool
+from app.utils.app_state import get_user_db, set_data_updated_at, set_fin_db, set_user_db, get_fin_db, get_tickers
+from app.db.statements import get_sql
 from app.tasks.jobs import run_index_statistics_on_startup, run_stock_prediction_on_startup, run_stock_rank_on_startup, run_stock_statistics_on_startup, update_financial_data_job, run_index_prediction_on_startup, send_scheduled_email_notifications
 from app.tasks.model import load_model
+from app.services.mailer import mail_queue
 from app.services.data_ingest import save_stock_category_json, save_stock_detail, save_stock_data, save_index_data, store_ticker_symbols
-from app.repositories.meta import create_table
+from app.repositories.meta import add_column_if_missing, create_table, get_last_data_update
+from app.repositories.notifications import backfill_next_fire_times
 
-# Initialize data on startup, fetch stock details and data
-async def init_data_async(app: FastAPI):
-    await asyncio.to_thread(save_stock_detail) # to_thread can avoid blocking the event loop
-    await asyncio.to_thread(save_stock_category_json)
-    await asyncio.to_thread(create_table, get_fin_db(), "index_price", open_sql_file(get_sql_path("create_stock_price_table")))
-    await asyncio.to_thread(create_table, get_fin_db(), "stock_price", open_sql_file(get_sql_path("create_index_price_table")))
-    await asyncio.to_thread(create_table, get_fin_db(), "index_statistics", open_sql_file(get_sql_path("create_index_statistics_table")))
-    await asyncio.to_thread(create_table, get_fin_db(), "stock_statistics", open_sql_file(get_sql_path("create_stock_statistics_table")))
-    await asyncio.to_thread(create_table, get_fin_db(), "index_predictions", open_sql_file(get_sql_path("create_index_predictions_table")))
-    await asyncio.to_thread(create_table, get_fin_db(), "stock_predictions", open_sql_file(get_sql_path("create_stock_predictions_table")))
-    await asyncio.to_thread(create_table, get_fin_db(), "stock_rank", open_sql_file(get_sql_path("create_stock_rank_table")))
-    await asyncio.to_thread(create_table, get_user_db(), "user", open_sql_file(get_sql_path("create_user_table")))
-    await asyncio.to_thread(create_table, get_user_db(), "bookmark", open_sql_file(get_sql_path("create_bookmark_table")))
-    await asyncio.to_thread(create_table, get_user_db(), "notification_setting", open_sql_file(get_sql_path("create_notification_setting_table")))
-    await asyncio.to_thread(store_ticker_symbols, app) 
+# create tables in order, any table that fails raises so the critical startup steps gate on a complete schema
+def create_tables(db, tables: List[Tuple[str, str]]):
+    failed = [table_name for table_name, template in tables if not create_table(db, table_name, get_sql(template))]
+    if failed:
+        raise RuntimeError(f"Failed to create tables: {', '.join(failed)}")
+
+# create financial.db tables
+def create_fin_tables():
+    create_tables(get_fin_db(), [
+        ("index_price", "create_index_price_table"),
+        ("stock_price", "create_stock_price_table"),
+        ("stock_price_gap_attempt", "create_stock_price_gap_attempt_table"),
+        ("index_statistics", "create_index_statistics_table"),
+        ("stock_statistics", "create_stock_statistics_table"),
+        ("index_predictions", "create_index_predictions_table"),
+        ("stock_predictions", "create_stock_predictions_table"),
+        ("stock_rank", "create_stock_rank_table"),
+    ])
+    add_column_if_missing(get_fin_db(), "stock_rank", "rank", "INTEGER")
+
+# create user.db tables
+def create_user_tables():
+    create_tables(get_user_db(), [
+        ("user", "create_user_table"),
+        ("bookmark", "create_bookmark_table"),
+        ("notification_setting", "create_notification_setting_table"),
+    ])
+    add_column_if_missing(get_user_db(), "notification_setting", "next_fire_at", "TEXT")
+    create_tables(get_user_db(), [("idx_notification_setting_next_fire_at", "create_notification_setting_next_fire_index")])
+    backfill_next_fire_times()
 
-    await asyncio.to_thread(save_stock_data, get_tickers())
-    await asyncio.to_thread(save_index_data)
+# download stock data, a failed chunk only fails the step when no ticker was downloaded at all
+def load_stock_data():
+    tickers = get_tickers()
+    result = save_stock_data(tickers)
+    failed = result.get("failed downloads")
+    if result["success"] or failed is None or len(failed) >= len(tickers):
+        return result
+    # the statistics, prediction and rank steps still run for the tickers that did download
+    print(f"⚠️ Continuing startup without {len(failed)} tickers that could not be downloaded: {failed}")
+    return {**result, "success": True}
 
-    await asyncio.to_thread(load_model) # load ML model and set parameters
+# Startup steps and their dependencies; critical steps gate the /ready endpoint
+def build_startup_steps(app: FastAPI) -> List[StartupStep]:
+    return [
+        StartupStep("fin_tables", create_fin_tables, critical=True),
+        StartupStep("user_tables", create_user_tables, critical=True),
+        StartupStep("stock_detail", save_stock_detail, deps=["fin_tables"], critical=True),
+        StartupStep("stock_category_json", save_stock_category_json, deps=["stock_detail"], critical=True),
+        StartupStep("tickers", lambda: store_ticker_symbols(app), deps=["stock_detail"], critical=True),
+        StartupStep("stock_data", load_stock_data, deps=["tickers"]),
+        StartupStep("index_data", save_index_data, deps=["fin_tables"]),
+        StartupStep("model", load_model, deps=["tickers"]), # load ML model and set parameters
+        StartupStep("index_statistics", run_index_statistics_on_startup, deps=["index_data"]),
+        StartupStep("stock_statistics", lambda: run_stock_statistics_on_startup(get_tickers()), deps=["stock_data"]),
+        StartupStep("index_prediction", run_index_prediction_on_startup, deps=["index_statistics", "model"]),
+        StartupStep("stock_prediction", lambda: run_stock_prediction_on_startup(get_tickers()), deps=["stock_statistics", "model"]),
+        StartupStep("stock_rank", lambda: run_stock_rank_on_startup(get_tickers()), deps=["stock_prediction"]),
+    ]
+
+# Initialize data on startup, fetch stock details and data
+async def init_data_async(app: FastAPI):
+    await run_startup_pipeline(build_startup_steps(app))
 
-    await asyncio.to_thread(run_index_statistics_on_startup)
-    await asyncio.to_thread(run_stock_statistics_on_startup, get_tickers())
-    await asyncio.to_thread(run_index_prediction_on_startup)
-    await asyncio.to_thread(run_stock_prediction_on_startup, get_tickers()) 
-    await asyncio.to_thread(run_stock_rank_on_startup, get_tickers())
-    
 # Lifespan context manager for FastAPI app
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # server startup event:
 
-    # build global DB connection and attach to app.state
-    app.state.fin_db = create_connection("financial.db")  # financial data
-    app.state.user_db = create_connection("user.db")  # user data
+    # build global DB connection pools (one connection per thread) and attach to app.state
+    app.state.fin_db = create_connection_pool("financial.db")  # financial data
+    app.state.user_db = create_connection_pool("user.db")  # user data
     # Synchronize to utils.app_state for other modules to access.
     set_fin_db(app.state.fin_db)
     set_user_db(app.state.user_db)
@@ -54,13 +95,17 @@ async def lifespan(app: FastAPI):
         print("✅ Both database connections established.")
     else:
         print("⚠️ Warning: One or both DB connections failed.")
+    # Last-Modified starts from the stored data, so a restart alone does not make unchanged data look new
+    last_update = get_last_data_update()
+    if last_update is not None:
+        set_data_updated_at(last_update.timestamp())
 
     # initalize data run in background
     asyncio.create_task(init_data_async(app))
 
     # schedule daily stock data update job at midnight using a cron trigger to run once a day at 00:00.
-    scheduler.add_job(update_financial_data_job, 'cron', hour=0, minute=0)
-    scheduler.add_job(send_scheduled_email_notifications, 'interval', minutes=1)  # Schedule email notifications at 8:00 AM daily
+    schedule_job(update_financial_data_job, 'cron', hour=0, minute=0)
+    schedule_job(send_scheduled_email_notifications, 'interval', minutes=1)  # due notifications are checked every minute on the scheduler thread pool
     scheduler.start()
 
     try:
@@ -69,10 +114,12 @@ async def lifespan(app: FastAPI):
         # server shutdown event:
         # close global DB connection
         if getattr(app.state, "fin_db", None):
-            app.state.fin_db.close()
-            print("financial.db connection closed.")
+            app.state.fin_db.close_all()
+            print("financial.db connections closed.")
         if getattr(app.state, "user_db", None):
-            app.state.user_db.close()
-            print("user_db connection closed.")
+            app.state.user_db.close_all()
+            print("user_db connections closed.")
         # shutdown scheduler
-        scheduler.shutdown()
\ No newline at end of file
+        scheduler.shutdown()
+        # deliver queued emails and quit the SMTP sessions off the event loop, bounded by MAIL_CLOSE_TIMEOUT_SECONDS
+        await asyncio.to_thread(mail_queue.close)
\ No newline at end of file
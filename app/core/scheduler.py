@@ -1,4 +1,15 @@
 # app/core/scheduler.py
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
+from apscheduler.executors.asyncio import AsyncIOExecutor
+from apscheduler.executors.pool import ProcessPoolExecutor, ThreadPoolExecutor
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 """import importlib
@@ -8,5 +19,136 @@ try:
 except (ImportError, AttributeError) as e:
 	raise ImportError("apscheduler is required for AsyncIOScheduler; install it with: pip install APScheduler") from e"""
 
+# threads for sync jobs (SQLite, SMTP, chart rendering), separate from the event loop and its default executor
+SCHEDULER_THREAD_WORKERS = int(os.getenv("SCHEDULER_THREAD_WORKERS", "4"))
+# processes for CPU-bound sync jobs registered with executor="processes", the job function must be importable
+SCHEDULER_PROCESS_WORKERS = int(os.getenv("SCHEDULER_PROCESS_WORKERS", "1"))
+# a run that starts later than this (e.g. the previous run was still going) is counted as missed instead of run late
+SCHEDULER_MISFIRE_GRACE_SECONDS = int(os.getenv("SCHEDULER_MISFIRE_GRACE_SECONDS", "30"))
+
+executors = {
+    "default": AsyncIOExecutor(),  # coroutine jobs, their blocking parts already use asyncio.to_thread
+    "threads": ThreadPoolExecutor(max_workers=SCHEDULER_THREAD_WORKERS),
+    # spawn, not fork: the server process holds threads, sockets and TensorFlow state
+    "processes": ProcessPoolExecutor(max_workers=SCHEDULER_PROCESS_WORKERS, pool_kwargs={"mp_context": multiprocessing.get_context("spawn")}),
+}
+# one run per job at a time, runs that piled up while it was busy collapse into one
+job_defaults = {"max_instances": 1, "coalesce": True, "misfire_grace_time": SCHEDULER_MISFIRE_GRACE_SECONDS}
+
 # 全域單例
-scheduler = AsyncIOScheduler()
+scheduler = AsyncIOScheduler(executors=executors, job_defaults=job_defaults)
+
+class _TimedRun:
+    """Wall-clock start/end of one job run, returned by the timing wrapper so it reaches the executed event (also from a pool process)."""
+
+    def __init__(self, started: float, finished: float, retval=None):
+        self.started = started
+        self.finished = finished
+        self.retval = retval
+
+def _run_timed(func: Callable, *args, **kwargs) -> _TimedRun:
+    # module-level so a process pool job referencing it can be pickled
+    started = time.time()
+    try:
+        retval = func(*args, **kwargs)
+    except BaseException as e:
+        e._job_run = _TimedRun(started, time.time())  # exception attributes survive pickling back from a process
+        raise
+    return _TimedRun(started, time.time(), retval)
+
+async def _run_timed_async(func: Callable, *args, **kwargs) -> _TimedRun:
+    started = time.time()
+    try:
+        retval = await func(*args, **kwargs)
+    except BaseException as e:
+        e._job_run = _TimedRun(started, time.time())
+        raise
+    return _TimedRun(started, time.time(), retval)
+
+class JobMetrics:
+    """
+    Per-job run counters collected from scheduler events, so process pool jobs are measured too.
+    Durations cover only the job function itself (timed by the wrapper schedule_job adds); how long a run waited
+    after its scheduled time (busy executor, event loop lag) is reported separately as lateness.
+    A fast thread job can finish before its submitted event is dispatched, so nothing here depends on event order.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, dict] = {}
+
+    def _job(self, job_id: str) -> dict:
+        # called with the lock held
+        return self._jobs.setdefault(job_id, {
+            "submitted": 0, "runs": 0, "errors": 0, "missed": 0, "skipped_overlap": 0,
+            "last_duration": None, "avg_duration": None, "max_duration": None, "total_duration": 0.0,
+            "last_lateness": None, "avg_lateness": None, "max_lateness": None, "total_lateness": 0.0, "timed_runs": 0,
+            "last_run_at": None, "last_error": None,
+        })
+
+    def listener(self, event) -> None:
+        with self._lock:
+            job = self._job(event.job_id)
+            if event.code == EVENT_JOB_SUBMITTED:
+                job["submitted"] += 1
+            elif event.code in (EVENT_JOB_EXECUTED, EVENT_JOB_ERROR):
+                job["runs"] += 1
+                if event.code == EVENT_JOB_ERROR:
+                    job["errors"] += 1
+                    job["last_error"] = repr(event.exception)
+                    run = getattr(event.exception, "_job_run", None)
+                else:
+                    run = event.retval
+                if not isinstance(run, _TimedRun):
+                    # job added without schedule_job, its run time is unknown
+                    job["last_run_at"] = event.scheduled_run_time.isoformat()
+                    return
+                duration = round(max(0.0, run.finished - run.started), 4)
+                lateness = round(max(0.0, run.started - event.scheduled_run_time.timestamp()), 4)
+                job["timed_runs"] += 1
+                job["last_run_at"] = datetime.fromtimestamp(run.started, timezone.utc).isoformat()
+                job["last_duration"] = duration
+                job["total_duration"] += duration
+                job["max_duration"] = max(job["max_duration"] or 0.0, duration)
+                job["avg_duration"] = round(job["total_duration"] / job["timed_runs"], 4)
+                job["last_lateness"] = lateness
+                job["total_lateness"] += lateness
+                job["max_lateness"] = max(job["max_lateness"] or 0.0, lateness)
+                job["avg_lateness"] = round(job["total_lateness"] / job["timed_runs"], 4)
+            elif event.code == EVENT_JOB_MISSED:
+                job["missed"] += 1
+            elif event.code == EVENT_JOB_MAX_INSTANCES:
+                job["skipped_overlap"] += 1  # previous run still going, this one was dropped
+                print(f"⚠️ Job {event.job_id} is still running, skipped an overlapping run")
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            hidden = ("total_duration", "total_lateness", "timed_runs")
+            stats = {job_id: {key: value for key, value in job.items() if key not in hidden} for job_id, job in self._jobs.items()}
+        for entry in stats.values():
+            entry["running"] = max(0, entry.pop("submitted") - entry["runs"])
+        for job in scheduler.get_jobs():
+            entry = stats.setdefault(job.id, {})
+            entry["executor"] = job.executor
+            entry["next_run_time"] = job.next_run_time.isoformat() if job.next_run_time else None
+        return stats
+
+job_metrics = JobMetrics()
+scheduler.add_listener(job_metrics.listener, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
+
+def schedule_job(func: Callable, trigger: str, executor: Optional[str] = None, **trigger_args):
+    """
+    註冊排程工作：coroutine 在事件迴圈上執行，同步函式預設交給 "threads" 執行緒池，避免阻塞 API。
+    :param func: 工作函式，其名稱作為 job id 與指標名稱
+    :param trigger: APScheduler trigger，例如 "cron"、"interval"
+    :param executor: "default"、"threads" 或 "processes"，None 表示依函式類型自動選擇
+    :param trigger_args: trigger 參數，例如 hour=0, minute=0
+    :return: APScheduler Job
+    """
+    is_coroutine = asyncio.iscoroutinefunction(func)
+    if executor is None:
+        executor = "default" if is_coroutine else "threads"
+    # time the function itself, so job_metrics does not count the wait before the run as duration;
+    # the wrapper gets func as its first argument (not a partial) so process pool jobs can still be pickled
+    args = (func, *trigger_args.pop("args", ()))
+    return scheduler.add_job(_run_timed_async if is_coroutine else _run_timed, trigger, args=args, id=func.__name__, name=func.__name__, executor=executor, replace_existing=True, **trigger_args)
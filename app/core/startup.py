@@ -0,0 +1,92 @@
+# app/core/startup.py
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+from app.utils.app_state import set_startup_ready, set_startup_step_status
+
+@dataclass
+class StartupStep:
+    name: str
+    func: Callable[[], object]  # zero-arg callable, run in a worker thread; raising, returning False or {"success": False} fails the step
+    deps: List[str] = field(default_factory=list)
+    critical: bool = False  # readiness only waits for critical steps
+
+def _check_graph(steps: List[StartupStep]) -> None:
+    by_name = {step.name: step for step in steps}
+    if len(by_name) != len(steps):
+        raise ValueError("Duplicate startup step names")
+    for step in steps:
+        for dep in step.deps:
+            if dep not in by_name:
+                raise ValueError(f"Startup step '{step.name}' depends on unknown step '{dep}'")
+    # depth-first search for cycles
+    visiting, visited = set(), set()
+    def visit(name: str):
+        if name in visited:
+            return
+        if name in visiting:
+            raise ValueError(f"Startup steps have a dependency cycle at '{name}'")
+        visiting.add(name)
+        for dep in by_name[name].deps:
+            visit(dep)
+        visiting.discard(name)
+        visited.add(name)
+    for step in steps:
+        visit(step.name)
+
+# Run startup steps as a DAG: every step starts as soon as all of its dependencies are done
+async def run_startup_pipeline(steps: List[StartupStep]) -> Dict[str, float]:
+    _check_graph(steps)
+    tasks: Dict[str, asyncio.Task] = {}
+    timings: Dict[str, float] = {}
+    critical = {step.name for step in steps if step.critical}
+    done = set()
+
+    for step in steps:
+        set_startup_step_status(step.name, "pending")
+    if not critical:
+        set_startup_ready(True)
+
+    async def run(step: StartupStep) -> bool:
+        dep_results = await asyncio.gather(*(tasks[dep] for dep in step.deps))
+        if not all(dep_results):
+            print(f"⭕️ Startup step '{step.name}' skipped, a dependency failed.")
+            set_startup_step_status(step.name, "skipped")
+            return False
+        set_startup_step_status(step.name, "running")
+        started = time.perf_counter()
+        try:
+            result = await asyncio.to_thread(step.func) # to_thread can avoid blocking the event loop
+            # ingest helpers report errors by returning False (save_stock_detail) or {"success": False, ...} (save_stock_data)
+            if result is False:
+                raise RuntimeError("step returned False")
+            if isinstance(result, dict) and result.get("success") is False:
+                raise RuntimeError(result.get("error") or "step returned success False")
+        except Exception as e:
+            elapsed = time.perf_counter() - started
+            timings[step.name] = elapsed
+            set_startup_step_status(step.name, "failed", elapsed)
+            print(f"❌ Startup step '{step.name}' failed after {elapsed:.2f}s: {e}")
+            return False
+        elapsed = time.perf_counter() - started
+        timings[step.name] = elapsed
+        set_startup_step_status(step.name, "done", elapsed)
+        print(f"✅ Startup step '{step.name}' finished in {elapsed:.2f}s")
+        done.add(step.name)
+        if critical and critical <= done:
+            set_startup_ready(True)
+        return True
+
+    started = time.perf_counter()
+    for step in steps:
+        tasks[step.name] = asyncio.create_task(run(step))
+    await asyncio.gather(*tasks.values())
+    total = time.perf_counter() - started
+
+    # wall-time report, slowest step first
+    print(f"⏱️ Startup pipeline finished in {total:.2f}s")
+    for name, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+        print(f"| {name}: {seconds:.2f}s")
+    return timings
@@ -1,6 +1,16 @@
 # app/db/connection.py
+import os
 import sqlite3
+import threading
 from sqlite3 import Error
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+# SQLite tuning, override with environment variables
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+SQLITE_CACHE_SIZE_MB = int(os.getenv("SQLITE_CACHE_SIZE_MB", "64"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+# rows fetched per round trip by streaming reads
+SQLITE_STREAM_FETCH_ROWS = int(os.getenv("SQLITE_STREAM_FETCH_ROWS", "2000"))
 
 # create a database connection
 def create_connection(db_file: str):
@@ -12,3 +22,113 @@ def create_connection(db_file: str):
     except Error as e:
         print(f"❌ An error occurred while connecting to database: {e}")
         return None
+
+def apply_pragmas(conn: sqlite3.Connection) -> None:
+    # WAL lets readers keep going while one writer commits; NORMAL sync is safe under WAL
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE_MB * 1024 * 1024}")
+    conn.execute(f"PRAGMA cache_size={-SQLITE_CACHE_SIZE_MB * 1024}")  # negative value is KiB
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+
+class ConnectionPool:
+    """
+    One SQLite connection per thread for a database file.
+    FastAPI's threadpool, asyncio.to_thread jobs and the scheduler each get their own
+    connection, so readers no longer queue behind a writer on a shared connection.
+    """
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[Tuple[threading.Thread, sqlite3.Connection]] = []
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        # check_same_thread=False only so close_all() can close connections from the shutdown thread
+        conn = sqlite3.connect(self.db_file, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        apply_pragmas(conn)
+        with self._lock:
+            self._prune()
+            self._connections.append((threading.current_thread(), conn))
+        return conn
+
+    def _prune(self) -> None:
+        # close connections whose thread has exited, called with the lock held
+        alive = []
+        for thread, conn in self._connections:
+            if thread.is_alive():
+                alive.append((thread, conn))
+            else:
+                conn.close()
+        self._connections = alive
+
+    def get(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use."""
+        if self._closed:
+            raise Error(f"Connection pool for {self.db_file} is closed")
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._connections)
+
+    def close_all(self) -> None:
+        with self._lock:
+            self._closed = True
+            for _, conn in self._connections:
+                try:
+                    conn.close()
+                except Error as e:
+                    print(f"⚠️ Error closing connection to {self.db_file}: {e}")
+            self._connections = []
+
+# create a per-thread connection pool
+def create_connection_pool(db_file: str) -> Optional[ConnectionPool]:
+    try:
+        pool = ConnectionPool(db_file)
+        journal_mode = pool.get().execute("PRAGMA journal_mode").fetchone()[0] # open one connection up front to fail fast
+        print(f"✅ Connection pool ready for database: {db_file} (journal_mode={journal_mode})")
+        return pool
+    except Error as e:
+        print(f"❌ An error occurred while creating connection pool for database: {e}")
+        return None
+
+# open a second connection to the database file behind `conn`
+def open_dedicated_connection(conn: sqlite3.Connection) -> sqlite3.Connection:
+    # long reads that outlive one request thread (streaming responses) must not share the per-thread connection
+    db_file = conn.execute("PRAGMA database_list").fetchone()[2]
+    dedicated = sqlite3.connect(db_file, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    apply_pragmas(dedicated)
+    return dedicated
+
+def stream_query(conn: sqlite3.Connection, sql: str, params: Sequence[object], fetch_rows: int = SQLITE_STREAM_FETCH_ROWS) -> Tuple[List[str], Iterator[List[tuple]]]:
+    """
+    Run a query on a dedicated connection and hand back its column names and a chunk iterator.
+    The query runs before returning, so SQL errors surface before any response bytes are sent;
+    the connection is closed once the iterator is exhausted or discarded.
+    """
+    dedicated = open_dedicated_connection(conn)
+    try:
+        cursor = dedicated.execute(sql, params)
+    except Error:
+        dedicated.close()
+        raise
+    columns = [description[0] for description in cursor.description]
+
+    def chunks() -> Iterator[List[tuple]]:
+        try:
+            while True:
+                rows = cursor.fetchmany(fetch_rows)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            dedicated.close()
+    return columns, chunks()
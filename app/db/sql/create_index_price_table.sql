@@ -11,5 +11,5 @@ CREATE TABLE IF NOT EXISTS index_price (
     volume INTEGER,
     UNIQUE(symbol, date)
 );
-CREATE INDEX IF NOT EXISTS idx_index_price_symbol_date
-ON index_price(symbol, date);
\ No newline at end of file
+-- UNIQUE(symbol, date) already keeps an index on the same key, the old duplicate index only slowed every insert
+DROP INDEX IF EXISTS idx_index_price_symbol_date;
\ No newline at end of file
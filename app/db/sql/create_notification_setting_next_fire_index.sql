@@ -0,0 +1 @@
+CREATE INDEX IF NOT EXISTS idx_notification_setting_next_fire_at ON notification_setting(next_fire_at);
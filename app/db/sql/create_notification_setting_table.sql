@@ -5,6 +5,7 @@ CREATE TABLE if not EXISTS notification_setting (
     day_of_week TEXT CHECK (day_of_week IN ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday')),
     date_of_month INTEGER CHECK (date_of_month >= 1 AND date_of_month <= 31),
     time_of_day TEXT NOT NULL default '08:00',
+    next_fire_at TEXT, -- next local "YYYY-MM-DD HH:MM" the notification is due, NULL when the setting never fires
 
     FOREIGN KEY (email) REFERENCES user (email) ON DELETE CASCADE,
     UNIQUE (email) -- Ensures a user cannot have duplicate notification settings
@@ -0,0 +1,9 @@
+-- app/db/sql/create_stock_price_gap_attempt_table.sql
+-- trading days a stock download was asked for but did not return (halts, days missing upstream); the gap lookup skips them
+
+CREATE TABLE IF NOT EXISTS stock_price_gap_attempt (
+    symbol TEXT NOT NULL,
+    date TEXT NOT NULL,
+    attempted_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY(symbol, date)
+);
@@ -11,5 +11,5 @@ CREATE TABLE IF NOT EXISTS stock_price (
     volume INTEGER,
     UNIQUE(symbol, date)
 );
-CREATE INDEX IF NOT EXISTS idx_stock_price_symbol_date
-ON stock_price(symbol, date);
+-- UNIQUE(symbol, date) already keeps an index on the same key, the old duplicate index only slowed every insert
+DROP INDEX IF EXISTS idx_stock_price_symbol_date;
@@ -9,6 +9,7 @@ CREATE TABLE IF NOT EXISTS stock_rank (
     industry TEXT NOT NULL,
     current_price REAL NOT NULL,
     potential REAL NOT NULL,
+    rank INTEGER,
     UNIQUE(record_date, symbol)
 );
 
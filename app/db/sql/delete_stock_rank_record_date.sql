@@ -0,0 +1,5 @@
+-- app/db/sql/delete_stock_rank_record_date.sql
+-- rows of an earlier ranking run on the same record date, cleared so every stored rank comes from one run
+
+DELETE FROM stock_rank
+WHERE record_date = ?;
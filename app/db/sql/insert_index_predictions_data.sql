@@ -12,4 +12,20 @@ INSERT INTO index_predictions (
     recommendation, 
     feature_number, 
     input_features_length)
-VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
\ No newline at end of file
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(symbol, window_start_date, window_end_date) DO UPDATE SET
+    timestamp = excluded.timestamp,
+    window_size = excluded.window_size,
+    predicted_scaled = excluded.predicted_scaled,
+    predicted_real = excluded.predicted_real,
+    last_actual_close = excluded.last_actual_close,
+    recommendation = excluded.recommendation,
+    feature_number = excluded.feature_number,
+    input_features_length = excluded.input_features_length
+WHERE window_size IS NOT excluded.window_size
+    OR predicted_scaled IS NOT excluded.predicted_scaled
+    OR predicted_real IS NOT excluded.predicted_real
+    OR last_actual_close IS NOT excluded.last_actual_close
+    OR recommendation IS NOT excluded.recommendation
+    OR feature_number IS NOT excluded.feature_number
+    OR input_features_length IS NOT excluded.input_features_length;
@@ -3,5 +3,6 @@ INSERT INTO notification_setting (
     frequency,
     day_of_week,
     date_of_month,
-    time_of_day
-) VALUES (?, ?, ?, ?, ?);
\ No newline at end of file
+    time_of_day,
+    next_fire_at
+) VALUES (?, ?, ?, ?, ?, ?);
\ No newline at end of file
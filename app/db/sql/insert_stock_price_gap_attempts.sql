@@ -0,0 +1,10 @@
+-- app/db/sql/insert_stock_price_gap_attempts.sql
+-- record the calendar days from the download start up to the symbol's last stored date that are still missing after a download
+
+INSERT OR IGNORE INTO stock_price_gap_attempt (symbol, date)
+SELECT ?, c.date
+FROM index_price c
+WHERE c.symbol = ?
+  AND c.date >= ?
+  AND c.date <= (SELECT MAX(date) FROM stock_price WHERE symbol = ?)
+  AND NOT EXISTS (SELECT 1 FROM stock_price p WHERE p.symbol = ? AND p.date = c.date);
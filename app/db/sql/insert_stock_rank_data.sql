@@ -7,5 +7,13 @@ INSERT INTO stock_rank (
     sector,
     industry,
     current_price,
-    potential)
-VALUES (?, ?, ?, ?, ?, ?, ?);
\ No newline at end of file
+    potential,
+    rank)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(record_date, symbol) DO UPDATE SET
+    timestamp = excluded.timestamp,
+    sector = excluded.sector,
+    industry = excluded.industry,
+    current_price = excluded.current_price,
+    potential = excluded.potential,
+    rank = excluded.rank;
\ No newline at end of file
@@ -7,4 +7,12 @@ INSERT INTO stock_statistics (
     days200_start_date,
     days200_end_date,
     days200_ma)
-VALUES (?, ?, ?, ?, ?, ?);
\ No newline at end of file
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(symbol, record_date) DO UPDATE SET
+    timestamp = excluded.timestamp,
+    days200_start_date = excluded.days200_start_date,
+    days200_end_date = excluded.days200_end_date,
+    days200_ma = excluded.days200_ma
+WHERE days200_start_date IS NOT excluded.days200_start_date
+    OR days200_end_date IS NOT excluded.days200_end_date
+    OR days200_ma IS NOT excluded.days200_ma;
@@ -0,0 +1,5 @@
+SELECT n.email, n.frequency, n.day_of_week, n.date_of_month, n.time_of_day, n.next_fire_at, b.stock_symbol
+FROM notification_setting n
+LEFT JOIN bookmark b ON b.email = n.email AND b.notify = 1
+WHERE n.next_fire_at <= ?
+ORDER BY n.next_fire_at, n.email, b.id;
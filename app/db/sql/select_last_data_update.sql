@@ -0,0 +1,12 @@
+-- app/db/sql/select_last_data_update.sql
+-- newest stored price date or derived-data write time; derived rows keep their timestamp while their values are unchanged
+
+SELECT MAX(last_update) FROM (
+    SELECT MAX(date) AS last_update FROM stock_price
+    UNION ALL SELECT MAX(date) FROM index_price
+    UNION ALL SELECT MAX(timestamp) FROM stock_statistics
+    UNION ALL SELECT MAX(timestamp) FROM index_statistics
+    UNION ALL SELECT MAX(timestamp) FROM stock_predictions
+    UNION ALL SELECT MAX(timestamp) FROM index_predictions
+    UNION ALL SELECT MAX(timestamp) FROM stock_rank
+);
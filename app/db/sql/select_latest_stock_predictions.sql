@@ -0,0 +1,8 @@
+-- app/db/sql/select_latest_stock_predictions.sql
+-- newest prediction of every requested symbol, one row each; with MAX() SQLite takes the other columns from the row holding the maximum
+
+SELECT /*SELECT_COLUMNS*/, MAX(timestamp) AS timestamp
+FROM stock_predictions
+WHERE 1=1
+  /*SYMBOL_IN_CLAUSE*/
+GROUP BY symbol;
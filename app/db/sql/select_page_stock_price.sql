@@ -0,0 +1,12 @@
+-- app/db/sql/select_page_stock_price.sql
+-- one keyset page of a single symbol, newest first: a range scan on the UNIQUE(symbol, date) index
+-- that starts right after the cursor date, so deep pages cost the same as the first one
+
+SELECT /*SELECT_COLUMNS*/
+FROM stock_price
+WHERE symbol = ?
+  AND date < ?
+  /*DATE_START_COND*/
+  /*DATE_END_COND*/
+ORDER BY date DESC
+LIMIT ?;
@@ -0,0 +1,30 @@
+-- app/db/sql/select_stock_price_watermarks.sql
+-- last stored date per symbol, plus the first trading day of the calendar symbol (index_price) missing inside the repair window
+-- (the last N days of the stored range) that no earlier download already asked for (stock_price_gap_attempt);
+-- the gap lookup only runs for symbols with fewer stored plus attempted rows than calendar days in that window
+
+WITH bounds AS (
+    SELECT symbol, MAX(first_date, date(last_date, ?)) AS window_start, last_date
+    FROM (
+        SELECT symbol, MIN(date) AS first_date, MAX(date) AS last_date
+        FROM stock_price
+        GROUP BY symbol
+    )
+)
+SELECT
+    b.symbol,
+    b.last_date,
+    CASE WHEN (
+        SELECT COUNT(*) FROM stock_price p WHERE p.symbol = b.symbol AND p.date BETWEEN b.window_start AND b.last_date
+    ) + (
+        SELECT COUNT(*) FROM stock_price_gap_attempt g WHERE g.symbol = b.symbol AND g.date BETWEEN b.window_start AND b.last_date
+    ) < (
+        SELECT COUNT(*) FROM index_price c
+        WHERE c.symbol = ? AND c.date BETWEEN b.window_start AND b.last_date
+    ) THEN (
+        SELECT MIN(c.date) FROM index_price c
+        WHERE c.symbol = ? AND c.date BETWEEN b.window_start AND b.last_date
+        AND NOT EXISTS (SELECT 1 FROM stock_price p WHERE p.symbol = b.symbol AND p.date = c.date)
+        AND NOT EXISTS (SELECT 1 FROM stock_price_gap_attempt g WHERE g.symbol = b.symbol AND g.date = c.date)
+    ) END AS first_gap
+FROM bounds b;
@@ -0,0 +1,6 @@
+-- app/db/sql/select_stock_rank_record_date.sql
+-- stored ranking of one record date, compared with a new run before it is replaced
+
+SELECT symbol, sector, industry, current_price, potential, rank
+FROM stock_rank
+WHERE record_date = ?;
@@ -0,0 +1,8 @@
+-- app/db/sql/select_top_stock_rank.sql
+
+SELECT symbol, sector, industry, current_price, potential, rank
+FROM stock_rank
+WHERE record_date = (SELECT MAX(record_date) FROM stock_rank)
+  AND rank IS NOT NULL
+ORDER BY rank
+LIMIT ?;
@@ -0,0 +1,3 @@
+SELECT email, frequency, day_of_week, date_of_month, time_of_day
+FROM notification_setting
+WHERE next_fire_at IS NULL;
@@ -0,0 +1,15 @@
+-- app/db/sql/select_window_stock_price.sql
+
+WITH window_start AS (
+    SELECT s.value AS symbol,
+           (SELECT date
+            FROM stock_price q
+            WHERE q.symbol = s.value
+            ORDER BY date DESC
+            LIMIT 1 OFFSET ?) AS start_date
+    FROM json_each(?) s
+)
+SELECT /*SELECT_COLUMNS*/
+FROM window_start w
+JOIN stock_price p ON p.symbol = w.symbol AND p.date >= COALESCE(w.start_date, '')
+ORDER BY p.symbol, p.date DESC;
@@ -0,0 +1 @@
+UPDATE notification_setting SET next_fire_at = ? WHERE email = ? AND next_fire_at IS ?;
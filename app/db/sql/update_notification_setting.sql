@@ -1 +1 @@
-UPDATE notification_setting SET frequency = ?, day_of_week = ?, date_of_month = ?, time_of_day = ? WHERE email = ?
\ No newline at end of file
+UPDATE notification_setting SET frequency = ?, day_of_week = ?, date_of_month = ?, time_of_day = ?, next_fire_at = ? WHERE email = ?
\ No newline at end of file
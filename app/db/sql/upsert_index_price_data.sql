@@ -0,0 +1,22 @@
+-- app/db/sql/upsert_index_price_data.sql
+
+INSERT INTO index_price (
+    symbol,
+    date,
+    open,
+    high,
+    low,
+    close,
+    volume)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(symbol, date) DO UPDATE SET
+    open = excluded.open,
+    high = excluded.high,
+    low = excluded.low,
+    close = excluded.close,
+    volume = excluded.volume
+WHERE open IS NOT excluded.open
+    OR high IS NOT excluded.high
+    OR low IS NOT excluded.low
+    OR close IS NOT excluded.close
+    OR volume IS NOT excluded.volume;
@@ -0,0 +1,84 @@
+# app/db/statements.py
+import glob
+import os
+import re
+import sqlite3
+from functools import lru_cache
+from typing import Dict, Optional
+
+from app.utils.file import open_sql_file
+
+# app/db/sql/ next to this module
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql")
+
+# placeholders a template may carry, everything else inside /*...*/ is treated as a typo
+PLACEHOLDERS = {
+    "SELECT_COLUMNS",
+    "SYMBOL_IN_CLAUSE",
+    "DATE_START_COND",
+    "DATE_END_COND",
+    "TIMESTAMP_START_COND",
+    "TIMESTAMP_END_COND",
+    "DATA_LIMIT",
+}
+_PLACEHOLDER_PATTERN = re.compile(r"/\*([A-Z_]+)\*/")
+
+def _load_statements() -> Dict[str, str]:
+    # Read every .sql file once, keyed by file name without extension
+    statements = {}
+    problems = []
+    for path in sorted(glob.glob(os.path.join(SQL_DIR, "*.sql"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        sql = open_sql_file(path)
+        if not sql.strip():
+            problems.append(f"{name}: empty template")
+            continue
+        unknown = set(_PLACEHOLDER_PATTERN.findall(sql)) - PLACEHOLDERS
+        if unknown:
+            problems.append(f"{name}: unknown placeholders {sorted(unknown)}")
+        if not sqlite3.complete_statement(sql if sql.rstrip().endswith(";") else sql + ";"):
+            problems.append(f"{name}: incomplete statement")
+        statements[name] = sql
+    if problems:
+        raise ValueError("Invalid SQL templates: " + "; ".join(problems))
+    print(f"✅ Loaded {len(statements)} SQL templates from {SQL_DIR}")
+    return statements
+
+_statements = _load_statements()
+
+def get_sql(name: str) -> str:
+    """
+    取得已載入的 SQL 模板（不含任何佔位符替換）。
+    :param name: 模板名稱，即 app/db/sql/ 下的檔名（不含 .sql），例如 "insert_bookmark"
+    :return: SQL 字串
+    :raises KeyError: 名稱不存在時，避免執行空字串而悄悄成功
+    """
+    try:
+        return _statements[name]
+    except KeyError:
+        raise KeyError(f"SQL template '{name}' not found in {SQL_DIR}") from None
+
+@lru_cache(maxsize=1024)
+def render_sql(name: str, select_columns: Optional[str] = None, n_symbols: int = 0, has_start: bool = False, has_end: bool = False, has_limit: bool = False) -> str:
+    """
+    依查詢形狀替換模板佔位符，結果依參數快取，相同形狀的查詢不再重做字串替換。
+    :param name: 模板名稱，例如 "select_several_stock_price"
+    :param select_columns: 取代 /*SELECT_COLUMNS*/ 的欄位字串，例如 "symbol, date, close"
+    :param n_symbols: IN 子句的問號數，0 表示不加 symbol 條件
+    :param has_start: 是否加入起始日期條件 (date >= ?)
+    :param has_end: 是否加入結束日期條件 (date <= ?)
+    :param has_limit: 是否加入 LIMIT ?
+    :return: 可直接執行的 SQL，參數依序為 symbols、start、end、limit
+    """
+    sql = get_sql(name)
+    if select_columns is not None:
+        sql = sql.replace("/*SELECT_COLUMNS*/", select_columns)
+    symbol_clause = f"AND symbol IN ({','.join(['?'] * n_symbols)})" if n_symbols else ""
+    sql = sql.replace("/*SYMBOL_IN_CLAUSE*/", symbol_clause)
+    # price tables use DATE_*, statistics/predictions/rank use TIMESTAMP_*; both filter on date
+    start_cond = "AND date >= ?" if has_start else ""
+    end_cond = "AND date <= ?" if has_end else ""
+    sql = sql.replace("/*DATE_START_COND*/", start_cond).replace("/*TIMESTAMP_START_COND*/", start_cond)
+    sql = sql.replace("/*DATE_END_COND*/", end_cond).replace("/*TIMESTAMP_END_COND*/", end_cond)
+    sql = sql.replace("/*DATA_LIMIT*/", "LIMIT ?" if has_limit else "")
+    return sql
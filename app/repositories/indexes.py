@@ -1,11 +1,12 @@
 # app/repositories/indexes.py
 import pandas as pd
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 from fastapi import HTTPException
 
-from app.utils.app_state import get_fin_db, get_sql_path, FIXED_COLUMNS_IN_FINANCIAL
-from app.utils.file import open_sql_file
+from app.db.connection import stream_query
+from app.db.statements import get_sql, render_sql
+from app.utils.app_state import get_fin_db, FIXED_COLUMNS_IN_FINANCIAL
 
 # read financial.db to get the number of lasted data in a index_price table
 def get_index_all_price(symbols: List[str], start_date: Optional[str] = None, end_date: Optional[str] = None, limit: Optional[int] = None) -> pd.DataFrame:
@@ -18,32 +19,14 @@ def get_index_all_price(symbols: List[str], start_date: Optional[str] = None, en
     :return: 查詢結果 DataFrame
     """
     # 載入查詢模板
-    sql_template = open_sql_file(get_sql_path('select_all_index_price'))
-        
-    # 動態產生 IN 子句問號（參數化避免注入）
-    placeholders = ",".join(["?"] * len(symbols))
-    symbol_clause = f"AND symbol IN ({placeholders})"
-    sql_template = sql_template.replace("/*SYMBOL_IN_CLAUSE*/", f"\n  {symbol_clause}")
-
-    # 可選日期條件（用參數佔位符，值放在 params）
-    params: List[object] = []
-    params.extend(symbols)
+    sql_template = render_sql('select_all_index_price', None, n_symbols=len(symbols), has_start=bool(start_date), has_end=bool(end_date), has_limit=bool(limit))
+    params: List[object] = list(symbols)
     if start_date:
-        sql_template = sql_template.replace("/*DATE_START_COND*/", "AND date >= ?")
         params.append(start_date)
-    else:
-        sql_template = sql_template.replace("/*DATE_START_COND*/", "")
     if end_date:
-        sql_template = sql_template.replace("/*DATE_END_COND*/", "AND date <= ?")
         params.append(end_date)
-    else:
-        sql_template = sql_template.replace("/*DATE_END_COND*/", "")
     if limit:
-        sql_template = sql_template.replace("/*DATA_LIMIT*/", "LIMIT ?")
-        params.append(limit) # LIMIT 放在模板最後一個 ?，加入參數
-    else:
-        sql_template = sql_template.replace("/*DATA_LIMIT*/", "")
-
+        params.append(limit)
     try:
         df = pd.read_sql_query(sql=sql_template, con=get_fin_db(), params=params) # 用 pd.read_sql_query(sql, conn, params=params) 直接回傳 DataFrame
         if df.empty:
@@ -54,6 +37,35 @@ def get_index_all_price(symbols: List[str], start_date: Optional[str] = None, en
         print(f"❌ Error retrieving table(index price) for {symbols}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# stream rows of index_price table without building a DataFrame
+def stream_index_price(symbols: List[str], columns: Optional[List[str]] = None, start_date: Optional[str] = None, end_date: Optional[str] = None, limit: Optional[int] = None) -> Tuple[List[str], Iterator[List[tuple]]]:
+    """
+    以專用連線與 fetchmany 分批讀取 index_price 表，記憶體用量與結果大小無關。
+    :param symbols: 指數代碼列表，例如 ["^GSPC"]
+    :param columns: 數據欄列表，None 表示全部欄位
+    :param start_date: 起始日期 (YYYY-MM-DD)
+    :param end_date: 結束日期 (YYYY-MM-DD)
+    :param limit: 最大返回筆數
+    :return: (欄位名稱, 每次產生一批 row tuple 的 iterator)
+    """
+    if columns is None:
+        sql_template = render_sql('select_all_index_price', None, n_symbols=len(symbols), has_start=bool(start_date), has_end=bool(end_date), has_limit=bool(limit))
+    else:
+        select_cols = ", ".join(FIXED_COLUMNS_IN_FINANCIAL + columns)
+        sql_template = render_sql('select_several_index_price', select_cols, n_symbols=len(symbols), has_start=bool(start_date), has_end=bool(end_date), has_limit=bool(limit))
+    params: List[object] = list(symbols)
+    if start_date:
+        params.append(start_date)
+    if end_date:
+        params.append(end_date)
+    if limit:
+        params.append(limit)
+    try:
+        return stream_query(get_fin_db(), sql_template, params)
+    except Exception as e:
+        print(f"❌ Error streaming table(index price) for {symbols}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # read financial.db to get several column date stored in index_price table
 def get_several_index_price(symbols: List[str], columns: List[str], start_date: Optional[str] = None, end_date: Optional[str] = None, limit: Optional[int] = None):
     """
@@ -65,27 +77,15 @@ def get_several_index_price(symbols: List[str], columns: List[str], start_date:
     :param limit: 最大返回筆數
     :return: 查詢結果 DataFrame
     """
-    sql_template = open_sql_file(get_sql_path('select_several_index_price'))
     select_cols = ", ".join(FIXED_COLUMNS_IN_FINANCIAL + columns)  # 以字串插入識別字（不能用參數化）
-    sql_template = sql_template.replace("/*SELECT_COLUMNS*/", select_cols)
-    placeholders = ",".join(["?"] * len(symbols)) # 值條件一律參數化
-    sql_template = sql_template.replace("/*SYMBOL_IN_CLAUSE*/", f"AND symbol IN ({placeholders})")
+    sql_template = render_sql('select_several_index_price', select_cols, n_symbols=len(symbols), has_start=bool(start_date), has_end=bool(end_date), has_limit=bool(limit))
     params: List[object] = list(symbols)
     if start_date:
-        sql_template = sql_template.replace("/*DATE_START_COND*/", "AND date >= ?")
         params.append(start_date)
-    else:
-        sql_template = sql_template.replace("/*DATE_START_COND*/", "")
     if end_date:
-        sql_template = sql_template.replace("/*DATE_END_COND*/", "AND date <= ?")
         params.append(end_date)
-    else:
-        sql_template = sql_template.replace("/*DATE_END_COND*/", "")
     if limit:
-        sql_template = sql_template.replace("/*DATA_LIMIT*/", "LIMIT ?")
         params.append(limit)
-    else:
-        sql_template = sql_template.replace("/*DATA_LIMIT*/", "")
     try:
         df = pd.read_sql_query(sql=sql_template, con=get_fin_db(), params=params)  # 只綁值，不綁欄位名
         if df.empty:
@@ -107,29 +107,15 @@ def get_several_index_statistics(symbols: List[str], columns: List[str], start_d
     :param limit: 最大返回筆數
     :return: 查詢結果 DataFrame
     """
-    sql_template = open_sql_file(get_sql_path('select_several_index_statistics'))
     select_cols = ", ".join(columns)
-    sql_template = sql_template.replace("/*SELECT_COLUMNS*/", select_cols)
-    placeholders = ",".join(["?"] * len(symbols))
-    symbol_clause = f"AND symbol IN ({placeholders})"
-    sql_template = sql_template.replace("/*SYMBOL_IN_CLAUSE*/", f"\n  {symbol_clause}")
-    params: List[object] = []
-    params.extend(symbols)
+    sql_template = render_sql('select_several_index_statistics', select_cols, n_symbols=len(symbols), has_start=bool(start_date), has_end=bool(end_date), has_limit=bool(limit))
+    params: List[object] = list(symbols)
     if start_date:
-        sql_template = sql_template.replace("/*TIMESTAMP_START_COND*/", "AND date >= ?")
         params.append(start_date)
-    else:
-        sql_template = sql_template.replace("/*TIMESTAMP_START_COND*/", "")
     if end_date:
-        sql_template = sql_template.replace("/*TIMESTAMP_END_COND*/", "AND date <= ?")
         params.append(end_date)
-    else:
-        sql_template = sql_template.replace("/*TIMESTAMP_END_COND*/", "")
     if limit:
-        sql_template = sql_template.replace("/*DATA_LIMIT*/", "LIMIT ?")
         params.append(limit)
-    else:
-        sql_template = sql_template.replace("/*DATA_LIMIT*/", "")
     try:
         df = pd.read_sql_query(sql=sql_template, con=get_fin_db(), params=params)
         if df.empty:
@@ -151,29 +137,15 @@ def get_several_index_predictions(symbols: List[str], columns: List[str], start_
     :param limit: 最大返回筆數
     :return: 查詢結果 DataFrame
     """
-    sql_template = open_sql_file(get_sql_path('select_several_index_predictions'))
     select_cols = ", ".join(columns)
-    sql_template = sql_template.replace("/*SELECT_COLUMNS*/", select_cols)
-    placeholders = ",".join(["?"] * len(symbols))
-    symbol_clause = f"AND symbol IN ({placeholders})"
-    sql_template = sql_template.replace("/*SYMBOL_IN_CLAUSE*/", f"\n  {symbol_clause}")
-    params: List[object] = []
-    params.extend(symbols)
+    sql_template = render_sql('select_several_index_predictions', select_cols, n_symbols=len(symbols), has_start=bool(start_date), has_end=bool(end_date), has_limit=bool(limit))
+    params: List[object] = list(symbols)
     if start_date:
-        sql_template = sql_template.replace("/*TIMESTAMP_START_COND*/", "AND date >= ?")
         params.append(start_date)
-    else:
-        sql_template = sql_template.replace("/*TIMESTAMP_START_COND*/", "")
     if end_date:
-        sql_template = sql_template.replace("/*TIMESTAMP_END_COND*/", "AND date <= ?")
         params.append(end_date)
-    else:
-        sql_template = sql_template.replace("/*TIMESTAMP_END_COND*/", "")
     if limit:
-        sql_template = sql_template.replace("/*DATA_LIMIT*/", "LIMIT ?")
         params.append(limit)
-    else:
-        sql_template = sql_template.replace("/*DATA_LIMIT*/", "")
     try:
         df = pd.read_sql_query(sql=sql_template, con=get_fin_db(), params=params)
         if df.empty:
@@ -189,7 +161,7 @@ def select_index_start_date(database: str = "financial.db"):
     start_date = ""
     try:
         cursor = get_fin_db().cursor()
-        sql_template = open_sql_file(get_sql_path("select_last_date_index_price"))
+        sql_template = get_sql("select_last_date_index_price")
         cursor.execute(sql_template)
         row = cursor.fetchone()
         if row and row[0]:
@@ -209,7 +181,7 @@ def get_last_date_index_price(database: str = "financial.db"):
     last_date = ""
     try:
         cursor = get_fin_db().cursor()
-        sql_template = open_sql_file(get_sql_path("select_last_date_index_price"))
+        sql_template = get_sql("select_last_date_index_price")
         cursor.execute(sql_template)
         row = cursor.fetchone()
         #last_date = row[0]
@@ -230,7 +202,7 @@ def get_last_date_index_price(database: str = "financial.db"):
 def get_any_date_index_price(ticker: str, offset: int, database: str = "financial.db"):
     try:
         cursor = get_fin_db().cursor()
-        sql_template = open_sql_file(get_sql_path("select_any_date_index_price"))
+        sql_template = get_sql("select_any_date_index_price")
         cursor.execute(sql_template, (ticker, (offset - 1))) # OFFSET window_size - 1 to get the Nth(window_size) record
         row = cursor.fetchone()
         if row and row[0]:
@@ -249,7 +221,7 @@ def get_last_index_window_end_date(database: str = "financial.db"):
     last_window_end_date = ""
     try:
         cursor = get_fin_db().cursor()
-        sql_template = open_sql_file(get_sql_path("select_last_wedate_index_predictions"))
+        sql_template = get_sql("select_last_wedate_index_predictions")
         cursor.execute(sql_template)
         row = cursor.fetchone()
         last_window_end_date = row[0]
@@ -264,7 +236,7 @@ def get_last_index_days200_end_date(database: str = "financial.db"):
     last_days200_end_date = ""
     try:
         cursor = get_fin_db().cursor()
-        sql_template = open_sql_file(get_sql_path("select_last_d200edate_index_statistics"))
+        sql_template = get_sql("select_last_d200edate_index_statistics")
         cursor.execute(sql_template)
         row = cursor.fetchone()
         last_days200_end_date = row[0]
@@ -282,13 +254,8 @@ def get_range_index_close_price(ticker: str, days: int):
     :param days: 天數
     :return: 包含 close 欄位的 DataFrame
     """
-    sql_template = open_sql_file(get_sql_path('select_several_index_price'))
     select_cols = ", ".join(FIXED_COLUMNS_IN_FINANCIAL + ['close'])
-    sql_template = sql_template.replace("/*SELECT_COLUMNS*/", select_cols)
-    sql_template = sql_template.replace("/*SYMBOL_IN_CLAUSE*/", "AND symbol = ?")
-    sql_template = sql_template.replace("/*DATE_START_COND*/", "")
-    sql_template = sql_template.replace("/*DATE_END_COND*/", "")
-    sql_template = sql_template.replace("/*DATA_LIMIT*/", "LIMIT ?")
+    sql_template = render_sql('select_several_index_price', select_cols, n_symbols=1, has_limit=True)
     params = [ticker, days]
     try:
         df = pd.read_sql_query(sql=sql_template, con=get_fin_db(), params=params)
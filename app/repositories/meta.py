@@ -1,16 +1,21 @@
 # app/repositories/meta.py
-from app.utils.app_state import get_fin_db, get_sql_path
-from app.utils.file import open_sql_file
+from datetime import datetime
+from typing import Optional
 
-# create a table
+from app.db.statements import get_sql
+from app.utils.app_state import get_fin_db
+
+# create a table, returns False when it failed
 def create_table(db, table_name, sql_template: str):
     try:
         cursor = db.cursor()
         cursor.executescript(sql_template)
         db.commit()
         print(f"✅ {table_name} table initialized successfully.")
+        return True
     except Exception as e:
         print(f"❌ An error occurred while creating table {table_name}: {e}")
+        return False
 
 # drop a table
 def drop_table(db, table_name, sql_template: str):
@@ -22,12 +27,36 @@ def drop_table(db, table_name, sql_template: str):
     except Exception as e:
         print(f"❌ An error occurred while dropping table {table_name}: {e}")
 
+# add a column to an existing table, tables created before the column existed are migrated in place;
+# returns whether the column was added, errors are raised so a half-migrated schema fails startup
+def add_column_if_missing(db, table_name: str, column_name: str, column_definition: str):
+    try:
+        columns = [row[1] for row in db.execute(f"PRAGMA table_info({table_name})").fetchall()]
+        if column_name in columns:
+            return False
+        db.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_definition}")
+        db.commit()
+        print(f"✅ Column {column_name} added to table {table_name}.")
+        return True
+    except Exception as e:
+        print(f"❌ An error occurred while adding column {column_name} to table {table_name}: {e}")
+        raise
+
+# newest stored price date or derived-data write time in financial.db, None when there is no data yet
+def get_last_data_update() -> Optional[datetime]:
+    try:
+        row = get_fin_db().execute(get_sql("select_last_data_update")).fetchone()
+        return datetime.fromisoformat(row[0]) if row and row[0] else None  # stored as local YYYY-MM-DD[ HH:MM:SS]
+    except Exception as e:
+        print(f"⚠️ Could not read the last data update time: {e}")
+        return None
+
 # get ticker symbol from financial.db stock_detail table
 def get_ticker_symbols():
     ticker_symbols = []
     try:
         cursor = get_fin_db().cursor()
-        sql_template = open_sql_file(get_sql_path("select_symbol_stock_detail"))
+        sql_template = get_sql("select_symbol_stock_detail")
         cursor.execute(sql_template)
         rows = cursor.fetchall()
         ticker_symbols = [row[0] for row in rows]
@@ -43,7 +72,7 @@ def get_stock_tables(database: str = "financial.db"):
     tables = []
     try:
         cursor = get_fin_db().cursor()
-        sql_template = open_sql_file(get_sql_path("select_table_name_financial"))
+        sql_template = get_sql("select_table_name_financial")
         cursor.execute(sql_template)
         rows = cursor.fetchall()
         tables = [row[0] for row in rows]
@@ -0,0 +1,73 @@
+# app/repositories/notifications.py
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.db.statements import get_sql
+from app.utils.app_state import get_user_db
+from app.utils.notification_time import FIRE_TIME_FORMAT, compute_next_fire_time
+
+def get_due_notification_bookmarks(now: Optional[datetime] = None) -> Tuple[List[tuple], Dict[str, List[str]]]:
+    """
+    以 next_fire_at 索引與 bookmark 的 LEFT JOIN 一次查詢所有到期（next_fire_at <= now）的設定與開啟通知的書籤，
+    沒有通知書籤的使用者也會回傳（書籤為空），以便一併重新排程。
+    :param now: 基準時間，None 表示目前時間
+    :return: ([(email, frequency, day_of_week, date_of_month, time_of_day, next_fire_at)] 依 next_fire_at 排序, {email: [股票代碼]})
+    """
+    now = now or datetime.now()
+    try:
+        rows = get_user_db().execute(get_sql("select_due_notification_bookmarks"), (now.strftime(FIRE_TIME_FORMAT),)).fetchall()
+    except Exception as e:
+        print(f"❌ Error retrieving due notification bookmarks: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    settings = {}
+    bookmarks: Dict[str, List[str]] = {}
+    for *setting, symbol in rows:
+        settings.setdefault(setting[0], tuple(setting))
+        symbols = bookmarks.setdefault(setting[0], [])
+        if symbol is not None:  # LEFT JOIN row of a user without notify bookmarks
+            symbols.append(symbol)
+    return list(settings.values()), bookmarks
+
+def save_next_fire_times(records: List[Tuple[Optional[str], str, Optional[str]]]) -> None:
+    """
+    一次更新多位使用者的下一次通知時間，只在 next_fire_at 仍是讀取時的值時更新，不覆寫期間由設定端點寫入的新值。
+    :param records: [(新的 next_fire_at, email, 讀取時的 next_fire_at)]
+    """
+    if not records:
+        return
+    con = get_user_db()
+    try:
+        con.executemany(get_sql("update_notification_next_fire_at"), records)
+        con.commit()
+    except Exception as e:
+        con.rollback()
+        print(f"❌ Error saving next notification times: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def reschedule_notifications(settings: List[tuple], now: Optional[datetime] = None) -> None:
+    """
+    通知寄出後依各自的設定重新計算下一次通知時間；寄送期間已修改設定的使用者保留端點寫入的時間。
+    :param settings: get_due_notification_bookmarks 回傳的設定
+    :param now: 基準時間，None 表示目前時間
+    """
+    save_next_fire_times([(compute_next_fire_time(frequency, time_of_day, day_of_week, date_of_month, now), email, next_fire_at) for email, frequency, day_of_week, date_of_month, time_of_day, next_fire_at in settings])
+
+def backfill_next_fire_times(now: Optional[datetime] = None) -> int:
+    """
+    為尚未排程（next_fire_at 為 NULL，例如新增欄位前建立）的設定計算下一次通知時間。
+    :param now: 基準時間，None 表示目前時間
+    :return: 已排程的設定數
+    """
+    try:
+        rows = get_user_db().execute(get_sql("select_unscheduled_notification_settings")).fetchall()
+    except Exception as e:
+        print(f"❌ Error retrieving unscheduled notification settings: {e}")
+        return 0
+    records = [(compute_next_fire_time(frequency, time_of_day, day_of_week, date_of_month, now), email, None) for email, frequency, day_of_week, date_of_month, time_of_day in rows]
+    records = [record for record in records if record[0] is not None]
+    save_next_fire_times(records)
+    if records:
+        print(f"✅ Scheduled next notification time for {len(records)} users.")
+    return len(records)
@@ -1,13 +1,20 @@
 # app/repositories/stocks.py
+import json
+import os
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 from fastapi import HTTPException
 
-from app.utils.app_state import get_fin_db, get_sql_path, FIXED_COLUMNS_IN_FINANCIAL
-from app.utils.file import open_sql_file
+from app.db.connection import stream_query
+from app.db.statements import get_sql, render_sql
+from app.utils.app_state import get_fin_db, FIXED_COLUMNS_IN_FINANCIAL
 from app.utils.json_helper import load_stock_category_map
 
+# days before a symbol's last stored date checked for missing trading days, older gaps are not repaired by the nightly update
+STOCK_GAP_REPAIR_DAYS = int(os.getenv("STOCK_GAP_REPAIR_DAYS", "365"))
+
 def get_serveral_stock_rank(symbols: List[str], columns: List[str], limit: Optional[int] = None):
     """
     從 stock_rank 表中查詢指定 symbol 特定範圍的任意欄數據。
@@ -16,19 +23,11 @@ def get_serveral_stock_rank(symbols: List[str], columns: List[str], limit: Optio
     :param limit: 最大返回筆數
     :return: 查詢結果 DataFrame
     """
-    sql_template = open_sql_file(get_sql_path('select_several_stock_rank'))
     select_cols = ", ".join(columns)
-    sql_template = sql_template.replace("/*SELECT_COLUMNS*/", select_cols)
-    placeholders = ",".join(["?"] * len(symbols))
-    symbol_clause = f"AND symbol IN ({placeholders})"
-    sql_template = sql_template.replace("/*SYMBOL_IN_CLAUSE*/", f"\n  {symbol_clause}")
-    params: List[object] = []
-    params.extend(symbols)
+    sql_template = render_sql('select_several_stock_rank', select_cols, n_symbols=len(symbols), has_limit=bool(limit))
+    params: List[object] = list(symbols)
     if limit:
-        sql_template = sql_template.replace("/*DATA_LIMIT*/", "LIMIT ?")
         params.append(limit)
-    else:
-        sql_template = sql_template.replace("/*DATA_LIMIT*/", "")
     try:
         df = pd.read_sql_query(sql=sql_template, con=get_fin_db(), params=params)
         if df.empty:
@@ -39,6 +38,24 @@ def get_serveral_stock_rank(symbols: List[str], columns: List[str], limit: Optio
         print(f"❌ Error retrieving table(stock rank) for {symbols}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# read financial.db to get the top ranked stocks of the latest record date in stock_rank table
+def get_top_stock_rank(limit: int = 10):
+    """
+    從 stock_rank 表中查詢最新一天依 rank 排序的前 limit 支股票。
+    :param limit: 最大返回筆數
+    :return: 查詢結果 DataFrame
+    """
+    sql_template = get_sql('select_top_stock_rank')
+    try:
+        df = pd.read_sql_query(sql=sql_template, con=get_fin_db(), params=[limit])
+        if df.empty:
+            print(f"⚠️ No ranked stocks found in table(stock rank).")
+        print(f"✅ Retrieved top {len(df)} rows in table(stock rank)")
+        return df
+    except Exception as e:
+        print(f"❌ Error retrieving top rows of table(stock rank): {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # read financial.db to get the number of lasted data in a stock_price table
 def get_stock_all_price(symbols: List[str], start_date: Optional[str] = None, end_date: Optional[str] = None, limit: Optional[int] = None) -> pd.DataFrame:
     """
@@ -50,32 +67,14 @@ def get_stock_all_price(symbols: List[str], start_date: Optional[str] = None, en
     :return: 查詢結果 DataFrame
     """
     # 載入查詢模板
-    sql_template = open_sql_file(get_sql_path('select_all_stock_price'))
-        
-    # 動態產生 IN 子句問號（參數化避免注入）
-    placeholders = ",".join(["?"] * len(symbols))
-    symbol_clause = f"AND symbol IN ({placeholders})"
-    sql_template = sql_template.replace("/*SYMBOL_IN_CLAUSE*/", f"\n  {symbol_clause}")
-
-    # 可選日期條件（用參數佔位符，值放在 params）
-    params: List[object] = []
-    params.extend(symbols)
+    sql_template = render_sql('select_all_stock_price', None, n_symbols=len(symbols), has_start=bool(start_date), has_end=bool(end_date), has_limit=bool(limit))
+    params: List[object] = list(symbols)
     if start_date:
-        sql_template = sql_template.replace("/*DATE_START_COND*/", "AND date >= ?")
         params.append(start_date)
-    else:
-        sql_template = sql_template.replace("/*DATE_START_COND*/", "")
     if end_date:
-        sql_template = sql_template.replace("/*DATE_END_COND*/", "AND date <= ?")
         params.append(end_date)
-    else:
-        sql_template = sql_template.replace("/*DATE_END_COND*/", "")
     if limit:
-        sql_template = sql_template.replace("/*DATA_LIMIT*/", "LIMIT ?")
-        params.append(limit) 
-    else:
-        sql_template = sql_template.replace("/*DATA_LIMIT*/", "")
-
+        params.append(limit)
     try:
         df = pd.read_sql_query(sql=sql_template, con=get_fin_db(), params=params) 
         if df.empty:
@@ -86,6 +85,35 @@ def get_stock_all_price(symbols: List[str], start_date: Optional[str] = None, en
         print(f"❌ Error retrieving table(stock price) for {symbols}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# stream rows of stock_price table without building a DataFrame
+def stream_stock_price(symbols: List[str], columns: Optional[List[str]] = None, start_date: Optional[str] = None, end_date: Optional[str] = None, limit: Optional[int] = None) -> Tuple[List[str], Iterator[List[tuple]]]:
+    """
+    以專用連線與 fetchmany 分批讀取 stock_price 表，記憶體用量與結果大小無關。
+    :param symbols: 股票代碼列表，例如 ["AAPL", "MSFT"]
+    :param columns: 數據欄列表，None 表示全部欄位
+    :param start_date: 起始日期 (YYYY-MM-DD)
+    :param end_date: 結束日期 (YYYY-MM-DD)
+    :param limit: 最大返回筆數
+    :return: (欄位名稱, 每次產生一批 row tuple 的 iterator)
+    """
+    if columns is None:
+        sql_template = render_sql('select_all_stock_price', None, n_symbols=len(symbols), has_start=bool(start_date), has_end=bool(end_date), has_limit=bool(limit))
+    else:
+        select_cols = ", ".join(FIXED_COLUMNS_IN_FINANCIAL + columns)
+        sql_template = render_sql('select_several_stock_price', select_cols, n_symbols=len(symbols), has_start=bool(start_date), has_end=bool(end_date), has_limit=bool(limit))
+    params: List[object] = list(symbols)
+    if start_date:
+        params.append(start_date)
+    if end_date:
+        params.append(end_date)
+    if limit:
+        params.append(limit)
+    try:
+        return stream_query(get_fin_db(), sql_template, params)
+    except Exception as e:
+        print(f"❌ Error streaming table(stock price) for {symbols}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # read financial.db to get several column date stored in stock_price table
 def get_several_stock_price(symbols: List[str], columns: List[str], start_date: Optional[str] = None, end_date: Optional[str] = None, limit: Optional[int] = None):
     """
@@ -97,27 +125,15 @@ def get_several_stock_price(symbols: List[str], columns: List[str], start_date:
     :param limit: 最大返回筆數
     :return: 查詢結果 DataFrame
     """
-    sql_template = open_sql_file(get_sql_path('select_several_stock_price'))
     select_cols = ", ".join(FIXED_COLUMNS_IN_FINANCIAL + columns)  
-    sql_template = sql_template.replace("/*SELECT_COLUMNS*/", select_cols)
-    placeholders = ",".join(["?"] * len(symbols)) 
-    sql_template = sql_template.replace("/*SYMBOL_IN_CLAUSE*/", f"AND symbol IN ({placeholders})")
+    sql_template = render_sql('select_several_stock_price', select_cols, n_symbols=len(symbols), has_start=bool(start_date), has_end=bool(end_date), has_limit=bool(limit))
     params: List[object] = list(symbols)
     if start_date:
-        sql_template = sql_template.replace("/*DATE_START_COND*/", "AND date >= ?")
         params.append(start_date)
-    else:
-        sql_template = sql_template.replace("/*DATE_START_COND*/", "")
     if end_date:
-        sql_template = sql_template.replace("/*DATE_END_COND*/", "AND date <= ?")
         params.append(end_date)
-    else:
-        sql_template = sql_template.replace("/*DATE_END_COND*/", "")
     if limit:
-        sql_template = sql_template.replace("/*DATA_LIMIT*/", "LIMIT ?")
         params.append(limit)
-    else:
-        sql_template = sql_template.replace("/*DATA_LIMIT*/", "")
     try:
         df = pd.read_sql_query(sql=sql_template, con=get_fin_db(), params=params)  
         if df.empty:
@@ -128,6 +144,84 @@ def get_several_stock_price(symbols: List[str], columns: List[str], start_date:
         print(f"❌ Error retrieving in table(stock price) for {symbols}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# read financial.db to get one keyset page of stock_price table ordered by symbol, date DESC
+def get_stock_price_page(symbols: List[str], columns: List[str], page_size: int, cursor: Optional[Tuple[str, str]] = None, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Tuple[pd.DataFrame, Optional[Tuple[str, str]]]:
+    """
+    以 (symbol, date) 為游標分頁查詢 stock_price 表，每支股票一次索引範圍掃描，任何頁的成本都與第一頁相同。
+    :param symbols: 股票代碼列表，例如 ["AAPL", "MSFT"]
+    :param columns: 數據欄列表，例如 ["close"]
+    :param page_size: 每頁筆數
+    :param cursor: 上一頁最後一筆的 (symbol, date)，None 表示第一頁
+    :param start_date: 起始日期 (YYYY-MM-DD)
+    :param end_date: 結束日期 (YYYY-MM-DD)
+    :return: (本頁 DataFrame, 下一頁游標，沒有下一頁時為 None)
+    """
+    select_cols = ", ".join(FIXED_COLUMNS_IN_FINANCIAL + columns)
+    sql_template = render_sql('select_page_stock_price', select_cols, has_start=bool(start_date), has_end=bool(end_date))
+    ordered = sorted(set(symbols))
+    if cursor is not None:
+        ordered = [s for s in ordered if s >= cursor[0]]
+    rows: List[tuple] = []
+    try:
+        db_cursor = get_fin_db().cursor()
+        for symbol in ordered:
+            # one row past the page tells whether a next page exists
+            remaining = page_size + 1 - len(rows)
+            if remaining <= 0:
+                break
+            before = cursor[1] if cursor is not None and symbol == cursor[0] else "9999-12-31"
+            params: List[object] = [symbol, before]
+            if start_date:
+                params.append(start_date)
+            if end_date:
+                params.append(end_date)
+            params.append(remaining)
+            db_cursor.execute(sql_template, params)
+            rows.extend(db_cursor.fetchall())
+        df = pd.DataFrame(rows[:page_size], columns=FIXED_COLUMNS_IN_FINANCIAL + columns)
+        next_cursor = (df["symbol"].iloc[-1], df["date"].iloc[-1]) if len(rows) > page_size else None
+        print(f"✅ Retrieved a page of {len(df)} rows for {symbols} in table(stock price)")
+        return df, next_cursor
+    except Exception as e:
+        print(f"❌ Error retrieving a page of table(stock price) for {symbols}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# read financial.db to get the last `window` rows of every symbol in stock_price table with one query
+def get_stock_price_window(symbols: List[str], columns: List[str], window: int) -> Tuple[np.ndarray, Dict[str, int], np.ndarray]:
+    """
+    一次查詢多支股票各自最近 window 筆價格，組成 NumPy 立方體供統計、預測、排名共用。
+    :param symbols: 股票代碼列表，例如 ["AAPL", "MSFT"]
+    :param columns: 數據欄列表，例如 ["close", "volume"]
+    :param window: 每支股票的筆數，例如 200
+    :return: (cube, symbol_index, dates)
+             cube shape (len(symbols), window, len(columns))，第二維由新到舊，資料不足處為 NaN
+             symbol_index 為 symbol -> cube 第一維索引
+             dates shape (len(symbols), window)，對應 cube 的日期，無資料處為 None
+    """
+    symbols = list(dict.fromkeys(symbols))
+    symbol_index = {symbol: i for i, symbol in enumerate(symbols)}
+    cube = np.full((len(symbols), window, len(columns)), np.nan)
+    dates = np.full((len(symbols), window), None, dtype=object)
+    if not symbols or window <= 0:
+        return cube, symbol_index, dates
+    select_cols = ", ".join(f"p.{c}" for c in FIXED_COLUMNS_IN_FINANCIAL + columns)
+    sql_template = render_sql('select_window_stock_price', select_cols)
+    params = [window - 1, json.dumps(symbols)] # OFFSET window - 1 gives each symbol's oldest date in the window
+    try:
+        df = pd.read_sql_query(sql=sql_template, con=get_fin_db(), params=params)
+    except Exception as e:
+        print(f"❌ Error retrieving price window in table(stock price) for {len(symbols)} symbols: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if df.empty:
+        print(f"⚠️ No data found for requested {len(symbols)} symbols in table(stock price).")
+        return cube, symbol_index, dates
+    rows = df['symbol'].map(symbol_index).to_numpy()
+    offsets = df.groupby('symbol', sort=False).cumcount().to_numpy() # 0 is the newest row of each symbol
+    cube[rows, offsets] = df[columns].to_numpy(dtype=float)
+    dates[rows, offsets] = df['date'].to_numpy()
+    print(f"✅ Retrieved {len(df)} rows of prices({columns}) for {len(symbols)} symbols in table(stock price)")
+    return cube, symbol_index, dates
+
 # read financial.db to get several column date stored in stock_statistics table
 def get_several_stock_statistics(symbols: List[str], columns: List[str], start_date: Optional[str] = None, end_date: Optional[str] = None, limit: Optional[int] = None):
     """
@@ -139,29 +233,15 @@ def get_several_stock_statistics(symbols: List[str], columns: List[str], start_d
     :param limit: 最大返回筆數
     :return: 查詢結果 DataFrame
     """
-    sql_template = open_sql_file(get_sql_path('select_several_stock_statistics'))
     select_cols = ", ".join(columns)
-    sql_template = sql_template.replace("/*SELECT_COLUMNS*/", select_cols)
-    placeholders = ",".join(["?"] * len(symbols))
-    symbol_clause = f"AND symbol IN ({placeholders})"
-    sql_template = sql_template.replace("/*SYMBOL_IN_CLAUSE*/", f"\n  {symbol_clause}")
-    params: List[object] = []
-    params.extend(symbols)
+    sql_template = render_sql('select_several_stock_statistics', select_cols, n_symbols=len(symbols), has_start=bool(start_date), has_end=bool(end_date), has_limit=bool(limit))
+    params: List[object] = list(symbols)
     if start_date:
-        sql_template = sql_template.replace("/*TIMESTAMP_START_COND*/", "AND date >= ?")
         params.append(start_date)
-    else:
-        sql_template = sql_template.replace("/*TIMESTAMP_START_COND*/", "")
     if end_date:
-        sql_template = sql_template.replace("/*TIMESTAMP_END_COND*/", "AND date <= ?")
         params.append(end_date)
-    else:
-        sql_template = sql_template.replace("/*TIMESTAMP_END_COND*/", "")
     if limit:
-        sql_template = sql_template.replace("/*DATA_LIMIT*/", "LIMIT ?")
         params.append(limit)
-    else:
-        sql_template = sql_template.replace("/*DATA_LIMIT*/", "")
     try:
         df = pd.read_sql_query(sql=sql_template, con=get_fin_db(), params=params)
         if df.empty:
@@ -183,29 +263,15 @@ def get_several_stock_predictions(symbols: List[str], columns: List[str], start_
     :param limit: 最大返回筆數
     :return: 查詢結果 DataFrame
     """
-    sql_template = open_sql_file(get_sql_path('select_several_stock_predictions'))
     select_cols = ", ".join(columns)
-    sql_template = sql_template.replace("/*SELECT_COLUMNS*/", select_cols)
-    placeholders = ",".join(["?"] * len(symbols))
-    symbol_clause = f"AND symbol IN ({placeholders})"
-    sql_template = sql_template.replace("/*SYMBOL_IN_CLAUSE*/", f"\n  {symbol_clause}")
-    params: List[object] = []
-    params.extend(symbols)
+    sql_template = render_sql('select_several_stock_predictions', select_cols, n_symbols=len(symbols), has_start=bool(start_date), has_end=bool(end_date), has_limit=bool(limit))
+    params: List[object] = list(symbols)
     if start_date:
-        sql_template = sql_template.replace("/*TIMESTAMP_START_COND*/", "AND date >= ?")
         params.append(start_date)
-    else:
-        sql_template = sql_template.replace("/*TIMESTAMP_START_COND*/", "")
     if end_date:
-        sql_template = sql_template.replace("/*TIMESTAMP_END_COND*/", "AND date <= ?")
         params.append(end_date)
-    else:
-        sql_template = sql_template.replace("/*TIMESTAMP_END_COND*/", "")
     if limit:
-        sql_template = sql_template.replace("/*DATA_LIMIT*/", "LIMIT ?")
         params.append(limit)
-    else:
-        sql_template = sql_template.replace("/*DATA_LIMIT*/", "")
     try:
         df = pd.read_sql_query(sql=sql_template, con=get_fin_db(), params=params)
         if df.empty:
@@ -217,12 +283,46 @@ def get_several_stock_predictions(symbols: List[str], columns: List[str], start_
         print(f"❌ Error retrieving table(stock predictions) for {symbols}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# read financial.db to get the latest statistics of every symbol in stock_statistics table
+def get_latest_stock_statistics(symbols: List[str], columns: List[str]) -> pd.DataFrame:
+    """
+    一次查詢每支股票在 stock_statistics 表中最新一筆統計，每個 symbol 一列。
+    :param symbols: 股票代碼列表，例如 ["AAPL", "MSFT"]
+    :param columns: 數據欄列表，需包含 "symbol"，例如 ["symbol", "days200_ma"]
+    :return: 查詢結果 DataFrame，沒有統計的 symbol 不列入
+    """
+    sql_template = render_sql('select_latest_stock_statistics', ", ".join(columns), n_symbols=len(symbols))
+    try:
+        df = pd.read_sql_query(sql=sql_template, con=get_fin_db(), params=list(symbols))
+        print(f"✅ Retrieved latest statistics for {len(df)} symbols in table(stock statistics)")
+        return df[columns]
+    except Exception as e:
+        print(f"❌ Error retrieving latest table(stock statistics): {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# read financial.db to get the latest prediction of every symbol in stock_predictions table
+def get_latest_stock_predictions(symbols: List[str], columns: List[str]) -> pd.DataFrame:
+    """
+    一次查詢每支股票在 stock_predictions 表中最新一筆預測，每個 symbol 一列。
+    :param symbols: 股票代碼列表，例如 ["AAPL", "MSFT"]
+    :param columns: 數據欄列表，需包含 "symbol"，例如 ["symbol", "predicted_real"]
+    :return: 查詢結果 DataFrame，沒有預測的 symbol 不列入
+    """
+    sql_template = render_sql('select_latest_stock_predictions', ", ".join(columns), n_symbols=len(symbols))
+    try:
+        df = pd.read_sql_query(sql=sql_template, con=get_fin_db(), params=list(symbols))
+        print(f"✅ Retrieved latest predictions for {len(df)} symbols in table(stock predictions)")
+        return df[columns]
+    except Exception as e:
+        print(f"❌ Error retrieving latest table(stock predictions): {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # read financial.db to get last date stored in stock_price table and return the next date as start_date
 def select_stock_start_date(database: str = "financial.db"):
     start_date = ""
     try:
         cursor = get_fin_db().cursor()
-        sql_template = open_sql_file(get_sql_path("select_last_date_stock_price"))
+        sql_template = get_sql("select_last_date_stock_price")
         cursor.execute(sql_template)
         row = cursor.fetchone()
         if row and row[0]:
@@ -237,12 +337,34 @@ def select_stock_start_date(database: str = "financial.db"):
         print(f"❌ Could not determine last stored date in stock_price table, falling back to default. Error: {e}")
         return "2015-01-01"
 
+# read financial.db to get the last stored date and the first missing trading day of every symbol in stock_price table
+def get_stock_price_watermarks(calendar_symbol: str = "^GSPC", repair_days: Optional[int] = None) -> Dict[str, Dict[str, Optional[str]]]:
+    """
+    一次查詢每支股票在 stock_price 表中的最後日期，並以 index_price 中 calendar_symbol 的交易日檢查最近 repair_days 天內的缺漏，
+    已下載過但來源沒有資料的交易日（stock_price_gap_attempt）不算缺漏。
+    :param calendar_symbol: 作為交易日曆的指數代碼
+    :param repair_days: 檢查缺漏的天數，None 表示 STOCK_GAP_REPAIR_DAYS
+    :return: {symbol: {"last_date": 最後日期, "first_gap": 區間內第一個缺漏的交易日，沒有缺漏為 None}}
+    """
+    sql_template = get_sql('select_stock_price_watermarks')
+    window = f"-{STOCK_GAP_REPAIR_DAYS if repair_days is None else repair_days} days"
+    try:
+        cursor = get_fin_db().cursor()
+        cursor.execute(sql_template, (window, calendar_symbol, calendar_symbol))
+        watermarks = {symbol: {"last_date": last_date, "first_gap": first_gap} for symbol, last_date, first_gap in cursor.fetchall()}
+        n_gaps = sum(1 for mark in watermarks.values() if mark["first_gap"])
+        print(f"✅ Retrieved watermarks for {len(watermarks)} symbols in table(stock price), {n_gaps} with gaps")
+        return watermarks
+    except Exception as e:
+        print(f"❌ Error retrieving watermarks of table(stock price): {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # read financial.db to get last date stored in stock_price table
 def get_last_date_stock_price(database: str = "financial.db"):
     last_date = ""
     try:
         cursor = get_fin_db().cursor()
-        sql_template = open_sql_file(get_sql_path("select_last_date_stock_price"))
+        sql_template = get_sql("select_last_date_stock_price")
         cursor.execute(sql_template)
         row = cursor.fetchone()
         if row and row[0]:
@@ -261,7 +383,7 @@ def get_last_date_stock_price(database: str = "financial.db"):
 def get_any_date_stock_price(ticker: str, offset: int, database: str = "financial.db"):
     try:
         cursor = get_fin_db().cursor()
-        sql_template = open_sql_file(get_sql_path("select_any_date_stock_price"))
+        sql_template = get_sql("select_any_date_stock_price")
         cursor.execute(sql_template, (ticker, (offset - 1))) # OFFSET window_size - 1 to get the Nth(window_size) record
         row = cursor.fetchone()
         if row and row[0]:
@@ -279,7 +401,7 @@ def get_last_timestamp_stock_statistics():
     last_timestamp = ""
     try:
         cursor = get_fin_db().cursor()
-        sql_template = open_sql_file(get_sql_path("select_last_timestamp_stock_statistics"))
+        sql_template = get_sql("select_last_timestamp_stock_statistics")
         cursor.execute(sql_template)
         row = cursor.fetchone()
         if row and row[0]:
@@ -298,7 +420,7 @@ def get_last_stock_window_end_date(database: str = "financial.db"):
     last_window_end_date = ""
     try:
         cursor = get_fin_db().cursor()
-        sql_template = open_sql_file(get_sql_path("select_last_wedate_stock_predictions"))
+        sql_template = get_sql("select_last_wedate_stock_predictions")
         cursor.execute(sql_template)
         row = cursor.fetchone()
         last_window_end_date = row[0]
@@ -313,7 +435,7 @@ def get_last_stock_days200_end_date(database: str = "financial.db"):
     last_days200_end_date = ""
     try:
         cursor = get_fin_db().cursor()
-        sql_template = open_sql_file(get_sql_path("select_last_d200edate_stock_statistics"))
+        sql_template = get_sql("select_last_d200edate_stock_statistics")
         cursor.execute(sql_template)
         row = cursor.fetchone()
         last_days200_end_date = row[0]
@@ -339,7 +461,7 @@ def get_stock_detail(symbol: str):
     :param symbol: 股票代碼，例如 "AAPL"
     :return: 查詢結果 DataFrame
     """
-    sql_template = open_sql_file(get_sql_path('select_detail_stock_detail'))
+    sql_template = get_sql('select_detail_stock_detail')
     params = (symbol,)
     try:
         df = pd.read_sql_query(sql=sql_template, con=get_fin_db(), params=params)
@@ -356,7 +478,7 @@ def get_stock_category():
     從 stock_detail 表中查詢所有股票的分類資料。
     :return: 查詢結果 DataFrame
     """
-    sql_template = open_sql_file(get_sql_path('select_category_stock_detail'))
+    sql_template = get_sql('select_category_stock_detail')
     try:
         df = pd.read_sql_query(sql=sql_template, con=get_fin_db())
         if df.empty:
@@ -7,8 +7,9 @@ from app.dependencies import get_current_user, get_db
 from app.models import Bookmark, User, BookmarkCreate
 from app.database import SessionLocal
 
-from app.utils.file import open_sql_file
-from app.utils.app_state import get_sql_path, get_user_db
+from app.db.statements import get_sql
+from app.utils.app_state import get_user_db
+from app.utils.notification_time import compute_next_fire_time
 import pandas as pd
 
 router = APIRouter(prefix="/bookmarks", tags=["bookmarks"])
@@ -26,7 +27,7 @@ async def api_add_bookmark(
     symbol: str,
     email: str,
 ): 
-    sql = open_sql_file(get_sql_path('insert_bookmark'))
+    sql = get_sql('insert_bookmark')
     params = (email, symbol)
     con = get_user_db()
     try:
@@ -43,7 +44,7 @@ async def api_remove_bookmark(
     symbol: str,
     email: str,
 ):
-    sql = open_sql_file(get_sql_path('delete_bookmark'))
+    sql = get_sql('delete_bookmark')
     params = (email, symbol)
     con = get_user_db()
     try:
@@ -59,7 +60,7 @@ async def api_remove_bookmark(
 async def api_remove_all_bookmarks(
     email: str,
 ):
-    sql = open_sql_file(get_sql_path('delete_all_bookmarks'))
+    sql = get_sql('delete_all_bookmarks')
     params = (email,)
     con = get_user_db()
     try:
@@ -75,7 +76,7 @@ async def api_remove_all_bookmarks(
 async def api_get_bookmarks(
     email: str,
 ):
-    sql = open_sql_file(get_sql_path("select_bookmark"))
+    sql = get_sql("select_bookmark")
     con = get_user_db()
     try:
         df = con.execute(sql, (email,)).fetchall()
@@ -91,7 +92,7 @@ async def api_get_bookmarks(
 async def api_get_bookmarks_with_notify(
     email: str,
 ):
-    sql = open_sql_file(get_sql_path("select_bookmark_notify"))
+    sql = get_sql("select_bookmark_notify")
     con = get_user_db()
     try:
         df = con.execute(sql, (email,)).fetchall()
@@ -108,7 +109,7 @@ async def api_update_bookmark_notify(
     email: str,
     symbol: str
 ):
-    sql = open_sql_file(get_sql_path("update_bookmark_notify"))
+    sql = get_sql("update_bookmark_notify")
     params = (email, symbol)
     con = get_user_db()
     try:
@@ -128,8 +129,9 @@ async def api_update_notification_setting(
     day_of_week: str = None,
     date_of_month: int = None
 ):
-    sql = open_sql_file(get_sql_path("update_notification_setting"))
-    params = (frequency, day_of_week, date_of_month, time_of_day, email)
+    sql = get_sql("update_notification_setting")
+    next_fire_at = compute_next_fire_time(frequency, time_of_day, day_of_week, date_of_month) # scheduler looks users up by this column
+    params = (frequency, day_of_week, date_of_month, time_of_day, next_fire_at, email)
     con = get_user_db()
     try:
         con.execute(sql, params)
@@ -146,8 +148,8 @@ async def api_update_notification_setting(
 async def api_add_notification_setting(
     email: str,
 ):
-    sql = open_sql_file(get_sql_path("insert_notification_setting"))
-    params = (email, 'daily', None, None, '08:00')  # Default values for frequency, day_of_week, date_of_month, time_of_day
+    sql = get_sql("insert_notification_setting")
+    params = (email, 'daily', None, None, '08:00', compute_next_fire_time('daily', '08:00'))  # Default values for frequency, day_of_week, date_of_month, time_of_day, next_fire_at
     con = get_user_db()
     try:
         con.execute(sql, params)
@@ -162,7 +164,7 @@ async def api_add_notification_setting(
 async def api_delete_notification_setting(
     email: str,
 ):
-    sql = open_sql_file(get_sql_path("delete_notification_setting"))
+    sql = get_sql("delete_notification_setting")
     params = (email,)
     con = get_user_db()
     try:
@@ -178,7 +180,7 @@ async def api_delete_notification_setting(
 async def api_get_notification_setting(
     email: str,
 ):
-    sql = open_sql_file(get_sql_path("select_notification_setting"))
+    sql = get_sql("select_notification_setting")
     con = get_user_db()
     try:
         df = con.execute(sql, (email,)).fetchone()
@@ -199,7 +201,7 @@ async def api_get_notification_setting(
 
 @router.get("/get_emails_with_notify_bookmarks")
 async def api_get_emails_with_notify_bookmarks():
-    sql = open_sql_file(get_sql_path("select_emails_with_notify_bookmarks"))
+    sql = get_sql("select_emails_with_notify_bookmarks")
     con = get_user_db()
     try:
         df = con.execute(sql).fetchall()
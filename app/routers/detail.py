@@ -3,6 +3,7 @@
 from fastapi import APIRouter, HTTPException, Query
 
 from app.repositories.stocks import get_stock_detail
+from app.utils.cache import response_cache
 
 router = APIRouter(prefix="/detail", tags=["detail"])
 
@@ -17,11 +18,13 @@ async def api_get_stock_detail(
         # 輸入驗證
         if not symbol:
             raise HTTPException(status_code=404, detail=f"symbols must not be empty")
-        df = get_stock_detail(
-            symbol=symbol
-        )
-        result = df.to_dict(orient="records") # 將 DataFrame 轉為 JSON 格式輸出
-        return {"search": symbol, "data": result}
+        def load():
+            df = get_stock_detail(
+                symbol=symbol
+            )
+            result = df.to_dict(orient="records") # 將 DataFrame 轉為 JSON 格式輸出
+            return {"search": symbol, "data": result}
+        return response_cache.get_or_compute("detail/stock", {"symbol": symbol}, load)
     except HTTPException as e:
         raise e
     except Exception as e:
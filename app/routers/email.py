@@ -1,21 +1,18 @@
 # app/routers/email.py
 
+import asyncio
 from fastapi import APIRouter, HTTPException
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.image import MIMEImage
 from io import BytesIO
-from datetime import datetime, timedelta
-import plotly.graph_objects as go
-import base64
 
-from app.repositories.stocks import get_several_stock_price
+from app.services.charts import get_chart_base64
+from app.services.mailer import MAIL_FROM, mail_queue
 
 router = APIRouter(prefix="/email", tags=["email"])
 
-sender_email = "ifmapyishu3@gmail.com"
-sender_password = "wrvukaqqnzcszwge"
+sender_email = MAIL_FROM
 
 @router.post("/send")
 async def api_send_email(
@@ -42,10 +39,8 @@ async def api_send_email(
     message.attach(MIMEText(html_body, "html"))
 
     try:
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.send_message(message)
+        # queued on the shared SMTP sessions, awaited without blocking the event loop
+        await asyncio.wrap_future(mail_queue.enqueue(message))
 
         print(f"Sending email to {email} successfully.")
         return {"message": f"Email sent to {email} successfully."}
@@ -55,29 +50,5 @@ async def api_send_email(
 def generate_stock_chart(
         symbol: str,
 ):
-    end_date = datetime.utcnow().date()
-    start_date = (end_date - timedelta(days=30)).strftime("%Y-%m-%d")
-    end_date_str = end_date.strftime("%Y-%m-%d")
-
-    df = get_several_stock_price(
-        symbols=[symbol],
-        columns=["open", "high", "low", "close"],
-        start_date=start_date,
-        end_date=end_date_str,
-    )
-
-    if df.empty:
-        raise ValueError("No stock price data available for the specified symbol and date range.")
-
-    fig = go.Figure(data=[go.Candlestick(x=df.index,
-        open=df['open'], high=df['high'],
-        low=df['low'], close=df['close'])])
-    
-    fig.update_layout(title=f"{symbol} Price (Past Month)",
-                      yaxis_title="Price",
-                      xaxis_title="Date",
-                      height=500)
-    
-    # Convert to base64 PNG
-    img_bytes = fig.to_image(format="png", width=800, height=500)
-    return base64.b64encode(img_bytes).decode()
\ No newline at end of file
+    # base64 PNG, rendered once per symbol and data version by the chart service
+    return get_chart_base64(symbol)
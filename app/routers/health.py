@@ -1,8 +1,31 @@
 # app/routers/health.py
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.core.scheduler import job_metrics
+from app.utils.app_state import get_startup_steps, is_startup_ready
+from app.utils.cache import response_cache
 
 router = APIRouter()
 
 @router.get("/")
 async def root():
     return {"message": "Server is running"}
+
+@router.get("/ready")
+async def ready():
+    """readiness probe, 503 until the serving-critical startup steps are done"""
+    steps = get_startup_steps()
+    if not is_startup_ready():
+        return JSONResponse(status_code=503, content={"ready": False, "steps": steps})
+    return {"ready": True, "steps": steps}
+
+@router.get("/cache")
+async def cache_stats():
+    """response cache hit/miss counters, size and the data version it serves"""
+    return response_cache.stats()
+
+@router.get("/scheduler")
+async def scheduler_stats():
+    """per-job run counts, errors, skipped overlapping runs and durations in seconds"""
+    return job_metrics.stats()
@@ -1,10 +1,13 @@
 # app/routers/prices.py
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 
-from app.repositories.indexes import get_index_all_price, get_several_index_price
-from app.repositories.stocks import get_stock_all_price, get_several_stock_price
+from app.repositories.indexes import get_index_all_price, get_several_index_price, stream_index_price
+from app.repositories.stocks import get_stock_all_price, get_several_stock_price, get_stock_price_page, stream_stock_price
 from app.utils.app_state import ALLOWED_COLUMNS_IN_FINANCIAL
+from app.utils.cache import conditional_response, response_cache
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.response_format import FORMAT_PATTERN, STREAM_FORMATS, format_response, frame_payload, stream_response
 
 router = APIRouter(prefix="/prices", tags=["prices"])
 
@@ -13,7 +16,8 @@ def query_all_index_data(
     symbols: List[str] = Query(['^GSPC'], description="指數代碼，例如 ['^GSPC']"),
     start_date: Optional[str] = Query(None, description="起始日期 (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="結束日期 (YYYY-MM-DD)"),
-    limit: Optional[int] = Query(None, ge=1, le=10000, description="返回筆數上限，預設關閉")
+    limit: Optional[int] = Query(None, ge=1, le=10000, description="返回筆數上限，預設關閉"),
+    format: str = Query("records", pattern=FORMAT_PATTERN, description="回應格式：records（預設）、columnar、arrow，或串流輸出的 ndjson、csv")
 ):
     """
     從統一的 index_price 資料表查詢多隻指數的全部歷史價格資料。
@@ -22,14 +26,20 @@ def query_all_index_data(
     try:
         if not symbols:
             raise ValueError("symbols must not be empty")
-        df = get_index_all_price(
-            symbols=symbols,
-            start_date=start_date,
-            end_date=end_date,
-            limit=limit
-        )
-        result = df.to_dict(orient="records") # 將 DataFrame 轉為 JSON 格式輸出
-        return {"count": len(result), "data": result}
+        if format in STREAM_FORMATS:
+            # streamed from a cursor in fetchmany batches, bypasses the response cache so memory stays flat
+            return stream_response(stream_index_price(symbols, start_date=start_date, end_date=end_date, limit=limit), format)
+        def load():
+            df = get_index_all_price(
+                symbols=symbols,
+                start_date=start_date,
+                end_date=end_date,
+                limit=limit
+            )
+            return frame_payload(df, format)
+        # served from memory until the next ingest bumps the data version
+        payload = response_cache.get_or_compute("prices/index/query-all", {"symbols": symbols, "start_date": start_date, "end_date": end_date, "limit": limit, "format": format}, load)
+        return format_response(payload, format)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -40,7 +50,8 @@ def query_all_stock_data(
     symbols: List[str] = Query(['AAPL'], description="股票代碼，例如 ['AAPL', 'MSFT']"),
     start_date: Optional[str] = Query(None, description="起始日期 (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="結束日期 (YYYY-MM-DD)"),
-    limit: Optional[int] = Query(None, ge=1, le=10000, description="返回筆數上限，預設關閉")
+    limit: Optional[int] = Query(None, ge=1, le=10000, description="返回筆數上限，預設關閉"),
+    format: str = Query("records", pattern=FORMAT_PATTERN, description="回應格式：records（預設）、columnar、arrow，或串流輸出的 ndjson、csv")
 ):
     """
     從統一的 stock_price 資料表查詢多支股票的全部歷史價格資料。
@@ -49,14 +60,20 @@ def query_all_stock_data(
     try:
         if not symbols:
             raise ValueError("symbols must not be empty")
-        df = get_stock_all_price(
-            symbols=symbols,
-            start_date=start_date,
-            end_date=end_date,
-            limit=limit
-        )
-        result = df.to_dict(orient="records") # 將 DataFrame 轉為 JSON 格式輸出
-        return {"count": len(result), "data": result}
+        if format in STREAM_FORMATS:
+            # streamed from a cursor in fetchmany batches, bypasses the response cache so memory stays flat
+            return stream_response(stream_stock_price(symbols, start_date=start_date, end_date=end_date, limit=limit), format)
+        def load():
+            df = get_stock_all_price(
+                symbols=symbols,
+                start_date=start_date,
+                end_date=end_date,
+                limit=limit
+            )
+            return frame_payload(df, format)
+        # served from memory until the next ingest bumps the data version
+        payload = response_cache.get_or_compute("prices/stock/query-all", {"symbols": symbols, "start_date": start_date, "end_date": end_date, "limit": limit, "format": format}, load)
+        return format_response(payload, format)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -68,7 +85,8 @@ def query_several_index_data(
     columns: List[str] = Query(['close'], description="指數價格種類，例如 ['open', 'close']"),
     start_date: Optional[str] = Query(None, description="起始日期 (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="結束日期 (YYYY-MM-DD)"),
-    limit: Optional[int] = Query(None, ge=1, le=10000, description="返回筆數上限，預設關閉")
+    limit: Optional[int] = Query(None, ge=1, le=10000, description="返回筆數上限，預設關閉"),
+    format: str = Query("records", pattern=FORMAT_PATTERN, description="回應格式：records（預設）、columnar、arrow，或串流輸出的 ndjson、csv")
 ):
     """
     從統一的 index_price 資料表查詢多支指數不同價格的歷史資料。
@@ -84,15 +102,21 @@ def query_several_index_data(
         for c in columns:
             if c not in ALLOWED_COLUMNS_IN_FINANCIAL:
                 raise HTTPException(status_code=404, detail=f"nvalid column: {c}")
-        df = get_several_index_price(
-            symbols=symbols,
-            columns=columns,
-            start_date=start_date,
-            end_date=end_date,
-            limit=limit
-        )
-        result = df.to_dict(orient="records") # 將 DataFrame 轉為 JSON 格式輸出
-        return {"count": len(result), "data": result}
+        if format in STREAM_FORMATS:
+            # streamed from a cursor in fetchmany batches, bypasses the response cache so memory stays flat
+            return stream_response(stream_index_price(symbols, columns=columns, start_date=start_date, end_date=end_date, limit=limit), format)
+        def load():
+            df = get_several_index_price(
+                symbols=symbols,
+                columns=columns,
+                start_date=start_date,
+                end_date=end_date,
+                limit=limit
+            )
+            return frame_payload(df, format)
+        # served from memory until the next ingest bumps the data version
+        payload = response_cache.get_or_compute("prices/index/query-several", {"symbols": symbols, "columns": columns, "start_date": start_date, "end_date": end_date, "limit": limit, "format": format}, load)
+        return format_response(payload, format)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -100,17 +124,25 @@ def query_several_index_data(
 
 @router.get("/stock/query-several")
 def query_several_stock_data(
+    request: Request,
+    response: Response,
     symbols: List[str] = Query(['AAPL'], description="股票代碼，例如 ['AAPL', 'MSFT']"),
     columns: List[str] = Query(['close'], description="股票價格種類，例如 ['open', 'close']"),
     start_date: Optional[str] = Query(None, description="起始日期 (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="結束日期 (YYYY-MM-DD)"),
-    limit: Optional[int] = Query(None, ge=1, le=10000, description="返回筆數上限，預設關閉")
+    limit: Optional[int] = Query(None, ge=1, le=10000, description="返回筆數上限，預設關閉"),
+    format: str = Query("records", pattern=FORMAT_PATTERN, description="回應格式：records（預設）、columnar、arrow，或串流輸出的 ndjson、csv")
 ):
     """
     從統一的 stock_price 資料表查詢多支股票不同價格的歷史資料。
     支援日期篩選與筆數限制。
     """
     try:
+        # the frontend polls this endpoint, answer 304 from the data version before touching the database
+        params = {"symbols": symbols, "columns": columns, "start_date": start_date, "end_date": end_date, "limit": limit, "format": format}
+        not_modified = conditional_response(request, response, "prices/stock/query-several", params)
+        if not_modified is not None:
+            return not_modified
          # 輸入驗證
         if not symbols:
             raise HTTPException(status_code=404, detail=f"symbols must not be empty")
@@ -120,15 +152,67 @@ def query_several_stock_data(
         for c in columns:
             if c not in ALLOWED_COLUMNS_IN_FINANCIAL:
                 raise HTTPException(status_code=404, detail=f"nvalid column: {c}")
-        df = get_several_stock_price(
-            symbols=symbols,
-            columns=columns,
-            start_date=start_date,
-            end_date=end_date,
-            limit=limit
-        )
-        result = df.to_dict(orient="records") # 將 DataFrame 轉為 JSON 格式輸出
-        return {"count": len(result), "data": result}
+        if format in STREAM_FORMATS:
+            # streamed from a cursor in fetchmany batches, bypasses the response cache so memory stays flat
+            return stream_response(stream_stock_price(symbols, columns=columns, start_date=start_date, end_date=end_date, limit=limit), format, response)
+        def load():
+            df = get_several_stock_price(
+                symbols=symbols,
+                columns=columns,
+                start_date=start_date,
+                end_date=end_date,
+                limit=limit
+            )
+            return frame_payload(df, format)
+        # served from memory until the next ingest bumps the data version
+        payload = response_cache.get_or_compute("prices/stock/query-several", params, load)
+        return format_response(payload, format, response)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/stock/page")
+def query_stock_price_page(
+    symbols: List[str] = Query(['AAPL'], description="股票代碼，例如 ['AAPL', 'MSFT']"),
+    columns: List[str] = Query(['close'], description="股票價格種類，例如 ['open', 'close']"),
+    start_date: Optional[str] = Query(None, description="起始日期 (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="結束日期 (YYYY-MM-DD)"),
+    page_size: int = Query(1000, ge=1, le=10000, description="每頁筆數"),
+    cursor: Optional[str] = Query(None, description="上一頁回傳的 next_cursor，第一頁不帶"),
+    format: str = Query("records", pattern="^(records|columnar)$", description="回應格式：records（預設）或 columnar")
+):
+    """
+    以游標分頁查詢多支股票的歷史價格，依 symbol、date 由新到舊排序。
+    下一頁帶入回傳的 next_cursor，next_cursor 為 null 表示已是最後一頁。
+    """
+    try:
+        # 輸入驗證
+        if not symbols:
+            raise HTTPException(status_code=404, detail=f"symbols must not be empty")
+        if not columns:
+            raise HTTPException(status_code=404, detail=f"column must not be empty")
+        for c in columns:
+            if c not in ALLOWED_COLUMNS_IN_FINANCIAL:
+                raise HTTPException(status_code=404, detail=f"nvalid column: {c}")
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        def load():
+            df, next_cursor = get_stock_price_page(
+                symbols=symbols,
+                columns=columns,
+                page_size=page_size,
+                cursor=after,
+                start_date=start_date,
+                end_date=end_date
+            )
+            payload = frame_payload(df, format)
+            payload["next_cursor"] = encode_cursor(*next_cursor) if next_cursor else None
+            return payload
+        payload = response_cache.get_or_compute("prices/stock/page", {"symbols": symbols, "columns": columns, "start_date": start_date, "end_date": end_date, "page_size": page_size, "cursor": cursor, "format": format}, load)
+        return format_response(payload, format)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -1,7 +1,8 @@
 # app/routers/rank.py
 from typing import List
 from fastapi import APIRouter, HTTPException, Query
-from app.repositories.stocks import get_serveral_stock_rank
+from app.repositories.stocks import get_serveral_stock_rank, get_top_stock_rank
+from app.utils.cache import response_cache
 
 router = APIRouter(prefix="/rank", tags=["rank"])
 
@@ -16,9 +17,29 @@ async def api_get_stock_rank(
         # Validate input parameters
         if not symbol:
             raise HTTPException(status_code=404, detail=f"symbols must not be empty")
-        df = get_serveral_stock_rank(symbols=symbol, columns=['symbol', 'industry', 'current_price', 'potential'], limit=1)
-        result = df.to_dict(orient="records") # 將 DataFrame 轉為 JSON 格式輸出
-        return {"search": symbol, "data": result}
+        def load():
+            df = get_serveral_stock_rank(symbols=symbol, columns=['symbol', 'industry', 'current_price', 'potential', 'rank'], limit=1)
+            result = df.to_dict(orient="records") # 將 DataFrame 轉為 JSON 格式輸出
+            return {"search": symbol, "data": result}
+        return response_cache.get_or_compute("rank/stock", {"symbol": symbol}, load)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/top")
+async def api_get_top_stock_rank(
+    limit: int = Query(10, ge=1, le=500, description="返回筆數"),
+):
+    """
+    Get the highest ranked stocks of the latest ranking
+    """
+    try:
+        def load():
+            df = get_top_stock_rank(limit=limit)
+            result = df.to_dict(orient="records") # 將 DataFrame 轉為 JSON 格式輸出
+            return {"limit": limit, "data": result}
+        return response_cache.get_or_compute("rank/top", {"limit": limit}, load)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -1,15 +1,18 @@
 # app/routers/recommendation.py
 from typing import List
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 import pandas as pd
 
 from app.repositories.indexes import get_several_index_predictions, get_several_index_statistics
 from app.repositories.stocks import get_several_stock_statistics, get_several_stock_predictions
+from app.utils.cache import conditional_response, response_cache
 
 router = APIRouter(prefix="/recommendation", tags=["recommendation"])
 
 @router.get("/stock")
 async def api_get_stock_prediction(
+    request: Request,
+    response: Response,
     symbol: List[str] = Query(['AAPL'], description="股票代碼，例如 'AAPL', 'MSFT'"),
 ):
     """
@@ -17,14 +20,20 @@ async def api_get_stock_prediction(
     """
     
     try:
+        # the frontend polls this endpoint, answer 304 from the data version before touching the database
+        not_modified = conditional_response(request, response, "recommendation/stock", {"symbol": symbol})
+        if not_modified is not None:
+            return not_modified
         # 輸入驗證
         if not symbol:
             raise HTTPException(status_code=404, detail=f"symbols must not be empty")
-        df_st = get_several_stock_statistics(symbols=symbol, columns=['days200_ma'], limit=1)
-        df_pd = get_several_stock_predictions(symbols=symbol, columns=['predicted_real', 'recommendation'], limit=1)
-        df = pd.concat([df_st, df_pd], axis=1)
-        result = df.to_dict(orient="records") # 將 DataFrame 轉為 JSON 格式輸出
-        return {"search": symbol, "data": result}
+        def load():
+            df_st = get_several_stock_statistics(symbols=symbol, columns=['days200_ma'], limit=1)
+            df_pd = get_several_stock_predictions(symbols=symbol, columns=['predicted_real', 'recommendation'], limit=1)
+            df = pd.concat([df_st, df_pd], axis=1)
+            result = df.to_dict(orient="records") # 將 DataFrame 轉為 JSON 格式輸出
+            return {"search": symbol, "data": result}
+        return response_cache.get_or_compute("recommendation/stock", {"symbol": symbol}, load)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -44,11 +53,13 @@ async def api_get_index_prediction(
         # 輸入驗證
         if not symbol:
             raise HTTPException(status_code=404, detail=f"symbols must not be empty")
-        df_st = get_several_index_statistics(symbols=symbol, columns=['days200_ma'], limit=1)
-        df_pd = get_several_index_predictions(symbols=symbol, columns=['predicted_real', 'recommendation'], limit=1)
-        df = pd.concat([df_st, df_pd], axis=1)
-        result = df.to_dict(orient="records") # 將 DataFrame 轉為 JSON 格式輸出
-        return {"search": symbol, "data": result}
+        def load():
+            df_st = get_several_index_statistics(symbols=symbol, columns=['days200_ma'], limit=1)
+            df_pd = get_several_index_predictions(symbols=symbol, columns=['predicted_real', 'recommendation'], limit=1)
+            df = pd.concat([df_st, df_pd], axis=1)
+            result = df.to_dict(orient="records") # 將 DataFrame 轉為 JSON 格式輸出
+            return {"search": symbol, "data": result}
+        return response_cache.get_or_compute("recommendation/index", {"symbol": symbol}, load)
     except HTTPException as e:
         raise e
     except Exception as e:
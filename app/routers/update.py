@@ -1,6 +1,8 @@
 # app/routers/update.py
+import asyncio
 from fastapi import APIRouter
-from app.tasks.jobs import update_financial_data_job
+from app.tasks.jobs import run_index_statistics_on_startup, run_stock_statistics_on_startup, update_financial_data_job
+from app.utils.app_state import get_tickers
 
 router = APIRouter(prefix="/update", tags=["update"])
 
@@ -8,4 +10,11 @@ router = APIRouter(prefix="/update", tags=["update"])
 async def api_update_stock_data():
     """manually update the financial database"""
     await update_financial_data_job("manual")
-    return {"message": "complete an update of the financial database"}
\ No newline at end of file
+    return {"message": "complete an update of the financial database"}
+
+@router.post("/statistics")
+async def api_rebuild_statistics(rebuild: bool = True):
+    """recalculate 200-day moving averages, rebuild=true reloads every window from the database (use after a backfill)"""
+    await asyncio.to_thread(run_index_statistics_on_startup, rebuild=rebuild)
+    await asyncio.to_thread(run_stock_statistics_on_startup, get_tickers(), rebuild=rebuild)
+    return {"message": f"complete a {'full rebuild' if rebuild else 'refresh'} of the statistics"}
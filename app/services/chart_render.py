@@ -0,0 +1,19 @@
+# app/services/chart_render.py
+from typing import List
+
+import plotly.graph_objects as go
+
+# Kept free of app imports: chart process-pool workers import only this module
+
+def render_candlestick_png(symbol: str, x: List, open_: List[float], high: List[float], low: List[float], close: List[float]) -> bytes:
+    fig = go.Figure(data=[go.Candlestick(x=x,
+        open=open_, high=high,
+        low=low, close=close)])
+
+    fig.update_layout(title=f"{symbol} Price (Past Month)",
+                      yaxis_title="Price",
+                      xaxis_title="Date",
+                      height=500)
+
+    # Rasterize with kaleido
+    return fig.to_image(format="png", width=800, height=500)
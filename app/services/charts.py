@@ -0,0 +1,132 @@
+# app/services/charts.py
+import base64
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from app.repositories.stocks import get_several_stock_price
+from app.services.chart_render import render_candlestick_png
+from app.utils.app_state import get_data_version
+
+# rendered PNGs kept in memory, least recently used evicted first
+CHART_CACHE_MAX_ENTRIES = int(os.getenv("CHART_CACHE_MAX_ENTRIES", "256"))
+# processes used to pre-render charts before a notification pass, each runs its own kaleido
+CHART_RENDER_WORKERS = int(os.getenv("CHART_RENDER_WORKERS", "2"))
+# starting a worker and its kaleido costs about a second, smaller batches are rendered in this process
+CHART_POOL_MIN_CHARTS = int(os.getenv("CHART_POOL_MIN_CHARTS", "32"))
+
+# (symbol, data version, chart end date) -> PNG bytes; a new version or a new day makes old entries unreachable
+_charts: "OrderedDict[Tuple[str, int, str], bytes]" = OrderedDict()
+_charts_lock = threading.Lock()
+
+def _chart_key(symbol: str) -> Tuple[str, int, str]:
+    return (symbol, get_data_version(), datetime.utcnow().date().strftime("%Y-%m-%d"))
+
+def _store(key: Tuple[str, int, str], png: bytes) -> None:
+    with _charts_lock:
+        _charts[key] = png
+        _charts.move_to_end(key)
+        while len(_charts) > CHART_CACHE_MAX_ENTRIES:
+            _charts.popitem(last=False)
+
+def _load_chart_args_batch(symbols: List[str], end_date: str) -> Dict[str, tuple]:
+    # past month of prices for every symbol in one query, read in this process so render workers never touch the database
+    start_date = (datetime.strptime(end_date, "%Y-%m-%d") - timedelta(days=30)).strftime("%Y-%m-%d")
+    df = get_several_stock_price(
+        symbols=symbols,
+        columns=["open", "high", "low", "close"],
+        start_date=start_date,
+        end_date=end_date,
+    )
+    args = {}
+    for symbol, frame in df.groupby("symbol", sort=False):
+        frame = frame.reset_index(drop=True)  # same row positions as a single-symbol query
+        args[symbol] = (symbol, frame.index.tolist(), frame['open'].tolist(), frame['high'].tolist(), frame['low'].tolist(), frame['close'].tolist())
+    return args
+
+def _load_chart_args(symbol: str, end_date: str) -> tuple:
+    args = _load_chart_args_batch([symbol], end_date)
+    if symbol not in args:
+        raise ValueError("No stock price data available for the specified symbol and date range.")
+    return args[symbol]
+
+def get_chart_png(symbol: str) -> bytes:
+    """
+    取得股票近一個月的 K 線圖 PNG，同一資料版本同一天每支股票只繪製一次。
+    :param symbol: 股票代碼
+    :return: PNG bytes
+    """
+    key = _chart_key(symbol)
+    with _charts_lock:
+        png = _charts.get(key)
+        if png is not None:
+            _charts.move_to_end(key)
+            return png
+    png = render_candlestick_png(*_load_chart_args(symbol, key[2]))
+    _store(key, png)
+    return png
+
+def get_chart_base64(symbol: str) -> str:
+    return base64.b64encode(get_chart_png(symbol)).decode()
+
+def prerender_charts(symbols: Iterable[str]) -> Dict[str, bytes]:
+    """
+    在寄送通知前以一次查詢讀取尚未快取圖表的價格，再以 process pool 平行繪製。
+    :param symbols: 股票代碼
+    :return: {symbol: PNG bytes}，無資料或繪製失敗的股票不在其中
+    """
+    pending = {}
+    result = {}
+    missing = []
+    for symbol in dict.fromkeys(symbols):
+        key = _chart_key(symbol)
+        with _charts_lock:
+            png = _charts.get(key)
+        if png is not None:
+            # returned directly, a later eviction from the bounded cache cannot force a re-render
+            result[symbol] = png
+        else:
+            missing.append(key)
+    if missing:
+        # one price query for every chart that still has to be drawn
+        try:
+            args = _load_chart_args_batch([key[0] for key in missing], missing[0][2])
+        except Exception as e:
+            print(f"⚠️ Skipping {len(missing)} charts: {e}")
+            args = None
+        for key in missing:
+            if args and key[0] in args:
+                pending[key] = args[key[0]]
+                continue
+            if args is not None:
+                print(f"⚠️ Skipping chart for {key[0]}: No stock price data available for the specified symbol and date range.")
+    if not pending:
+        return result
+    workers = max(1, min(CHART_RENDER_WORKERS, len(pending), os.cpu_count() or 1))  # no gain from more processes than cores
+    if workers == 1 or len(pending) < CHART_POOL_MIN_CHARTS:
+        workers = 1
+        rendered = {}
+        for key, args in pending.items():
+            try:
+                rendered[key] = render_candlestick_png(*args)
+            except Exception as e:
+                print(f"⚠️ Chart rendering failed for {key[0]}: {e}")
+    else:
+        # spawn, not fork: the server process holds threads, sockets and TensorFlow state
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {key: executor.submit(render_candlestick_png, *args) for key, args in pending.items()}
+            rendered = {}
+            for key, future in futures.items():
+                try:
+                    rendered[key] = future.result()
+                except Exception as e:
+                    print(f"⚠️ Chart rendering failed for {key[0]}: {e}")
+    for key, png in rendered.items():
+        _store(key, png)
+        result[key[0]] = png
+    print(f"✅ Pre-rendered {len(rendered)} charts with {workers} workers")
+    return result
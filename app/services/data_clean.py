@@ -1,7 +1,9 @@
 # app/services/data_clean.py
-from typing import List, Dict
+from typing import List, Tuple
 import pandas as pd
 
+from app.utils.pandas_helper import PRICE_COLUMNS
+
 def clean_index_df(data:pd.DataFrame, ticker: str) -> pd.DataFrame:
     # process and store data
     df = data.reset_index()  # extract ticker DataFrame and reset index
@@ -18,28 +20,31 @@ def clean_index_df(data:pd.DataFrame, ticker: str) -> pd.DataFrame:
     df["volume"] = pd.to_numeric(df["volume"], errors="coerce").fillna(0).astype(int)
     return df
 
-def clean_stock_panel(all_data:pd.DataFrame, tickers: List[str]) -> Dict[str, pd.DataFrame]:
-    # process and store data for each ticker
-    cleaned = {}
-    for ticker in tickers:
-        if ticker not in all_data.columns.levels[0]:  # check if ticker data exists in downloaded data
-            raise KeyError(f"Ticker {ticker} not in downloaded data (possibly delisted)")
-        df = all_data[ticker].reset_index()  # extract ticker DataFrame and reset index
-        df = df.rename(columns={
-            "Date": "date",
-            "Open": "open",
-            "High": "high",
-            "Low": "low",
-            "Close": "close",
-            "Volume": "volume"
-        })  # rename columns
-        df["symbol"] = ticker  # add symbol column
-        df = df[["symbol", "date", "open", "high", "low", "close", "volume"]]  # reorder columns, select relevant columns only
-        df["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")  # format date as string YYYY-MM-DD, remove time part
-        numeric_columns = ["open", "high", "low", "close"]
-        for col in numeric_columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
-            df[col] = df[col].fillna(0.0).astype(float)
-        df["volume"] = pd.to_numeric(df["volume"], errors="coerce").fillna(0).astype(int)
-        cleaned[ticker] = df
-    return cleaned
+def clean_stock_panel(all_data: pd.DataFrame, tickers: List[str]) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    將 yfinance 的 (ticker, 欄位) 面板一次 stack 成長格式，所有股票共用一次型別轉換與日期格式化。
+    :param all_data: yf.download(..., group_by='ticker') 的結果
+    :param tickers: 要處理的股票代碼
+    :return: (欄位 symbol, date, open, high, low, close, volume 並依 symbol、date 排序的 DataFrame, 下載結果中不存在或完全沒有價格的代碼)
+    """
+    present = set(all_data.columns.get_level_values(0)) if not all_data.empty else set()
+    wanted = [ticker for ticker in tickers if ticker in present]
+    if not wanted:
+        return pd.DataFrame(columns=PRICE_COLUMNS), list(tickers)
+
+    # (date, ticker) rows x field columns, dates the ticker did not trade are all-NaN rows and are dropped
+    panel = all_data[wanted]
+    panel.index = pd.to_datetime(panel.index).strftime("%Y-%m-%d")  # format every date once on the shared index, not per row
+    long_df = panel.stack(level=0, future_stack=True)
+    long_df = long_df.rename(columns=str.lower).rename_axis(["date", "symbol"]).reset_index()
+    long_df = long_df.dropna(how="all", subset=["open", "high", "low", "close", "volume"])
+
+    # Data cleaning and type conversion, one vectorized pass for every ticker
+    numeric_columns = ["open", "high", "low", "close"]
+    long_df[numeric_columns] = long_df[numeric_columns].apply(pd.to_numeric, errors="coerce").fillna(0.0).astype(float)
+    long_df["volume"] = pd.to_numeric(long_df["volume"], errors="coerce").fillna(0).astype(int)
+    long_df = long_df[PRICE_COLUMNS].sort_values(["symbol", "date"], kind="stable").reset_index(drop=True)  # rows of a symbol stay contiguous for the bulk loader
+
+    loaded = set(long_df["symbol"].unique())
+    missing = [ticker for ticker in tickers if ticker not in loaded]
+    return long_df, missing
@@ -5,16 +5,18 @@ import pandas as pd
 import logging
 import sqlite3
 from typing import Dict, List
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from app.repositories.indexes import get_last_date_index_price
-from app.repositories.stocks import get_last_date_stock_price, get_stock_category
-from app.services.yahoo_client import download_index, download_stocks
+from app.repositories.stocks import get_last_date_stock_price, get_stock_category, get_stock_price_watermarks
+from app.services.yahoo_client import download_index
+from app.services.downloader import download_stocks_chunked
 from app.services.data_clean import clean_index_df, clean_stock_panel
 from app.services.data_refresh import refresh_tickers_list
-from app.utils.file import open_sql_file
-from app.utils.pandas_helper import append_df
-from app.utils.app_state import DROP_STOCK_LIST, get_fin_db, get_sql_path, get_tickers, set_tickers
+from app.db.statements import get_sql
+from app.tasks.statistics import push_prices
+from app.utils.pandas_helper import append_df, bulk_load_prices
+from app.utils.app_state import DROP_STOCK_LIST, bump_data_version, get_fin_db, get_tickers, set_failed_tickers, set_tickers
 from app.repositories.meta import get_ticker_symbols
 
 logger = logging.getLogger(__name__)
@@ -26,7 +28,10 @@ def save_index_data(ticker: str = "^GSPC", start_date: str = "2015-01-01", end_d
         data = download_index(ticker=ticker, start_date=start_date, end_date=end_date)
         df = clean_index_df(data, ticker)
         try:
-            append_df(ticker, df, table="index_price", conn=get_fin_db())
+            result = append_df(ticker, df, table="index_price", conn=get_fin_db())
+            push_prices("index", df)
+            if result["rows"]:
+                bump_data_version()
             print(f"✅ Data for {ticker} fetched and stored successfully | Saved {len(df)} rows for {ticker}")
         except Exception as ticker_error:
             print(f"⭕️ Skipping {ticker} due to error: {ticker_error}")
@@ -38,21 +43,94 @@ def save_index_data(ticker: str = "^GSPC", start_date: str = "2015-01-01", end_d
         return {"success": False, "error": str(e)}
 
 # Save stock data into financial.db
-def save_stock_data(tickers: List[str], start_date: str = "2015-01-01", end_date: str = "2025-10-01"): 
+def save_stock_data(tickers: List[str], start_date: str = "2015-01-01", end_date: str = "2025-10-01", use_checkpoint: bool = True, drop_missing: bool = True): 
+    def write_chunk(chunk: List[str], all_data: pd.DataFrame) -> List[str]:
+        df, missing_tickers = clean_stock_panel(all_data, chunk)
+        # all tickers of the chunk in one transaction, a failing ticker is rolled back and skipped on its own
+        result = bulk_load_prices(df, table="stock_price", conn=get_fin_db()) # upsert, gap repairs and manual re-runs overwrite days that are already stored
+        push_prices("stock", df[df["symbol"].isin(result["loaded"])])
+        if result["rows"]:
+            bump_data_version()
+        return missing_tickers
+
     try:
-        all_data = download_stocks(tickers=tickers, start_date=start_date, end_date=end_date)
-        cleaned = clean_stock_panel(all_data, tickers)
-        for ticker, df in cleaned.items(): 
-            try:
-                append_df(ticker, df, table="stock_price", conn=get_fin_db())
-                print(f"✅ Data for {ticker} fetched and stored successfully | Saved {len(df)} rows for {ticker}")
-            except Exception as ticker_error:
-                print(f"⭕️ Skipping {ticker} due to error: {ticker_error}")
-        return {"success": True, "tickers had been saved": get_tickers()}
+        summary = download_stocks_chunked(tickers, start_date=start_date, end_date=end_date, on_chunk=write_chunk, use_checkpoint=use_checkpoint)
+        if drop_missing:
+            # check for failed tickers, save, and log them
+            failed_tickers_list = summary["missing"]
+            set_failed_tickers(failed_tickers_list)
+            if failed_tickers_list:
+                print(f"⚠️ Failed tickers: {failed_tickers_list}. Check if they are delisted or invalid.")
+            # refresh tickers list by removing failed tickers
+            refresh_tickers_list(failed_tickers_list)
+        else:
+            # a short window can have no rows (weekend, holiday, trading halt), the ticker stays in the list
+            failed_tickers_list = []
+            if summary["missing"]:
+                print(f"⭕️ No new rows from {start_date} to {end_date} for {len(summary['missing'])} tickers")
+        if summary["failed"]:
+            print(f"⚠️ {len(summary['failed'])} tickers could not be downloaded, the next run resumes from the {'checkpoint' if use_checkpoint else 'last stored dates'}")
+            return {"success": False, "error": f"Download failed for {summary['failed']}", "failed tickers": failed_tickers_list, "failed downloads": summary["failed"]}
+        return {"success": True, "tickers had been saved": get_tickers(), "failed tickers": failed_tickers_list, "failed downloads": []}
     except Exception as e:
         print(f"❌ An error occurred during download: {e}")
         return {"success": False, "error": str(e)}
 
+# Group tickers by the first date each one is missing, so every group downloads only its own range
+def plan_stock_updates(tickers: List[str], end_date: str, default_start_date: str = "2015-01-01") -> Dict[str, List[str]]:
+    """
+    依每支股票的最後日期與缺漏交易日決定下載起點，起點相同的股票歸為一組。
+    :param tickers: 股票代碼列表
+    :param end_date: 結束日期 YYYY-MM-DD（不含）
+    :param default_start_date: 資料庫中沒有資料的股票的起始日期
+    :return: {start_date: [tickers]}，已是最新的股票不列入
+    """
+    watermarks = get_stock_price_watermarks()
+    groups: Dict[str, List[str]] = {}
+    for ticker in tickers:
+        mark = watermarks.get(ticker)
+        if mark is None:
+            start_date = default_start_date  # never stored, or every earlier download failed
+        elif mark["first_gap"]:
+            start_date = mark["first_gap"]  # repair from the first missing, not yet attempted trading day in the repair window
+        else:
+            start_date = (datetime.fromisoformat(mark["last_date"]) + timedelta(days=1)).strftime("%Y-%m-%d")
+        if start_date < end_date:
+            groups.setdefault(start_date, []).append(ticker)
+    return dict(sorted(groups.items()))
+
+# Remember the trading days a download did not return, so a halt or a day missing upstream is not re-downloaded every night
+def record_gap_attempts(tickers: List[str], start_date: str, calendar_symbol: str = "^GSPC") -> None:
+    sql_template = get_sql("insert_stock_price_gap_attempts")
+    conn = get_fin_db()
+    try:
+        conn.executemany(sql_template, [(ticker, calendar_symbol, start_date, ticker, ticker) for ticker in tickers])
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"⚠️ Could not record attempted gap days: {e}")
+
+# Save only the missing stock data of every ticker into financial.db
+def save_stock_data_incremental(tickers: List[str], end_date: str):
+    groups = plan_stock_updates(tickers, end_date)
+    if not groups:
+        print("⭕️ The stock data is up to date in the financial database")
+        return {"success": True, "groups": 0, "failed tickers": []}
+    success = True
+    failed_tickers = []
+    for start_date, group in groups.items():
+        print(f"🔄 Updating {len(group)} tickers from {start_date} to {end_date}")
+        # no checkpoint: the groups share one date-keyed file, and the watermarks already resume a failed group;
+        # tickers without rows in a short window are kept, a halted symbol must not leave the ticker list
+        result = save_stock_data(group, start_date=start_date, end_date=end_date, use_checkpoint=False, drop_missing=False)
+        success = success and result["success"]
+        # days still missing after a completed download are not there upstream, later runs skip them
+        downloaded = [ticker for ticker in group if ticker not in result.get("failed downloads", group)]
+        record_gap_attempts(downloaded, start_date)
+        failed_tickers.extend(result.get("failed downloads", []))
+    set_failed_tickers(failed_tickers) # only downloads that failed, tickers without new rows are not failures
+    return {"success": success, "groups": len(groups), "failed tickers": failed_tickers}
+
 # Save stock detail from CSV to financial.db
 def save_stock_detail(database: str = "financial.db"):
     try:
@@ -60,6 +138,7 @@ def save_stock_detail(database: str = "financial.db"):
         table_name = 'stock_detail'
         df.to_sql(table_name, get_fin_db() , if_exists='replace', index=False)  # delete table if exists, create table, write DataFrame to SQL table, index=False : avoid to write DataFrame index
         get_fin_db().commit()
+        bump_data_version(data_changed=False)  # the same CSV is reloaded on every boot, the price and recommendation data did not change
         print(f"✅ CSV data successfully saved to table '{table_name}' in {database}.")
         return True
     except Exception as e:
@@ -86,29 +165,36 @@ def save_index_predictions(data: List[any], ticker: str):
     try:
         db = get_fin_db()
         cursor = db.cursor()
-        sql_template = open_sql_file(get_sql_path("insert_index_predictions_data"))
+        sql_template = get_sql("insert_index_predictions_data")
         prediction_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         cursor.execute(sql_template, (data["ticker"], prediction_date, data["window_size"], data["window_start_date"], data["window_end_date"], data["predicted_scaled"], data["predicted_real"], data["last_actual_close"], data["recommendation"], data["feature_number"], data["input_features_length"]))
         db.commit()
+        if cursor.rowcount:  # an unchanged prediction is not rewritten
+            bump_data_version()
         print(f"✅ Index {ticker} predictions saved successfully.")
         return True
     except sqlite3.Error as e:
         print(f"❌ An error occurred while saving index {ticker} predictions: {e}")
         return False
     
-# Save stock predictions into financial.db
-def save_stock_predictions(data: List[any], ticker: str):
+# Save a batch of stock predictions into financial.db in one transaction
+def save_stock_predictions_batch(records: List[Dict[str, any]]):
+    if not records:
+        return True
+    db = get_fin_db()
     try:
-        db = get_fin_db()
-        cursor = db.cursor()
-        sql_template = open_sql_file(get_sql_path("insert_stock_predictions_data"))
+        sql_template = get_sql("insert_stock_predictions_data")
         prediction_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cursor.execute(sql_template, (data["ticker"], prediction_date, data["window_size"], data["window_start_date"], data["window_end_date"], data["predicted_scaled"], data["predicted_real"], data["last_actual_close"], data["recommendation"], data["feature_number"], data["input_features_length"]))
-        db.commit()
-        print(f"✅ Stock {ticker} predictions saved successfully.")
+        rows = [(data["ticker"], prediction_date, data["window_size"], data["window_start_date"], data["window_end_date"], data["predicted_scaled"], data["predicted_real"], data["last_actual_close"], data["recommendation"], data["feature_number"], data["input_features_length"]) for data in records]
+        changes = db.total_changes
+        with db: # commit once, roll back the whole batch on error
+            db.executemany(sql_template, rows)
+        if db.total_changes != changes:  # unchanged predictions are not rewritten, e.g. the startup re-run
+            bump_data_version()
+        print(f"✅ Stock predictions saved successfully for {len(rows)} tickers.")
         return True
     except sqlite3.Error as e:
-        print(f"❌ An error occurred while saving stock {ticker} predictions: {e}")
+        print(f"❌ An error occurred while saving stock predictions batch: {e}")
         return False
 
 # Save index statistics into financial.db
@@ -116,46 +202,64 @@ def save_index_statistics(data: List[any], ticker: str):
     try:
         db = get_fin_db()
         cursor = db.cursor()
-        sql_template = open_sql_file(get_sql_path("insert_index_statistics_data"))
+        sql_template = get_sql("insert_index_statistics_data")
         statistics_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         record_date = get_last_date_index_price()
         cursor.execute(sql_template, (statistics_date, data["ticker"], record_date, data["days200_start_date"], data["days200_end_date"], data["days200_ma"]))
         db.commit()
+        if cursor.rowcount:  # unchanged statistics are not rewritten
+            bump_data_version()
         print(f"✅ Index {ticker} statistics saved successfully.")
         return True
     except sqlite3.Error as e:
         print(f"❌ An error occurred while saving index {ticker} statistics: {e}")
         return False
     
-# Save stock statistics into financial.db
-def save_stock_statistics(data: Dict[str, str], ticker: str):
+# Save a batch of stock statistics into financial.db in one transaction
+def save_stock_statistics_batch(records: List[Dict[str, any]]):
+    if not records:
+        return True
+    db = get_fin_db()
     try:
-        db = get_fin_db()
-        cursor = db.cursor()
-        sql_template = open_sql_file(get_sql_path("insert_stock_statistics_data"))
+        sql_template = get_sql("insert_stock_statistics_data")
         statistics_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         record_date = get_last_date_stock_price()
-        cursor.execute(sql_template, (statistics_date, data["ticker"], record_date, data["days200_start_date"], data["days200_end_date"], data["days200_ma"]))
-        db.commit()
-        print(f"✅ Stock {ticker} statistics saved successfully.")
+        rows = [(statistics_date, data["ticker"], record_date, data["days200_start_date"], data["days200_end_date"], data["days200_ma"]) for data in records]
+        changes = db.total_changes
+        with db: # commit once, roll back the whole batch on error
+            db.executemany(sql_template, rows)
+        if db.total_changes != changes:  # unchanged statistics are not rewritten, e.g. the startup re-run
+            bump_data_version()
+        print(f"✅ Stock statistics saved successfully for {len(rows)} tickers.")
         return True
     except sqlite3.Error as e:
-        print(f"❌ An error occurred while saving stock {ticker} statistics: {e}")
+        print(f"❌ An error occurred while saving stock statistics batch: {e}")
         return False
 
-def save_stock_rank(data: List[any], ticker: str):
+# Save a batch of stock rank rows into financial.db in one transaction, replacing the ranking of the same record date
+def save_stock_rank_batch(records: List[Dict[str, any]]):
+    if not records:
+        return True  # keep the stored ranking, an empty batch must not clear the record date
+    db = get_fin_db()
     try:
-        db = get_fin_db()
-        cursor = db.cursor()
-        sql_template = open_sql_file(get_sql_path("insert_stock_rank_data"))
+        sql_template = get_sql("insert_stock_rank_data")
         rank_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         record_date = get_last_date_stock_price()
-        cursor.execute(sql_template, (rank_date, data["ticker"], record_date, data["sector"], data["industry"], data["current_price"], data["potential"]))
-        db.commit()
-        print(f"✅ Stock {ticker} rank data saved successfully.")
+        rows = [(rank_date, data["ticker"], record_date, data["sector"], data["industry"], data["current_price"], data["potential"], data.get("rank")) for data in records]
+        # the same ranking again (e.g. the startup re-run) keeps the stored rows and their timestamps
+        stored = db.execute(get_sql("select_stock_rank_record_date"), (record_date,)).fetchall()
+        if set(stored) == {row[1:2] + row[3:] for row in rows}:
+            print(f"⭕️ Stock rank for {record_date} is unchanged for {len(rows)} tickers.")
+            return True
+        with db: # commit once, roll back the whole batch on error
+            # an earlier run on this record date (restart, manual update) may have ranked tickers this run skips
+            db.execute(get_sql("delete_stock_rank_record_date"), (record_date,))
+            db.executemany(sql_template, rows)
+        bump_data_version()
+        print(f"✅ Stock rank data saved successfully for {len(rows)} tickers.")
         return True
     except sqlite3.Error as e:
-        print(f"❌ An error occurred while saving stock {ticker} rank data: {e}")
+        print(f"❌ An error occurred while saving stock rank batch: {e}")
         return False
 
 # Save stock category JSON file
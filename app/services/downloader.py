@@ -0,0 +1,122 @@
+# app/services/downloader.py
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from app.services.yahoo_client import download_stocks
+
+# (tickers, start_date, end_date) -> panel with (ticker, field) columns, same layout as yf.download(group_by='ticker')
+# a provider returns an empty panel when no ticker has rows in the range and raises only for failed requests, which are retried
+PriceProvider = Callable[[List[str], str, str], pd.DataFrame]
+# (chunk tickers, panel) -> tickers of the chunk that had no data
+ChunkHandler = Callable[[List[str], pd.DataFrame], List[str]]
+
+# Downloader tuning, override with environment variables
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", "50"))
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+DOWNLOAD_MAX_RETRIES = int(os.getenv("DOWNLOAD_MAX_RETRIES", "3"))
+DOWNLOAD_BACKOFF_SECONDS = float(os.getenv("DOWNLOAD_BACKOFF_SECONDS", "2"))
+DOWNLOAD_CHECKPOINT_FILE = os.getenv("DOWNLOAD_CHECKPOINT_FILE", os.path.join(os.path.dirname(__file__), '..', '..', 'json', 'download_checkpoint.json'))
+
+# backend used when download_stocks_chunked gets no provider, Yahoo Finance unless replaced (e.g. by a local fixture in tests)
+_provider: PriceProvider = download_stocks
+_checkpoint_lock = threading.Lock()
+
+def set_price_provider(provider: PriceProvider) -> None:
+    global _provider
+    _provider = provider
+
+def get_price_provider() -> PriceProvider:
+    return _provider
+
+def _load_checkpoint(path: str, start_date: str, end_date: str) -> Dict[str, list]:
+    # a checkpoint only applies to the same date range, anything else starts from scratch
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("start_date") == start_date and checkpoint.get("end_date") == end_date:
+            return checkpoint
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring unreadable download checkpoint {path}: {e}")
+    return {"start_date": start_date, "end_date": end_date, "completed": [], "missing": []}
+
+def _save_checkpoint(path: str, checkpoint: Dict[str, list]) -> None:
+    # write to a temporary file first so a crash never leaves a half-written checkpoint
+    with _checkpoint_lock:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, path)
+
+def _download_chunk(provider: PriceProvider, chunk: List[str], start_date: str, end_date: str, max_retries: int) -> pd.DataFrame:
+    # retry with exponential backoff and jitter, the last error is raised to the caller
+    for attempt in range(max_retries + 1):
+        try:
+            return provider(chunk, start_date, end_date)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = DOWNLOAD_BACKOFF_SECONDS * (2 ** attempt) * (1 + random.random() / 2)
+            print(f"🔄 Retrying chunk {chunk[0]}..{chunk[-1]} in {delay:.1f}s after error: {e}")
+            time.sleep(delay)
+
+def download_stocks_chunked(tickers: List[str], start_date: str, end_date: str, on_chunk: ChunkHandler, provider: Optional[PriceProvider] = None, chunk_size: Optional[int] = None, workers: Optional[int] = None, checkpoint_file: Optional[str] = None, use_checkpoint: bool = True) -> Dict[str, object]:
+    """
+    將股票分批下載：每批在有限的執行緒池中下載並重試，完成的批次立即交給 on_chunk 清理與寫入，並記錄在 checkpoint，重啟後從中斷處繼續。
+    :param tickers: 股票代碼列表
+    :param start_date: 起始日期 YYYY-MM-DD
+    :param end_date: 結束日期 YYYY-MM-DD
+    :param on_chunk: 在呼叫端執行緒上處理每批下載結果，回傳該批沒有資料的代碼
+    :param provider: 下載後端，None 表示使用 set_price_provider 設定的後端（預設 Yahoo Finance）
+    :param chunk_size: 每批代碼數，None 表示 DOWNLOAD_CHUNK_SIZE
+    :param workers: 同時下載的批次數，None 表示 DOWNLOAD_WORKERS
+    :param checkpoint_file: checkpoint 檔案路徑，None 表示 DOWNLOAD_CHECKPOINT_FILE
+    :param use_checkpoint: 是否讀寫 checkpoint，呼叫端已能自行續傳時（例如依資料庫最後日期的增量更新）設為 False
+    :return: {"chunks": 本次下載批次數, "resumed": 先前已完成的代碼數, "missing": [沒有資料的代碼], "failed": [重試後仍下載失敗的代碼]}
+    """
+    provider = provider or _provider
+    chunk_size = max(1, chunk_size or DOWNLOAD_CHUNK_SIZE)
+    workers = max(1, workers or DOWNLOAD_WORKERS)
+    checkpoint_file = checkpoint_file or DOWNLOAD_CHECKPOINT_FILE
+
+    checkpoint = _load_checkpoint(checkpoint_file, start_date, end_date) if use_checkpoint else {"start_date": start_date, "end_date": end_date, "completed": [], "missing": []}
+    completed = set(checkpoint["completed"])
+    pending = [ticker for ticker in dict.fromkeys(tickers) if ticker not in completed]
+    resumed = len(dict.fromkeys(tickers)) - len(pending)
+    if resumed:
+        print(f"🔄 Resuming download from checkpoint, {resumed} tickers already done")
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    missing = [ticker for ticker in checkpoint["missing"] if ticker in tickers]
+    failed: List[str] = []
+
+    print(f"📥 Downloading {len(pending)} tickers in {len(chunks)} chunks with {workers} workers from {start_date} to {end_date}")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download") as executor:
+        futures = {executor.submit(_download_chunk, provider, chunk, start_date, end_date, DOWNLOAD_MAX_RETRIES): chunk for chunk in chunks}
+        for done, future in enumerate(as_completed(futures), start=1):
+            chunk = futures[future]
+            try:
+                panel = future.result()
+                # cleaning and writing stay on this thread, only the network part runs in parallel
+                chunk_missing = on_chunk(chunk, panel)
+            except Exception as e:
+                print(f"❌ Chunk {chunk[0]}..{chunk[-1]} failed: {e}")
+                failed.extend(chunk)
+                continue
+            missing.extend(chunk_missing)
+            checkpoint["completed"].extend(chunk)
+            checkpoint["missing"] = missing
+            if use_checkpoint:
+                _save_checkpoint(checkpoint_file, checkpoint)
+            print(f"✅ Chunk {done}/{len(chunks)} done ({len(chunk)} tickers)")
+
+    if use_checkpoint and not failed and os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)  # whole range done, the next run starts clean
+    return {"chunks": len(chunks), "resumed": resumed, "missing": missing, "failed": failed}
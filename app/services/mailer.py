@@ -0,0 +1,214 @@
+# app/services/mailer.py
+import os
+import queue
+import random
+import smtplib
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from email.message import Message
+from typing import Dict, List, Optional
+
+# SMTP server and account, set with environment variables (e.g. a local stand-in such as aiosmtpd for tests);
+# credentials have no defaults, an empty SMTP_USER sends without logging in
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "30"))
+# a session idle longer than this is checked with NOOP before the next message, busy sessions send straight away
+SMTP_IDLE_PROBE_SECONDS = float(os.getenv("SMTP_IDLE_PROBE_SECONDS", "60"))
+# sender address, no email is sent while it is unset
+MAIL_FROM = os.getenv("MAIL_FROM", "")
+# send workers, each keeps one authenticated SMTP session open between messages
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "2"))
+MAIL_MAX_RETRIES = int(os.getenv("MAIL_MAX_RETRIES", "3"))
+MAIL_BACKOFF_SECONDS = float(os.getenv("MAIL_BACKOFF_SECONDS", "2"))
+# longest send_all waits for its messages, the rest are reported as failed so a stuck send never blocks the job
+MAIL_SEND_TIMEOUT_SECONDS = float(os.getenv("MAIL_SEND_TIMEOUT_SECONDS", "300"))
+# longest close waits for the workers at shutdown, they are daemon threads and a worker still in retry backoff is left behind
+MAIL_CLOSE_TIMEOUT_SECONDS = float(os.getenv("MAIL_CLOSE_TIMEOUT_SECONDS", "10"))
+
+def smtp_config_error() -> Optional[str]:
+    # why email cannot be sent with the current environment, None when it is configured
+    if not MAIL_FROM:
+        return "SMTP is not configured: set MAIL_FROM (and SMTP_HOST, SMTP_USER, SMTP_PASSWORD for the mail server)"
+    if bool(SMTP_USER) != bool(SMTP_PASSWORD):
+        return "SMTP is not configured: SMTP_USER and SMTP_PASSWORD must be set together"
+    return None
+
+def _is_transient(error: Exception) -> bool:
+    # 4xx replies, dropped connections and socket errors may succeed on retry; 5xx replies (bad address,
+    # rejected sender or content, failed login) and other SMTP errors fail the same way every time
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)
+
+class SMTPSession:
+    """One long-lived SMTP connection, reopened (STARTTLS + login) only when the server dropped it."""
+
+    def __init__(self):
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def _open(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS)
+        if SMTP_STARTTLS:
+            server.starttls()
+        if SMTP_USER and SMTP_PASSWORD:
+            server.login(SMTP_USER, SMTP_PASSWORD)
+        return server
+
+    def _alive(self) -> bool:
+        try:
+            return self._server is not None and self._server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def send(self, message: Message) -> None:
+        # a NOOP round trip only after the session sat idle, servers drop idle connections but rarely busy ones
+        if self._server is not None and time.monotonic() - self._last_used > SMTP_IDLE_PROBE_SECONDS and not self._alive():
+            self.close()
+        if self._server is None:
+            self._server = self._open()
+        else:
+            try:
+                self._server.send_message(message)
+                self._last_used = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected:
+                # the reused connection was dropped after all, reconnect once without waiting for a retry
+                self.close()
+                self._server = self._open()
+        self._server.send_message(message)
+        self._last_used = time.monotonic()
+
+    def close(self) -> None:
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+class MailQueue:
+    """
+    Outbound mail queue drained by MAIL_WORKERS threads, each with its own persistent SMTP session.
+    A transient failure (4xx reply, disconnect) is retried with exponential backoff on a fresh connection, permanent ones fail at once.
+    """
+
+    def __init__(self, workers: int = MAIL_WORKERS, max_retries: int = MAIL_MAX_RETRIES):
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+
+    def _start(self) -> None:
+        # worker threads start on the first message, so importing the module never touches the network;
+        # a worker that died is replaced on the next message
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._work, name=f"mailer-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _deliver(self, session: SMTPSession, message: Message, future: Future) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                session.send(message)
+                with self._lock:
+                    self.sent += 1
+                future.set_result(True)
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                session.close()  # the next attempt reconnects
+                if attempt == self.max_retries or not _is_transient(e):
+                    raise
+                delay = MAIL_BACKOFF_SECONDS * (2 ** attempt) * (1 + random.random() / 2)
+                print(f"🔄 Retrying email to {message['To']} in {delay:.1f}s after error: {e}")
+                time.sleep(delay)
+
+    def _work(self) -> None:
+        session = SMTPSession()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                session.close()
+                self._queue.task_done()
+                return
+            message, future = item
+            try:
+                self._deliver(session, message, future)
+            except Exception as e:
+                # any error (e.g. a message that cannot be encoded) fails only this message, the worker keeps going
+                session.close()
+                with self._lock:
+                    self.failed += 1
+                future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def enqueue(self, message: Message) -> Future:
+        future: Future = Future()
+        error = smtp_config_error()
+        if error:
+            print(f"❌ Email to {message['To']} not sent. {error}")
+            future.set_exception(RuntimeError(error))
+            return future
+        self._start()
+        self._queue.put((message, future))
+        return future
+
+    def send_all(self, messages: List[Message], timeout: Optional[float] = None) -> Dict[str, list]:
+        """
+        將郵件放入佇列並等待全部寄出或重試失敗。
+        :param messages: 要寄出的郵件
+        :param timeout: 最長等待秒數，None 表示 MAIL_SEND_TIMEOUT_SECONDS，逾時仍未寄出的郵件列為失敗
+        :return: {"sent": [收件者], "failed": {收件者: 錯誤}}
+        """
+        futures = [(message["To"], self.enqueue(message)) for message in messages]
+        deadline = time.monotonic() + (MAIL_SEND_TIMEOUT_SECONDS if timeout is None else timeout)
+        result = {"sent": [], "failed": {}}
+        for recipient, future in futures:
+            try:
+                future.result(timeout=max(0.0, deadline - time.monotonic()))
+                result["sent"].append(recipient)
+            except FutureTimeoutError:
+                result["failed"][recipient] = "Timed out waiting for the mail queue"
+            except Exception as e:
+                result["failed"][recipient] = str(e)
+        return result
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        # stop the workers after the queued messages, each one quits its SMTP session; waits at most
+        # timeout seconds in total (None means MAIL_CLOSE_TIMEOUT_SECONDS)
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        deadline = time.monotonic() + (MAIL_CLOSE_TIMEOUT_SECONDS if timeout is None else timeout)
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        alive = [thread.name for thread in threads if thread.is_alive()]
+        if alive:
+            print(f"⚠️ Mail workers still busy at shutdown, not waiting for them: {', '.join(alive)}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"workers": len(self._threads), "queued": self._queue.qsize(), "sent": self.sent, "failed": self.failed}
+
+mail_queue = MailQueue()
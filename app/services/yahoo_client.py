@@ -1,11 +1,13 @@
 # app/services/yahoo_client.py
+import os
 import yfinance as yf
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Optional
 import pandas as pd
 
-from app.services.data_refresh import refresh_tickers_list
-from app.utils.app_state import set_failed_tickers
+# history requests run at once within one download_stocks call; the chunked downloader runs several calls side by side
+YAHOO_HISTORY_WORKERS = int(os.getenv("YAHOO_HISTORY_WORKERS", "8"))
 
 # download index data for a ticker from Yahoo Finance and store it in the database financial.db
 def download_index(ticker: str = "^GSPC", start_date: str = "2015-01-01", end_date: Optional[str] = None) -> pd.DataFrame:
@@ -19,31 +21,30 @@ def download_index(ticker: str = "^GSPC", start_date: str = "2015-01-01", end_da
         raise ValueError(f"No data found for the given 'ticker' {ticker}.")
     return data
 
-# download stock data for a list of tickers from Yahoo Finance and store it in the database financial.db
+def _download_history(ticker: str, start_date: str, end_date: str) -> Optional[pd.DataFrame]:
+    data = yf.Ticker(ticker).history(start=start_date, end=end_date, interval="1d", auto_adjust=True, actions=False)  # auto adjust Close price to avoid Adj Close issues
+    if data is None or data.empty:
+        return None
+    data.index = data.index.tz_localize(None)  # exchange time zones differ, keep the calendar date only
+    return data[["Open", "High", "Low", "Close", "Volume"]]
+
+# download stock data for a list of tickers from Yahoo Finance, one history request per ticker on a bounded thread pool
+# yf.download keeps its results in module globals (yf.shared), so concurrent calls would overwrite each other;
+# Ticker.history is safe to run from several threads at once
 def download_stocks(tickers: List[str], start_date: str = "2015-01-01", end_date: Optional[str] = None) -> pd.DataFrame:
     if end_date is None:
         end_date = datetime.now().strftime("%Y-%m-%d")
-    # download all tickers data at once with built-in multithreading
     print(f"📥 Downloading stock data for {len(tickers)} tickers from {start_date} to {end_date}")
-    all_data = yf.download(
-        tickers=tickers,
-        start=start_date,
-        end=end_date,
-        group_by='ticker',
-        threads=True,
-        progress=False,
-        auto_adjust=True
-    )  # auto adjust Close price to avoid Adj Close issues
-    # ensure data is not empty
-    if all_data is None or all_data.empty:
-        raise ValueError("No data found for the given list 'tickers'.")
-    # check for failed tickers, save, and log them
-    failed_tickers_dict = yf.shared._ERRORS
-    failed_tickers_list = list(failed_tickers_dict.keys())
-    set_failed_tickers(failed_tickers_list)
-    if failed_tickers_list:
-        print(f"⚠️ Failed tickers: {failed_tickers_list}. Check if they are delisted or invalid.")
-    # refresh tickers list by removing failed tickers
-    refresh_tickers_list(failed_tickers_list)
+    workers = max(1, min(YAHOO_HISTORY_WORKERS, len(tickers)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {ticker: executor.submit(_download_history, ticker, start_date, end_date) for ticker in tickers}
+        # a failed request raises here so the downloader retries the whole chunk
+        results = {ticker: future.result() for ticker, future in futures.items()}
+    frames = {ticker: data for ticker, data in results.items() if data is not None}
+    # no rows in the range (e.g. a weekend-only window) is a valid answer, not an error to retry; the cleaner reports the tickers
+    if not frames:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name="Date"), columns=pd.MultiIndex.from_tuples([], names=["Ticker", "Price"]))
+    # same (ticker, field) column layout as yf.download(group_by='ticker'); tickers without data are left out for the cleaner to report
+    all_data = pd.concat(frames, axis=1, names=["Ticker", "Price"])
+    all_data.index.name = "Date"
     return all_data
-
@@ -0,0 +1,59 @@
+# app/tasks/indicators.py
+import numpy as np
+
+# Vectorized technical indicators over a close-price matrix.
+# By default the matrix is (dates x tickers) and indicators roll along axis 0 in the row order given;
+# pass axis=1 for a (tickers x dates) matrix. NaN marks missing prices and windows that are not full yet.
+
+# Rolling mean along `axis`, NaN until the window is full
+def rolling_mean(values: np.ndarray, period: int, axis: int = 0) -> np.ndarray:
+    values = np.asarray(values, dtype=float)
+    out = np.full(values.shape, np.nan)
+    if values.shape[axis] >= period:
+        windows = np.lib.stride_tricks.sliding_window_view(values, period, axis=axis)
+        full = [slice(None)] * values.ndim
+        full[axis] = slice(period - 1, None)
+        out[tuple(full)] = windows.mean(axis=-1)
+    return out
+
+# Simple moving average, same as pd.Series.rolling(period).mean() per ticker
+def sma(closes: np.ndarray, period: int, axis: int = 0) -> np.ndarray:
+    return rolling_mean(closes, period, axis=axis)
+
+# Exponential moving average, same as pd.Series.ewm(span=period, adjust=False).mean() per ticker without gaps
+def ema(closes: np.ndarray, period: int, axis: int = 0) -> np.ndarray:
+    closes = np.moveaxis(np.asarray(closes, dtype=float), axis, 0)
+    alpha = 2.0 / (period + 1)
+    out = np.full(closes.shape, np.nan)
+    state = np.full(closes.shape[1:], np.nan)
+    for t in range(closes.shape[0]):
+        value = closes[t]
+        # first valid price seeds the average, missing prices carry the previous value forward
+        state = np.where(np.isnan(state), value, np.where(np.isnan(value), state, state + alpha * (value - state)))
+        out[t] = state
+    return np.moveaxis(out, 0, axis)
+
+# Relative Strength Index: 100 - 100 / (1 + RS), RS = simple rolling mean of gains / simple rolling mean of losses over `period` rows
+def rsi(closes: np.ndarray, period: int = 14, axis: int = 0) -> np.ndarray:
+    closes = np.asarray(closes, dtype=float)
+    delta = np.diff(closes, axis=axis, prepend=np.nan)
+    gain = np.clip(delta, 0, None)
+    loss = -np.clip(delta, None, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = rolling_mean(gain, period, axis=axis) / rolling_mean(loss, period, axis=axis)
+        return 100 - (100 / (1 + rs))
+
+# Mean of the last `days` rows along `axis`, NaN for tickers with fewer than `days` prices
+def moving_average(closes: np.ndarray, days: int, axis: int = 0) -> np.ndarray:
+    closes = np.moveaxis(np.asarray(closes, dtype=float), axis, 0)
+    if closes.shape[0] < days:
+        return np.full(closes.shape[1:], np.nan)
+    return closes[-days:].mean(axis=0)  # any NaN in the window makes the result NaN
+
+# Upside of the predicted price over the 200-day moving average in percent: (predicted - ma_200) / ma_200 * 100, NaN where undefined
+def potential(predicted: np.ndarray, ma_200: np.ndarray) -> np.ndarray:
+    predicted = np.asarray(predicted, dtype=float)
+    ma_200 = np.asarray(ma_200, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = (predicted - ma_200) / ma_200 * 100
+    return np.where(np.isfinite(result), result, np.nan)
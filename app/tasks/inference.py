@@ -0,0 +1,198 @@
+# app/tasks/inference.py
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import h5py
+import numpy as np
+import tensorflow as tf
+
+from app.tasks.model import get_model_path, get_or_load_model
+
+# Number of models stacked into one forward pass, bounds the memory used by stacked weights
+INFERENCE_GROUP_SIZE = int(os.getenv("INFERENCE_GROUP_SIZE", "128"))
+
+# Weights read from the H5 files stay in memory between runs, least recently used dropped above this size (0 means no ceiling)
+MODEL_SPEC_CACHE_MAX_MB = int(os.getenv("MODEL_SPEC_CACHE_MAX_MB", "256"))
+
+# Layers the stacked forward pass knows how to run; anything else falls back to the Keras model
+SUPPORTED_LAYERS = {"InputLayer", "LSTM", "Dropout", "Dense"}
+_ACTIVATIONS = {
+    "linear": tf.identity,
+    "relu": tf.nn.relu,
+    "tanh": tf.tanh,
+    "sigmoid": tf.sigmoid,
+}
+
+# compiled forward pass per architecture signature
+_compiled_forward = {}
+
+# model file path -> (mtime, spec)
+_spec_cache: "OrderedDict[str, Tuple[int, dict]]" = OrderedDict()
+_spec_cache_bytes = 0
+_spec_lock = threading.Lock()
+
+def _read_model_spec_file(path: str, symbol: str) -> Optional[dict]:
+    try:
+        with h5py.File(path, "r") as f:
+            config = f.attrs["model_config"]
+            config = json.loads(config.decode("utf-8") if isinstance(config, bytes) else config)
+            layers = [(layer["class_name"], layer["config"]) for layer in config["config"]["layers"]]
+            weights = []
+            model_weights = f["model_weights"]
+            for layer_name in model_weights.attrs["layer_names"]:
+                layer_group = model_weights[layer_name]
+                for weight_name in layer_group.attrs["weight_names"]:
+                    weights.append(np.asarray(layer_group[weight_name], dtype=np.float32))
+    except Exception as e:
+        print(f"❌ Could not read model spec for {symbol}: {e}")
+        return None
+    signature = tuple(
+        (class_name, cfg.get("units"), cfg.get("activation"), cfg.get("recurrent_activation"),
+         cfg.get("return_sequences"), cfg.get("use_bias"), str(cfg.get("batch_shape") or cfg.get("batch_input_shape")))
+        for class_name, cfg in layers
+    )
+    return {"signature": signature, "layers": layers, "weights": weights, "nbytes": sum(w.nbytes for w in weights)}
+
+def read_model_spec(symbol: str) -> Optional[dict]:
+    """
+    Read the layer stack and weights of a Keras H5 file without building the Keras graph.
+    Specs are cached by file path and modification time, so a nightly run only re-reads replaced model files.
+    :param symbol: 股票代碼，例如 "AAPL"
+    :return: {"signature": tuple, "layers": [(class_name, config)], "weights": [np.ndarray], "nbytes": int}，讀取失敗時回傳 None
+    """
+    global _spec_cache_bytes
+    path = get_model_path(symbol)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError as e:
+        print(f"❌ Could not read model spec for {symbol}: {e}")
+        return None
+    with _spec_lock:
+        cached = _spec_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            _spec_cache.move_to_end(path)
+            return cached[1]
+    spec = _read_model_spec_file(path, symbol)
+    if spec is None:
+        return None
+    with _spec_lock:
+        old = _spec_cache.pop(path, None)
+        if old is not None:
+            _spec_cache_bytes -= old[1]["nbytes"]
+        _spec_cache[path] = (mtime, spec)
+        _spec_cache_bytes += spec["nbytes"]
+        # least recently used specs go first, the newest one always stays
+        while MODEL_SPEC_CACHE_MAX_MB and _spec_cache_bytes > MODEL_SPEC_CACHE_MAX_MB * 1024 * 1024 and len(_spec_cache) > 1:
+            _, (_, evicted) = _spec_cache.popitem(last=False)
+            _spec_cache_bytes -= evicted["nbytes"]
+    return spec
+
+def _is_supported(layers: List[Tuple[str, dict]]) -> bool:
+    for class_name, cfg in layers:
+        if class_name not in SUPPORTED_LAYERS:
+            return False
+        if class_name == "LSTM" and (cfg.get("go_backwards") or cfg.get("stateful")):
+            return False
+        if class_name in ("LSTM", "Dense"):
+            if cfg.get("activation") not in _ACTIVATIONS:
+                return False
+            if class_name == "LSTM" and cfg.get("recurrent_activation") not in _ACTIVATIONS:
+                return False
+    return True
+
+def _build_forward(layers: List[Tuple[str, dict]]):
+    # every weight tensor carries a leading model axis, so one call runs N different models on N windows
+    @tf.function(reduce_retracing=True)
+    def forward(x, weights):
+        h = x
+        i = 0
+        for class_name, cfg in layers:
+            if class_name == "LSTM":
+                kernel, recurrent = weights[i], weights[i + 1]
+                i += 2
+                z_x = tf.einsum("nti,nij->ntj", h, kernel)
+                if cfg.get("use_bias", True):
+                    z_x = z_x + weights[i][:, None, :]
+                    i += 1
+                act = _ACTIVATIONS[cfg["activation"]]
+                rec_act = _ACTIVATIONS[cfg["recurrent_activation"]]
+                units = cfg["units"]
+                state_h = tf.zeros([tf.shape(h)[0], units], dtype=h.dtype)
+                state_c = tf.zeros([tf.shape(h)[0], units], dtype=h.dtype)
+                outputs = []
+                for t in range(h.shape[1]):
+                    z = z_x[:, t, :] + tf.einsum("ni,nij->nj", state_h, recurrent)
+                    z_i, z_f, z_c, z_o = tf.split(z, 4, axis=1) # Keras gate order: input, forget, cell, output
+                    state_c = rec_act(z_f) * state_c + rec_act(z_i) * act(z_c)
+                    state_h = rec_act(z_o) * act(state_c)
+                    outputs.append(state_h)
+                h = tf.stack(outputs, axis=1) if cfg.get("return_sequences") else state_h
+            elif class_name == "Dense":
+                kernel = weights[i]
+                i += 1
+                if len(h.shape) == 3:
+                    h = tf.einsum("nti,nij->ntj", h, kernel)
+                    if cfg.get("use_bias", True):
+                        h = h + weights[i][:, None, :]
+                        i += 1
+                else:
+                    h = tf.einsum("ni,nij->nj", h, kernel)
+                    if cfg.get("use_bias", True):
+                        h = h + weights[i]
+                        i += 1
+                h = _ACTIVATIONS[cfg["activation"]](h)
+            # InputLayer and Dropout are identities at inference time
+        return h
+    return forward
+
+def _run_fallback(symbols: List[str], windows: np.ndarray) -> Dict[str, float]:
+    # direct __call__ skips the per-call setup that model.predict does
+    results = {}
+    for row, symbol in enumerate(symbols):
+        model = get_or_load_model(symbol)
+        if model is None:
+            continue
+        output = model(windows[row:row + 1], training=False)
+        results[symbol] = float(np.asarray(output).reshape(-1)[0])
+    return results
+
+def predict_batch(symbols: List[str], windows: np.ndarray) -> Dict[str, float]:
+    """
+    Run every symbol's own model on its own window in as few calls as possible.
+    :param symbols: 股票代碼列表，與 windows 第一維一一對應
+    :param windows: 標準化後的輸入，shape (N, timesteps, num_features)
+    :return: {symbol: scaled prediction}
+    """
+    windows = np.asarray(windows, dtype=np.float32)
+    groups: Dict[tuple, List[Tuple[int, str, dict]]] = {}
+    fallback_rows: List[int] = []
+    for row, symbol in enumerate(symbols):
+        spec = read_model_spec(symbol)
+        if spec is None:
+            continue
+        if not _is_supported(spec["layers"]):
+            fallback_rows.append(row)
+            continue
+        groups.setdefault(spec["signature"], []).append((row, symbol, spec))
+
+    results: Dict[str, float] = {}
+    for signature, members in groups.items():
+        if signature not in _compiled_forward:
+            _compiled_forward[signature] = _build_forward(members[0][2]["layers"])
+        forward = _compiled_forward[signature]
+        for start in range(0, len(members), INFERENCE_GROUP_SIZE):
+            chunk = members[start:start + INFERENCE_GROUP_SIZE]
+            rows = [row for row, _, _ in chunk]
+            stacked = [tf.constant(np.stack(ws)) for ws in zip(*(spec["weights"] for _, _, spec in chunk))]
+            outputs = forward(tf.constant(windows[rows]), stacked).numpy().reshape(len(chunk), -1)
+            for (_, symbol, _), output in zip(chunk, outputs):
+                results[symbol] = float(output[0])
+        print(f"✅ Batched inference ran {len(members)} models sharing one architecture")
+
+    if fallback_rows:
+        results.update(_run_fallback([symbols[row] for row in fallback_rows], windows[fallback_rows]))
+        print(f"✅ Fallback inference ran {len(fallback_rows)} models with unsupported layers")
+    return results
@@ -1,37 +1,40 @@
 # app/tasks/jobs.py
 import asyncio
+import base64
 import email
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from http.client import HTTPException
-import smtplib
 from email.mime.text import MIMEText
 from fastapi import HTTPException
-from typing import List
+from typing import Dict, List
 import numpy as np
 from datetime import datetime, timedelta
 from app.routers import email
 
-from app.services.data_ingest import save_index_statistics, save_stock_data, save_index_data, save_stock_predictions, save_stock_rank, save_stock_statistics
+from app.services.data_ingest import save_index_statistics, save_stock_data_incremental, save_index_data, save_stock_predictions_batch, save_stock_rank_batch, save_stock_statistics_batch
 from app.repositories.indexes import get_any_date_index_price, get_last_index_days200_end_date, get_several_index_statistics, select_index_start_date, get_last_date_index_price, get_several_index_price, get_last_index_window_end_date
-from app.repositories.stocks import get_any_date_stock_price, get_industry_stock_category, get_last_date_stock_price, get_last_stock_days200_end_date, get_last_stock_window_end_date, get_sector_stock_category, get_several_stock_price, get_several_stock_statistics, select_stock_start_date
-from app.tasks.algorithm import calculate_stock_potensoial, days_index_moving_average, days_stock_moving_average, compute_rsi
-from app.utils.app_state import get_tickers, get_model_params, get_user_db, get_sql_path
-from app.tasks.predictions import destandardize_data, predict, standardize_index_data, standardize_stock_data, PredictionInput, PredictionInput_stock
+from app.repositories.stocks import get_industry_stock_category, get_last_date_stock_price, get_sector_stock_category, get_latest_stock_predictions, get_latest_stock_statistics, get_stock_price_window
+from app.utils.app_state import get_tickers, get_model_params, get_user_db
+from app.tasks.predictions import destandardize_data, predict, standardize_index_data, standardize_stock_windows, PredictionInput
+from app.tasks import indicators
+from app.tasks.inference import predict_batch
+from app.tasks.statistics import get_moving_averages
 from app.services.data_ingest import save_index_predictions
-from app.routers.email import generate_stock_chart
-from app.utils.file import open_sql_file
+from app.services.charts import prerender_charts
+from app.services.mailer import MAIL_FROM, mail_queue
+from app.repositories.notifications import get_due_notification_bookmarks, reschedule_notifications
+from app.utils.notification_time import FIRE_TIME_FORMAT, NOTIFICATION_CATCHUP_MINUTES
 
 # update stock data job for scheduler of daily updates
 async def update_financial_data_job(arg:str = "schedule"):
     # set start_date to next day
     index_start_date = select_index_start_date()
-    stock_start_date = select_stock_start_date()
     # set end_date to today
     end_date = datetime.now().strftime("%Y-%m-%d")
     match arg:
         case "schedule":
-            print(f"Scheduled job: Updating financial data from {stock_start_date} to {end_date}")
+            print(f"Scheduled job: Updating financial data from {index_start_date} to {end_date}")
         case "manual":
             print(f"Manually by URL: Updating financial data from {index_start_date} to {end_date}")
     if get_tickers():
@@ -43,35 +46,28 @@ async def update_financial_data_job(arg:str = "schedule"):
             await asyncio.to_thread(run_index_prediction_on_startup)
         else:
             print("⭕️ The index data is up to date in the financial database")
-        if stock_start_date != end_date:
-            await asyncio.to_thread(save_stock_data, get_tickers(), start_date=stock_start_date, end_date=end_date) # download and save in a thread to avoid blocking the event loop
-            # await asyncio.to_thread(save_stock_statistics, data={}, ticker="^GSPC")
-            # await asyncio.to_thread(save_stock_predictions, data={}, ticker="^GSPC")
-            # await asyncio.to_thread(save_stock_rank, data={}, ticker=get_tickers()) 
+        # every ticker resumes from its own last stored date, gaps against the index calendar are re-downloaded
+        result = await asyncio.to_thread(save_stock_data_incremental, get_tickers(), end_date=end_date) # download and save in a thread to avoid blocking the event loop
+        if result["groups"]:
             await asyncio.to_thread(run_stock_statistics_on_startup, get_tickers())
             await asyncio.to_thread(run_stock_prediction_on_startup, get_tickers()) 
             await asyncio.to_thread(run_stock_rank_on_startup, get_tickers())
-        else:
-            print("⭕️ The stock data is up to date in the financial database")
     else:
         print("⚠️ No tickers found for scheduled update")
         return
 
 # Run index statistics calculation on server startup
-def run_index_statistics_on_startup(ticker: str = "^GSPC"):
+def run_index_statistics_on_startup(ticker: str = "^GSPC", rebuild: bool = False):
     try:
-        last_index_date = get_last_date_index_price()
-        last_days200_end_date = get_last_index_days200_end_date()
-        """
-        # Skip prediction if no new data since last prediction
-        if last_index_date == last_days200_end_date:
-            print(f"⭕️ Skipping index statistics, no new data since last statistics on {last_days200_end_date}.")
-            return
-        """
+        # Rolling window is kept up to date by save_index_data, the database is only read when needed
+        stats = get_moving_averages("index", [ticker], rebuild=rebuild)[ticker]
+
         # Data post-processing
-        days200_start_date = get_any_date_index_price(ticker, 200)
+        days200_start_date = stats["days200_start_date"]
         days200_end_date = get_last_date_index_price()
-        days200_ma = days_index_moving_average(ticker, 200)
+        days200_ma = stats["days200_ma"]
+        if days200_ma is None:
+            print(f"⚠️ Not enough data for {ticker} to calculate 200-day moving average")
 
         # Prepare data for insertion
         data = {}
@@ -84,35 +80,34 @@ def run_index_statistics_on_startup(ticker: str = "^GSPC"):
         save_index_statistics(data, ticker)
     except Exception as e:
         print(f"❌ Error during startup index {ticker} statistics: {e}")
+        return False  # reported to the startup pipeline as a failed step
 
 # Run stock statistics calculation on server startup
-def run_stock_statistics_on_startup(tickers: List[str]):
+def run_stock_statistics_on_startup(tickers: List[str], rebuild: bool = False):
     try:
+        last_stock_date = get_last_date_stock_price()
+        # Rolling windows are kept up to date by save_stock_data, the database is only read when needed
+        stats = get_moving_averages("stock", tickers, rebuild=rebuild)
+        records = []
         for ticker in tickers:
-            last_stock_date = get_last_date_stock_price()
-            last_days200_end_date = get_last_stock_days200_end_date()
-            
-            """
-            # Skip prediction if no new data since last prediction
-            if last_stock_date == last_days200_end_date:
-                print(f"⭕️ Skipping stock statistics, no new data since last statistics on {last_days200_end_date}.")
-                continue
-            """
-            
             # Data post-processing
-            days200_start_date = get_any_date_stock_price(ticker, 200)
-            days200_end_date = get_last_date_stock_price()
-            days200_ma = days_stock_moving_average(ticker, 200)
+            days200_start_date = stats[ticker]["days200_start_date"]
+            days200_end_date = last_stock_date
+            days200_ma = stats[ticker]["days200_ma"]
+            if days200_ma is None:
+                print(f"⚠️ Not enough data for {ticker} to calculate 200-day moving average")
             # Prepare data for insertion
             data = {}
             data['ticker'] = ticker
             data['days200_start_date'] = days200_start_date
             data['days200_end_date'] = days200_end_date
             data['days200_ma'] = days200_ma
-            # Insert data into index_statistics table
-            save_stock_statistics(data, ticker)
+            records.append(data)
+        # Insert all rows into stock_statistics table in one transaction
+        save_stock_statistics_batch(records)
     except Exception as e:
         print(f"❌ Error during startup stock statistics: {e}")
+        return False
 
 # Run index prediction on server startup
 def run_index_prediction_on_startup(ticker: str = "^GSPC"):
@@ -181,203 +176,187 @@ def run_index_prediction_on_startup(ticker: str = "^GSPC"):
         print(f"Recommendation: {recommendation}")
     except Exception as e:
         print(f"❌ Error during startup index prediction: {e}")
+        return False
 
-# Run stock prediction on server startup
+# Run stock prediction on server startup, every ticker goes through one batched inference pass
 def run_stock_prediction_on_startup(tickers: List[str]):
     try:
+        last_stock_date = get_last_date_stock_price()
+        # latest 200-day moving average per ticker in one query, one row per symbol
+        df_ma = get_latest_stock_statistics(symbols=tickers, columns=['symbol', 'days200_ma'])
+        last_days200_ma = df_ma.set_index('symbol')['days200_ma'].to_dict()
+
+        # Group tickers by model window size so each group stacks into one (N, window_size, features) array
+        groups = {}
         for ticker in tickers:
-            last_stock_date = get_last_date_stock_price()
-            last_window_end_date = get_last_stock_window_end_date()
             window_size = get_model_params("timesteps", ticker)
-            last_days200_ma = get_several_stock_statistics(symbols=[ticker], columns=['days200_ma'], limit=1)
-            """
-            # Skip prediction if no new data since last prediction
-            if last_stock_date == last_window_end_date:
-                print(f"⭕️ Skipping stock prediction, no new data since last prediction on {last_window_end_date}.")
+            if window_size is None:
+                print(f"⚠️ No model parameters for stock {ticker}. Skipping prediction.")
                 continue
-            """
-            # Get latest days(window size) of close and volume for ticker
-            df = get_several_stock_price([ticker], ['close', 'volume'], limit=window_size)
-
-            # Check data sufficiency
-            if df.empty or len(df) < int(window_size):
-                print(f"⚠️ Not enough stock data {ticker} for prediction (need {window_size} days)")
+            groups.setdefault(int(window_size), []).append(ticker)
+
+        records = []
+        for window_size, group in groups.items():
+            # Get latest days(window size) of close for every ticker in one query
+            cube, symbol_index, dates = get_stock_price_window(group, ['close'], window_size)
+            complete = ~np.isnan(cube[:, :, 0]).any(axis=1)
+            for ticker in group:
+                if not complete[symbol_index[ticker]]:
+                    print(f"⚠️ Not enough stock data {ticker} for prediction (need {window_size} days)")
+            symbols = [ticker for ticker in group if complete[symbol_index[ticker]]]
+            if not symbols:
                 continue
-            
-            # Prepare standardized features
-            closes = df['close'].values.astype(float).reshape(-1, 1)
-            rsi = compute_rsi(df['close'], period=14).fillna(0).to_numpy().astype(float).reshape(-1, 1)
-            sma50 = df['close'].rolling(50).mean().fillna(0).to_numpy().astype(float).reshape(-1, 1)
-            
-            # Standardize data
-            features = standardize_stock_data(closes, rsi, sma50)
-
-            # Check if features are valid
-            if features is None or not isinstance(features, (list, np.ndarray)) or len(features) == 0:
-                print(f"⚠️ Features for {ticker} are invalid or empty. Skipping prediction.")
-                return
-
-            # Ensure features is a list
-            if isinstance(features, np.ndarray):
-                features = features.tolist()
+            rows = [symbol_index[ticker] for ticker in symbols]
+            closes = cube[rows, :, 0]
+            window_start_dates = dates[rows, -1]
 
-            # Create PredictionInput_stock
-            input_data = PredictionInput_stock(features=features)
+            # Standardize all windows at once and run prediction
+            features, y_mean, y_scale = standardize_stock_windows(closes)
+            predictions = predict_batch(symbols, features)
 
-            # Run prediction
-            result = predict(input_data, ticker)
-            
             # Data post-processing
-            window_start_date = get_any_date_stock_price(ticker, window_size)
-            window_end_date = last_stock_date
-            predicted_scaled = np.array(result['prediction']).reshape(-1, 1)
-            predicted_real = destandardize_data(predicted_scaled) # Destandardize predicted value
-            last_actual_close = closes[-1, 0]
-            recommendation = "BUY" if predicted_real >= last_days200_ma['days200_ma'][0] else "SELL"
-            feature_number = get_model_params("num_features", ticker)
-            input_features_length = len(result['input_features'])
-            
-            # Prepare data for insertion
-            data = {}
-            data['ticker'] = ticker
-            data['window_size'] = window_size
-            data['window_start_date'] = window_start_date
-            data['window_end_date'] = window_end_date
-            data['predicted_scaled'] = predicted_scaled[0, 0]
-            data['predicted_real'] = predicted_real
-            data['last_actual_close'] = last_actual_close
-            data['recommendation'] = recommendation
-            data['feature_number'] = feature_number
-            data['input_features_length'] = input_features_length
-
-            # Insert data into stock_predictions table
-            save_stock_predictions(data, ticker)
-            
-            print(f"📈 stock {ticker} Prediction result on startup:")
-            print(f"Predicted scaled: {predicted_scaled[0, 0]}")
-            print(f"Predicted real close price: {predicted_real}")
-            print(f"Last actual close: {last_actual_close}")
-            print(f"Recommendation: {recommendation}")
+            for row, ticker in enumerate(symbols):
+                if ticker not in predictions:
+                    print(f"⚠️ No prediction for stock {ticker}. Skipping.")
+                    continue
+                if ticker not in last_days200_ma:
+                    print(f"⚠️ No 200-day moving average for stock {ticker}. Skipping.")
+                    continue
+                predicted_scaled = predictions[ticker]
+                predicted_real = float(predicted_scaled * y_scale[row] + y_mean[row]) # Destandardize predicted value
+                last_actual_close = float(closes[row, -1])
+                recommendation = "BUY" if predicted_real >= last_days200_ma[ticker] else "SELL"
+                feature_number = get_model_params("num_features", ticker)
+
+                # Prepare data for insertion
+                data = {}
+                data['ticker'] = ticker
+                data['window_size'] = window_size
+                data['window_start_date'] = window_start_dates[row]
+                data['window_end_date'] = last_stock_date
+                data['predicted_scaled'] = predicted_scaled
+                data['predicted_real'] = predicted_real
+                data['last_actual_close'] = last_actual_close
+                data['recommendation'] = recommendation
+                data['feature_number'] = feature_number
+                data['input_features_length'] = window_size * feature_number
+                records.append(data)
+                print(f"📈 stock {ticker} prediction: {predicted_real} | last actual close: {last_actual_close} | {recommendation}")
+
+        # Insert all rows into stock_predictions table in one transaction
+        save_stock_predictions_batch(records)
     except Exception as e:
         print(f"❌ Error during startup stock prediction: {e}")
+        return False
 
-
+# Run stock ranking on server startup, potential of every ticker is computed once and all rows are written together
 def run_stock_rank_on_startup(tickers: List[str]):
     try:
-        temp_po = {}
-        for ticker in tickers:
-            potential = calculate_stock_potensoial(ticker)
-            print(f"potential: {potential}")
-            if potential is not None:
-                temp_po[ticker] = potential
-            else:
-                continue
-
-        sorted_temp_po = {k: v for k, v in sorted(temp_po.items(), key=lambda item: item[1], reverse=True)}
-        print(f"sorted_temp_po: {sorted_temp_po}")
-            
-        for ticker in tickers:
-            # Data post-processing
-            sector = get_sector_stock_category(ticker)
-            industry = get_industry_stock_category(ticker)
-            current_price = get_several_stock_price([ticker], ['close'], limit=1)['close'][0]
-            potential = calculate_stock_potensoial(ticker)
-
+        # Latest 200 closes and latest prediction of every ticker, then potential for all tickers in one pass
+        cube, symbol_index, _ = get_stock_price_window(tickers, ['close'], 200)
+        closes = cube[:, ::-1, 0].T # (dates x tickers), oldest first
+        ma_200 = indicators.moving_average(closes, 200)
+        df_pred = get_latest_stock_predictions(symbols=tickers, columns=['symbol', 'predicted_real'])
+        latest_pred = df_pred.set_index('symbol')['predicted_real'].to_dict()
+        predicted = np.array([latest_pred.get(ticker, np.nan) for ticker in symbol_index], dtype=float)
+        potentials = indicators.potential(predicted, ma_200)
+
+        # Rank by potential, highest first; tickers without a potential are skipped
+        ranked = [ticker for ticker in symbol_index if not np.isnan(potentials[symbol_index[ticker]])]
+        skipped = [ticker for ticker in symbol_index if np.isnan(potentials[symbol_index[ticker]])]
+        if skipped:
+            print(f"⚠️ Cannot calculate potential for {skipped} due to missing data")
+        ranked.sort(key=lambda ticker: potentials[symbol_index[ticker]], reverse=True)
+
+        records = []
+        for rank, ticker in enumerate(ranked, start=1):
+            row = symbol_index[ticker]
             # Prepare data for insertion
             data = {}
             data['ticker'] = ticker
-            data['sector'] = sector
-            data['industry'] = industry
-            data['current_price'] = current_price
-            data['potential'] = potential
-
-            # Insert data into stock_rank table
-            save_stock_rank(data, ticker)
-
-            print(f"📈 stock {ticker} Potential result on startup:")
-            print(f"Potential: {potential}%")
+            data['sector'] = get_sector_stock_category(ticker)
+            data['industry'] = get_industry_stock_category(ticker)
+            data['current_price'] = float(cube[row, 0, 0])
+            data['potential'] = float(potentials[row])
+            data['rank'] = rank
+            records.append(data)
+            print(f"📈 stock {ticker} rank {rank} | potential: {data['potential']}%")
+
+        # Insert all rows into stock_rank table in one transaction
+        save_stock_rank_batch(records)
     except Exception as e:
         print(f"❌ Error during startup stock ranking: {e}")
+        return False
+
+# Build one digest email with the charts of every notify bookmark of a user, charts maps symbol to base64 PNG
+def build_bookmark_digest(email: str, symbols: List[str], charts: Dict[str, str]) -> MIMEMultipart:
+    message = MIMEMultipart("alternative")
+    message["From"] = MAIL_FROM
+    message["To"] = email
+    message["Subject"] = f"Your Bookmark Notification--{', '.join(symbols)}"
+
+    images = "".join(f"""
+                <p>Here's your latest stock data for {symbol}:</p>
+                <img src="data:image/png;base64,{charts[symbol]}" 
+                alt="{symbol} Chart" style="max-width:100%; height:auto;">""" for symbol in symbols)
+    html_body = f"""
+    <html>
+    <body>
+        <p>Dear User,</p>{images}
+        <p>Thank you for using our service!</p>
+    </body>
+    </html>
+    """
+    message.attach(MIMEText(html_body, "html"))
+    return message
 
 # Send scheduled email notifications
 def send_scheduled_email_notifications():
     try:
-        from app.utils.file import open_sql_file
-        from app.utils.app_state import get_sql_path, get_user_db
-
-        sender_email = "ifmapyishu3@gmail.com"
-        sender_password = "wrvukaqqnzcszwge"
-
-        # Get all emails that have bookmarks with notify=true and their notification settings
-        sql_emails = open_sql_file(get_sql_path("select_emails_with_notify_bookmarks"))
-        con = get_user_db()
-        emails = con.execute(sql_emails).fetchall()
-
-        for email_row in emails:
-            email = email_row[0]  # Extract email from tuple
-            sql_notification_setting = open_sql_file(get_sql_path("select_notification_setting"))
-            notification_setting = con.execute(sql_notification_setting, (email,)).fetchone()
-            if match_notification_time(notification_setting[0], notification_setting[3], notification_setting[1], notification_setting[2]):
-                # Get all stock symbols for this email that have notify=true
-                sql_bookmarks = open_sql_file(get_sql_path("select_notify_bookmarks_by_email"))
-                bookmarks = con.execute(sql_bookmarks, (email,)).fetchall()
-                for bookmark in bookmarks:
-                    # Send email with stock chart for each bookmarked stock
-                    try:
-                        subject = f"Your Bookmark Notification--{bookmark[0]}"
-
-                        message = MIMEMultipart("alternative")
-                        message["From"] = sender_email
-                        message["To"] = email
-                        message["Subject"] = subject
-
-                        html_body = f"""
-                        <html>
-                        <body>
-                            <p>Dear User,</p>
-                            <p>Here's your latest stock data for {bookmark[0]}:</p>
-                            <img src="data:image/png;base64,{generate_stock_chart(bookmark[0])}" 
-                            alt="{bookmark[0]} Chart" style="max-width:100%; height:auto;">
-                            <p>Thank you for using our service!</p>
-                        </body>
-                        </html>
-                        """
-                        message.attach(MIMEText(html_body, "html"))
-
-                        try:
-                            with smtplib.SMTP("smtp.gmail.com", 587) as server:
-                                server.starttls()
-                                server.login(sender_email, sender_password)
-                                server.send_message(message)
+        # Users due now and their notify bookmarks come from the next_fire_at index in one joined query
+        now = datetime.now()
+        settings, bookmarks = get_due_notification_bookmarks(now)
+        if not settings:
+            return
+        catchup = (now - timedelta(minutes=NOTIFICATION_CATCHUP_MINUTES)).strftime(FIRE_TIME_FORMAT)
 
-                            print(f"Sending email to {email} successfully.")
-                        except Exception as e:
-                            raise HTTPException(status_code=500, detail=str(e))
-                    except Exception as e:
-                        print(f"❌ Error sending email to {email} for stock {bookmark[0]}: {e}")
-            else:
+        due = []
+        for email, *_, next_fire_at in settings:
+            if next_fire_at < catchup:
+                print(f"⭕️ Skipping notification to {email} missed at {next_fire_at}")
+                continue
+            if bookmarks[email]:  # users without notify bookmarks are only rescheduled
+                due.append((email, bookmarks[email]))
+        # prices of every due symbol are read in one query and each chart is rendered once up front;
+        # the PNGs are used directly, the bounded chart cache may already have evicted some of them
+        try:
+            pngs = prerender_charts(symbol for _, symbols in due for symbol in symbols)
+            charts = {symbol: base64.b64encode(png).decode() for symbol, png in pngs.items()}
+        except Exception as e:
+            # due users are still rescheduled below, otherwise the slot is retried every minute until it is skipped
+            print(f"❌ Error pre-rendering charts: {e}")
+            charts = {}
+
+        # One digest per user, delivered by the mail queue over its persistent SMTP sessions
+        messages = []
+        for email, symbols in due:
+            symbols = [symbol for symbol in symbols if symbol in charts]
+            if not symbols:
+                print(f"⚠️ No charts available for {email}, skipping notification")
                 continue
-           
-            
-        print(f"✅ Sent scheduled email notifications to {len(emails)} users")
+            try:
+                messages.append(build_bookmark_digest(email, symbols, charts))
+            except Exception as e:
+                print(f"❌ Error building email to {email}: {e}")
+        result = mail_queue.send_all(messages)
+        for email in result["sent"]:
+            print(f"Sending email to {email} successfully.")
+        for email, error in result["failed"].items():
+            print(f"❌ Error sending email to {email}: {error}")
+
+        # Next fire time of every due user, including failed and skipped ones, so a setting fires at most once per slot
+        reschedule_notifications(settings, now)
+        print(f"✅ Sent scheduled email notifications to {len(result['sent'])} users")
 
     except Exception as e:
         print(f"❌ Error during scheduled email notifications: {e}")
-
-def match_notification_time(frequency: str, notification_time: str, day_of_week: str = None, date: int = None) -> bool:
-    now = datetime.now()
-    current_time = now.strftime("%H:%M")
-    if frequency == "daily":
-        return current_time == notification_time
-    elif frequency == "weekly":
-        current_day_of_week = datetime.now().strftime("%A")
-        return current_time == notification_time and current_day_of_week == day_of_week
-    elif frequency == "monthly":
-        current_date = datetime.now().day
-        # check current month has the specified date, if not, use the last day of the month
-        last_day_of_month = (datetime(now.year, now.month + 1, 1) - timedelta(days=1)).day
-        if date > last_day_of_month:            
-            date = last_day_of_month
-        return current_time == notification_time and current_date == date
-    else:
-        return False
\ No newline at end of file
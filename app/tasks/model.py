@@ -1,49 +1,91 @@
 # app/tasks/model.py
+import json
+import os
+import threading
+from typing import Optional, Tuple
 
+import h5py
 import tensorflow as tf
 
-from app.utils.app_state import set_model, set_model_params, get_tickers
+from app.utils.app_state import get_model, get_model_params, set_model, set_model_cache_limits, set_model_params, get_tickers
 
-def add_model_params(model: tf.keras.Model, symbol: str):
-    # Check the input shape (feature count is shape[-1], exclude batches).
-    input_shape = model.input_shape
-    print("Input shape:", input_shape)
+# models/ directory at the repo root
+MODEL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'models'))
 
-    # Time step
-    timesteps = input_shape[1]  # 60
-    print("Time step:", timesteps)
+# LRU ceiling for resident models, override with environment variables
+MODEL_CACHE_MAX_MODELS = int(os.getenv("MODEL_CACHE_MAX_MODELS", "32"))
+MODEL_CACHE_MAX_MB = int(os.getenv("MODEL_CACHE_MAX_MB", "0"))  # 0 means count ceiling only
 
-    # Number of features
-    num_features = input_shape[2]  # 2
-    print("Number of features:", num_features)
+_load_lock = threading.Lock()
 
-    # Total input length (time step * number of features)
-    total_inputs = timesteps * num_features  # 120
-    print("Total input length:", total_inputs)
+def get_model_path(symbol: str) -> str:
+    if symbol == "^GSPC":
+        return os.path.join(MODEL_DIR, "SP500_model.h5")
+    return os.path.join(MODEL_DIR, f"{symbol}_model.h5")
 
-    # Check data type
-    data_type = model.inputs[0].dtype
-    print("Input data type:", data_type)
+def read_model_input_shape(symbol: str) -> Optional[Tuple[int, int]]:
+    """
+    Read (timesteps, num_features) from the H5 `model_config` attribute without building the Keras graph.
+    :param symbol: 股票代碼，例如 "AAPL"；指數使用 "^GSPC"
+    :return: (timesteps, num_features)，檔案不存在或格式不符時回傳 None
+    """
+    path = get_model_path(symbol)
+    if not os.path.exists(path):
+        print(f"⚠️ Model file for {symbol} not found: {path}")
+        return None
+    try:
+        with h5py.File(path, "r") as f:
+            config = f.attrs["model_config"]
+        config = json.loads(config.decode("utf-8") if isinstance(config, bytes) else config)
+        first_layer = config["config"]["layers"][0]["config"]
+        # Keras 3 saves `batch_shape`, Keras 2 saves `batch_input_shape`
+        input_shape = first_layer.get("batch_shape") or first_layer.get("batch_input_shape")
+        return int(input_shape[1]), int(input_shape[2])
+    except Exception as e:
+        print(f"❌ Could not read model metadata for {symbol}: {e}")
+        return None
 
-    # Print model summary for visualization
-    model.summary()
+def add_model_params(symbol: str) -> bool:
+    # Read the input shape (batch, timesteps, features) from metadata and set model parameters in app state
+    input_shape = read_model_input_shape(symbol)
+    if input_shape is None:
+        return False
+    timesteps, num_features = input_shape
+    set_model_params(timesteps, num_features, timesteps * num_features, symbol)
+    return True
 
-    # Set model parameters in app state
-    set_model_params(timesteps, num_features, total_inputs, symbol)
+def get_or_load_model(symbol: str):
+    """Return the model for `symbol`, loading it from disk the first time it is asked for."""
+    model = get_model(symbol)
+    if model is not None:
+        return model
+    with _load_lock:
+        model = get_model(symbol)  # another thread may have loaded it while we waited
+        if model is not None:
+            return model
+        try:
+            model = tf.keras.models.load_model(get_model_path(symbol))
+        except Exception as e:
+            print(f"❌ Error loading ML model for {symbol}: {e}")
+            return None
+        if get_model_params("timesteps", symbol) is None:
+            add_model_params(symbol)
+        size_bytes = sum(w.nbytes for w in model.get_weights())
+        evicted = set_model(model, symbol, size_bytes)
+        print(f"✅ ML model for {symbol} loaded successfully.")
+        if evicted:
+            print(f"🔄 Evicted cold models: {evicted}")
+        return model
 
 def load_model():
-    # Load the Keras .h5 model
-    try:
-        model = tf.keras.models.load_model('../4330FYP2025MU_IFMAP_B/models/SP500_model.h5')
-        print("✅ ML model for ^GSPC loaded successfully.")
-        set_model(model, "^GSPC")
-        add_model_params(model, "^GSPC")
-        for symbol in get_tickers():
-            model = tf.keras.models.load_model(f'../4330FYP2025MU_IFMAP_B/models/{symbol}_model.h5')
-            print(f"✅ ML model for {symbol} loaded successfully.")
-            set_model(model, symbol)
-            add_model_params(model, symbol)
-    except Exception as e:
-        print(f"❌ Error loading ML model: {e}")
-        model = None
-
+    # Register model parameters for every symbol; the models themselves are loaded on first use
+    set_model_cache_limits(MODEL_CACHE_MAX_MODELS, MODEL_CACHE_MAX_MB * 1024 * 1024)
+    registered, missing = 0, []
+    for symbol in ["^GSPC"] + get_tickers():
+        if add_model_params(symbol):
+            registered += 1
+        else:
+            missing.append(symbol)
+    print(f"✅ Model parameters registered for {registered} symbols.")
+    if missing:
+        print(f"⚠️ No usable model for: {missing}")
@@ -5,22 +5,23 @@ from fastapi import HTTPException
 from pydantic import BaseModel, Field
 from typing import List
 
-from app.utils.app_state import get_model, get_model_params
+from app.tasks import indicators
+from app.utils.app_state import get_model_params
+from app.tasks.model import get_or_load_model
 
-#  Create an instance of the StandardScalers for input features and output
+#  Create an instance of the StandardScalers for input features and output, used by the single-window index path
 scaler_X = StandardScaler()
 scaler_y = StandardScaler()
 
 # The Pydantic model defines the input format (e.g., a list of floating-point numbers for financial features such as stock price and trading volume).
 class PredictionInput(BaseModel):
     features: List[float] = Field(..., min_items=120, max_items=120) # Adjusted to 120 inputs (60 steps x 2 features); '...' means required
-class PredictionInput_stock(BaseModel):
-    features: List[float] = Field(..., min_items=180, max_items=180) # Adjusted to 180 inputs (60 steps x 3 features); '...' means required
 
 # Receive input features and perform model prediction.
 def predict(input_data: PredictionInput, symbol: str):
-    # Ensure the model is loaded
-    if get_model(symbol) is None:
+    # Ensure the model is loaded, on first use it is read from disk
+    model = get_or_load_model(symbol)
+    if model is None:
         raise HTTPException(status_code=500, detail="Model not loaded properly")
     
     # Check if the input length meets the model requirements.
@@ -32,7 +33,7 @@ def predict(input_data: PredictionInput, symbol: str):
     print(f"Input array shape: {input_array.shape}, dtype: {input_array.dtype}")
     
     # Execute prediction (adjust for your model's output, e.g., a single value or probability)
-    prediction = get_model(symbol).predict(input_array, verbose=0)
+    prediction = model.predict(input_array, verbose=0)
     
     # Output processing (assuming a single regression output, adjust if multi-output)
     result = float(prediction[0])
@@ -63,27 +64,29 @@ def standardize_index_data(closes: np.ndarray, volumes: np.ndarray):
     
     return features
 
-# Standardize stock's input data
-def standardize_stock_data(closes: np.ndarray, rsi: np.ndarray, sma50: np.ndarray):
-    # Prepare X, y
-    X = np.hstack([closes, rsi, sma50]) # shape (60, 3) ; hstack to horizontally stack arrays
-    y = closes # shape (60, 1)
-
-    # Standardize using StandardScaler
-    X_scaled = scaler_X.fit_transform(X)
-    y_scaled = scaler_y.fit_transform(y)
-
-    # Prepare features: [close1_scaled, rsi1_scaled, sma50_1_scaled, close2_scaled, rsi2_scaled, sma50_2_scaled, ..., close60_scaled, rsi60_scaled, sma50_60_scaled]
-    features = X_scaled.reshape(-1).tolist()
-
-    # Check if enough data
-    if len(features) != 180:
-        print(f"⚠️ Features length {len(features)} != 180, skipping prediction")
-        return
-    
-    return features
-
 # Destandardize predicted data
 def destandardize_data(data: np.ndarray):
     # The prediction is for the next close price, scaled. Inverse transform to get real value
-    return scaler_y.inverse_transform(data)[0, 0] 
\ No newline at end of file
+    return scaler_y.inverse_transform(data)[0, 0] 
+
+# Standardize per ticker along the time axis, same as fitting one StandardScaler per window
+def _standardize(values: np.ndarray):
+    mean = values.mean(axis=1, keepdims=True)
+    scale = values.std(axis=1, keepdims=True)
+    scale = np.where(scale == 0, 1.0, scale)
+    return (values - mean) / scale, mean, scale
+
+# Build standardized stock windows for all tickers at once
+def standardize_stock_windows(closes: np.ndarray):
+    """
+    :param closes: 收盤價矩陣，shape (N, timesteps)，列順序與 get_several_stock_price 回傳一致
+    :return: (features (N, timesteps, 3), y_mean (N,), y_scale (N,))
+    """
+    closes = np.asarray(closes, dtype=float)
+    rsi = np.nan_to_num(indicators.rsi(closes, 14, axis=1), nan=0.0) # fillna(0)
+    sma50 = np.nan_to_num(indicators.sma(closes, 50, axis=1), nan=0.0)
+
+    X = np.stack([closes, rsi, sma50], axis=2) # shape (N, 60, 3)
+    X_scaled, _, _ = _standardize(X)
+    _, y_mean, y_scale = _standardize(closes)
+    return X_scaled.astype(np.float32), y_mean[:, 0], y_scale[:, 0]
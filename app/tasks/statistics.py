@@ -0,0 +1,115 @@
+# app/tasks/statistics.py
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.repositories.indexes import get_several_index_price
+from app.repositories.stocks import get_stock_price_window
+
+# days in the moving average kept by the statistics engine
+MA_WINDOW = 200
+
+class RollingMean:
+    """Last `size` closes of one symbol with a running sum, oldest first."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.dates: deque = deque(maxlen=size)
+        self.closes: deque = deque(maxlen=size)
+        self.total = 0.0
+        self._pushes = 0
+
+    def push(self, date: str, close: float) -> bool:
+        # only appends in date order; an older or repeated date means the window needs a rebuild
+        if self.dates and date <= self.dates[-1]:
+            return False
+        if len(self.closes) == self.size:
+            self.total -= self.closes[0]  # deque drops it on append
+        self.dates.append(date)
+        self.closes.append(close)
+        self.total += close
+        self._pushes += 1
+        if self._pushes >= self.size:
+            # re-sum once per window so float error from add/subtract never builds up
+            self.total = float(sum(self.closes))
+            self._pushes = 0
+        return True
+
+    def mean(self) -> Optional[float]:
+        if len(self.closes) < self.size:
+            return None
+        return self.total / self.size
+
+    def start_date(self) -> Optional[str]:
+        if len(self.dates) < self.size:
+            return None
+        return self.dates[0]
+
+# rolling windows per table kind ("stock" / "index") and symbol
+_windows: Dict[str, Dict[str, RollingMean]] = {"stock": {}, "index": {}}
+_stale: Dict[str, set] = {"stock": set(), "index": set()}
+_lock = threading.Lock()
+
+def _load_stock_windows(symbols: List[str]) -> Dict[str, RollingMean]:
+    cube, symbol_index, dates = get_stock_price_window(symbols, ['close'], MA_WINDOW)
+    windows = {}
+    for symbol in symbols:
+        row = symbol_index[symbol]
+        window = RollingMean(MA_WINDOW)
+        # cube rows are newest first and NaN-padded at the old end
+        for date, close in zip(dates[row][::-1], cube[row, ::-1, 0]):
+            if not np.isnan(close):
+                window.push(date, float(close))
+        windows[symbol] = window
+    return windows
+
+def _load_index_windows(symbols: List[str]) -> Dict[str, RollingMean]:
+    windows = {}
+    for symbol in symbols:
+        df = get_several_index_price([symbol], ['close'], limit=MA_WINDOW)
+        window = RollingMean(MA_WINDOW)
+        for date, close in zip(df['date'][::-1], df['close'][::-1]):
+            window.push(date, float(close))
+        windows[symbol] = window
+    return windows
+
+def push_prices(kind: str, df: pd.DataFrame) -> None:
+    """
+    把剛寫入的價格推進對應 symbol 的移動視窗，成本只與新增筆數相關。
+    :param kind: "stock" 或 "index"
+    :param df: 含 symbol、date、close 欄位的新資料
+    """
+    if df.empty:
+        return
+    with _lock:
+        windows, stale = _windows[kind], _stale[kind]
+        for symbol, rows in df.sort_values('date').groupby('symbol', sort=False):
+            window = windows.get(symbol)
+            if window is None:
+                continue  # never loaded, the next statistics run reads it from the database
+            for date, close in zip(rows['date'], rows['close']):
+                if not window.push(date, float(close)):
+                    stale.add(symbol)
+                    break
+
+def get_moving_averages(kind: str, symbols: Iterable[str], rebuild: bool = False) -> Dict[str, dict]:
+    """
+    取得每個 symbol 的 200 日均線；只有尚未載入、資料亂序或 rebuild=True 的 symbol 會重新查詢資料庫。
+    :param kind: "stock" 或 "index"
+    :param symbols: 代碼列表
+    :param rebuild: 全部從資料庫重建（回補歷史資料後使用）
+    :return: {symbol: {"days200_start_date": str | None, "days200_ma": float | None}}
+    """
+    symbols = list(dict.fromkeys(symbols))
+    with _lock:
+        windows, stale = _windows[kind], _stale[kind]
+        to_load = symbols if rebuild else [s for s in symbols if s not in windows or s in stale]
+        if to_load:
+            loader = _load_stock_windows if kind == "stock" else _load_index_windows
+            windows.update(loader(to_load))
+            stale.difference_update(to_load)
+            print(f"🔄 Rebuilt {len(to_load)} {kind} moving-average windows from the database")
+        return {s: {"days200_start_date": windows[s].start_date(), "days200_ma": windows[s].mean()} for s in symbols}
@@ -1,75 +1,22 @@
 # app/utils/app_state.py
-from typing import Optional, List
+from typing import Optional, List, Union
+from collections import OrderedDict
 import sqlite3
 import threading
 import time
+import uuid
+
+from app.db.connection import ConnectionPool
 
 # index_piece and stock_price table column name
 ALLOWED_COLUMNS_IN_FINANCIAL = {"open","high","low","close","volume"} 
 FIXED_COLUMNS_IN_FINANCIAL = ["symbol","date"]
 DROP_STOCK_LIST = ['AMTM', 'SOLV', 'GEV', 'VLTO'] # They are not enough data for training
 
-# SQL file paths
-sql_file_create_index_price_table = 'app/db/sql/create_index_price_table.sql'
-sql_file_create_stock_price_table = 'app/db/sql/create_stock_price_table.sql'
-sql_file_create_index_predictions_table = 'app/db/sql/create_index_predictions_table.sql'
-sql_file_create_stock_predictions_table = 'app/db/sql/create_stock_predictions_table.sql'
-sql_file_create_index_statistics_table = 'app/db/sql/create_index_statistics_table.sql'
-sql_file_create_stock_statistics_table = 'app/db/sql/create_stock_statistics_table.sql'
-sql_file_create_stock_rank_table = 'app/db/sql/create_stock_rank_table.sql'
-sql_file_create_user_table = 'app/db/sql/create_user_table.sql'
-sql_file_create_bookmark_table = 'app/db/sql/create_bookmark_table.sql'
-sql_file_drop_index_price_table = 'app/db/sql/drop_index_price_table.sql'
-sql_file_drop_stock_price_table = 'app/db/sql/drop_stock_price_table.sql'
-sql_file_drop_index_predictions_table = 'app/db/sql/drop_index_predictions_table.sql'
-sql_file_drop_stock_predictions_table = 'app/db/sql/drop_stock_predictions_table.sql'
-sql_file_drop_index_statistics_table = 'app/db/sql/drop_index_statistics_table.sql'
-sql_file_drop_stock_statistics_table = 'app/db/sql/drop_stock_statistics_table.sql'
-sql_file_drop_stock_rank_table = 'app/db/sql/drop_stock_rank_table.sql'
-sql_file_select_symbol_stock_detail = 'app/db/sql/select_symbol_stock_detail.sql'
-sql_file_select_table_name_financial = 'app/db/sql/select_table_name_financial.sql'
-sql_file_select_last_date_index_price = 'app/db/sql/select_last_date_index_price.sql'
-sql_file_select_last_wedate_index_predictions = 'app/db/sql/select_last_wedate_index_predictions.sql'
-sql_file_select_last_wedate_stock_predictions = 'app/db/sql/select_last_wedate_stock_predictions.sql'
-sql_file_select_last_d200edate_index_statistics = 'app/db/sql/select_last_d200edate_index_statistics.sql'
-sql_file_select_last_d200edate_stock_statistics = 'app/db/sql/select_last_d200edate_stock_statistics.sql'
-sql_file_select_any_date_index_price = 'app/db/sql/select_any_date_index_price.sql'
-sql_file_select_any_date_stock_price = 'app/db/sql/select_any_date_stock_price.sql'
-sql_file_select_last_date_stock_price = 'app/db/sql/select_last_date_stock_price.sql'
-sql_file_select_last_date_stock_predictions = 'app/db/sql/select_last_date_stock_predictions.sql'
-sql_file_select_all_stock_price = 'app/db/sql/select_all_stock_price.sql'
-sql_file_select_all_index_price = 'app/db/sql/select_all_index_price.sql'
-sql_file_select_several_index_price = 'app/db/sql/select_several_index_price.sql'
-sql_file_select_several_stock_price = 'app/db/sql/select_several_stock_price.sql'
-sql_file_select_several_index_statistics = 'app/db/sql/select_several_index_statistics.sql'
-sql_file_select_several_stock_statistics = 'app/db/sql/select_several_stock_statistics.sql'
-sql_file_select_several_index_predictions = 'app/db/sql/select_several_index_predictions.sql'
-sql_file_select_several_stock_predictions = 'app/db/sql/select_several_stock_predictions.sql'
-sql_file_select_several_stock_rank = 'app/db/sql/select_several_stock_rank.sql'
-sql_file_select_detail_stock_detail = 'app/db/sql/select_detail_stock_detail.sql'
-sql_file_select_category_stock_detail = 'app/db/sql/select_category_stock_detail.sql'
-sql_file_insert_index_predictions_data = 'app/db/sql/insert_index_predictions_data.sql'
-sql_file_insert_stock_predictions_data = 'app/db/sql/insert_stock_predictions_data.sql'
-sql_file_insert_index_statistics_data = 'app/db/sql/insert_index_statistics_data.sql'
-sql_file_insert_stock_statistics_data = 'app/db/sql/insert_stock_statistics_data.sql'
-sql_file_insert_stock_rank_data = 'app/db/sql/insert_stock_rank_data.sql'
-sql_file_insert_bookmark = 'app/db/sql/insert_bookmark.sql'
-sql_file_delete_bookmark = 'app/db/sql/delete_bookmark.sql'
-sql_file_select_bookmark = 'app/db/sql/select_bookmark.sql'
-sql_file_create_notification_setting_table = 'app/db/sql/create_notification_setting_table.sql'
-sql_file_select_bookmark_notify = 'app/db/sql/select_bookmark_notify.sql'
-sql_file_select_emails_with_notify_bookmarks = 'app/db/sql/select_emails_with_notify_bookmarks.sql'
-sql_file_select_notify_bookmarks_by_email = 'app/db/sql/select_notify_bookmarks_by_email.sql'
-sql_file_update_bookmark_notify = 'app/db/sql/update_bookmark_notify.sql'
-sql_file_update_notification_setting = 'app/db/sql/update_notification_setting.sql'
-sql_file_insert_notification_setting = 'app/db/sql/insert_notification_setting.sql'
-sql_file_delete_notification_setting = 'app/db/sql/delete_notification_setting.sql'
-sql_file_delete_all_bookmarks = 'app/db/sql/delete_all_bookmarks.sql'
-sql_file_select_notification_setting = 'app/db/sql/select_notification_setting.sql'
-
 # database variables
-_fin_db: Optional[sqlite3.Connection] = None
-_user_db: Optional[sqlite3.Connection] = None
+# a ConnectionPool hands each thread its own connection; a bare Connection is shared by every thread
+_fin_db: Optional[Union[ConnectionPool, sqlite3.Connection]] = None
+_user_db: Optional[Union[ConnectionPool, sqlite3.Connection]] = None
 
 # ticker cache
 _tickers: Optional[List[str]] = None
@@ -82,12 +29,29 @@ _statistics_last_updated: str = ""
 # predictions cache
 _predictions_last_updated: str = ""
 
-# model cache
-_model: Optional[any] = {}
+# model cache, least recently used first
+_model: "OrderedDict[str, any]" = OrderedDict()
+_model_sizes: dict[str, int] = {}
+_model_lock = threading.Lock()
+_model_cache_max_count: int = 32
+_model_cache_max_bytes: int = 0  # 0 means no memory ceiling
+
+# financial data version, bumped after every committed write to financial.db; read caches are keyed by it
+# the boot nonce tells versions of different processes apart, both restart from scratch on every boot;
+# the update time is seeded from the stored data at startup and only moves when a write changed data
+_data_version: int = 0
+_data_updated_at: float = time.time()
+_data_version_lock = threading.Lock()
+_boot_nonce: str = uuid.uuid4().hex[:12]
 
 # failed tickers during data ingest, used for refreshing ticker list
 _failed_tickers = []
 
+# startup pipeline state, used by the readiness endpoint
+_startup_ready: bool = False
+_startup_steps: dict[str, dict] = {}
+_startup_lock = threading.Lock()
+
 # model variables
 _input_shape = None
 _timesteps: dict[str, int] = {}
@@ -95,139 +59,26 @@ _num_features: dict[str, int] = {}
 _total_inputs: dict[str, int] = {}
 _data_type = None
 
-def get_sql_path(arg) -> Optional[str]:
-    match arg:
-        case 'create_index_price_table':
-            return sql_file_create_index_price_table
-        case 'create_stock_price_table':
-            return sql_file_create_stock_price_table
-        case 'create_index_predictions_table':
-            return sql_file_create_index_predictions_table
-        case 'create_stock_predictions_table':
-            return sql_file_create_stock_predictions_table
-        case 'create_index_statistics_table':
-            return sql_file_create_index_statistics_table
-        case 'create_stock_statistics_table':
-            return sql_file_create_stock_statistics_table
-        case 'create_stock_rank_table':
-            return sql_file_create_stock_rank_table
-        case 'create_user_table':
-            return sql_file_create_user_table
-        case 'create_bookmark_table':
-            return sql_file_create_bookmark_table
-        case 'drop_index_price_table':
-            return sql_file_drop_index_price_table
-        case 'drop_stock_price_table':
-            return sql_file_drop_stock_price_table
-        case 'drop_index_predictions_table':
-            return sql_file_drop_index_predictions_table
-        case 'drop_stock_predictions_table':
-            return sql_file_drop_stock_predictions_table
-        case 'drop_index_statistics_table':
-            return sql_file_drop_index_statistics_table
-        case 'drop_stock_statistics_table':
-            return sql_file_drop_stock_statistics_table
-        case 'drop_stock_rank_table':
-            return sql_file_drop_stock_rank_table
-        case 'select_symbol_stock_detail':
-            return sql_file_select_symbol_stock_detail
-        case 'select_table_name_financial':
-            return sql_file_select_table_name_financial
-        case 'select_last_date_index_price':
-            return sql_file_select_last_date_index_price
-        case 'select_last_wedate_index_predictions':
-            return sql_file_select_last_wedate_index_predictions
-        case 'select_last_wedate_stock_predictions':
-            return sql_file_select_last_wedate_stock_predictions
-        case 'select_last_d200edate_index_statistics':
-            return sql_file_select_last_d200edate_index_statistics
-        case 'select_last_d200edate_stock_statistics':
-            return sql_file_select_last_d200edate_stock_statistics
-        case 'select_any_date_index_price':
-            return sql_file_select_any_date_index_price
-        case 'select_any_date_stock_price':
-            return sql_file_select_any_date_stock_price
-        case 'select_last_date_stock_price':
-            return sql_file_select_last_date_stock_price
-        case 'select_last_date_stock_predictions':
-            return sql_file_select_last_date_stock_predictions
-        case 'select_all_stock_price':
-            return sql_file_select_all_stock_price
-        case 'select_all_index_price':
-            return sql_file_select_all_index_price
-        case 'select_several_stock_price':
-            return sql_file_select_several_stock_price
-        case 'select_several_index_price':
-            return sql_file_select_several_index_price
-        case 'select_several_index_statistics':
-            return sql_file_select_several_index_statistics
-        case 'select_several_stock_statistics':
-            return sql_file_select_several_stock_statistics
-        case 'select_several_index_predictions':
-            return sql_file_select_several_index_predictions
-        case 'select_several_stock_predictions':
-            return sql_file_select_several_stock_predictions
-        case 'select_several_stock_rank':
-            return sql_file_select_several_stock_rank
-        case 'select_detail_stock_detail':
-            return sql_file_select_detail_stock_detail
-        case 'select_category_stock_detail':
-            return sql_file_select_category_stock_detail
-        case 'insert_index_predictions_data':
-            return sql_file_insert_index_predictions_data
-        case 'insert_stock_predictions_data':
-            return sql_file_insert_stock_predictions_data
-        case 'insert_bookmark':
-            return sql_file_insert_bookmark
-        case 'delete_bookmark':
-            return sql_file_delete_bookmark
-        case 'select_bookmark':
-            return sql_file_select_bookmark
-        case 'insert_index_statistics_data':
-            return sql_file_insert_index_statistics_data
-        case 'insert_stock_statistics_data':
-            return sql_file_insert_stock_statistics_data
-        case 'insert_stock_rank_data':
-            return sql_file_insert_stock_rank_data
-        case 'create_notification_setting_table':
-            return sql_file_create_notification_setting_table
-        case 'select_bookmark_notify':
-            return sql_file_select_bookmark_notify
-        case 'select_emails_with_notify_bookmarks':
-            return sql_file_select_emails_with_notify_bookmarks
-        case 'select_notify_bookmarks_by_email':
-            return sql_file_select_notify_bookmarks_by_email
-        case 'update_bookmark_notify':
-            return sql_file_update_bookmark_notify
-        case 'update_notification_setting':
-            return sql_file_update_notification_setting
-        case 'insert_notification_setting':
-            return sql_file_insert_notification_setting
-        case 'delete_notification_setting':
-            return sql_file_delete_notification_setting
-        case 'delete_all_bookmarks':
-            return sql_file_delete_all_bookmarks
-        case 'select_notification_setting':
-            return sql_file_select_notification_setting
-        case _:
-            return None
-
-def set_fin_db(conn: sqlite3.Connection) -> None:
+def set_fin_db(conn: Union[ConnectionPool, sqlite3.Connection]) -> None:
     global _fin_db
     _fin_db = conn
 
 def get_fin_db() -> sqlite3.Connection:
     if _fin_db is None:
         raise RuntimeError("⚠️ fin_db is not initialized")
+    if isinstance(_fin_db, ConnectionPool):
+        return _fin_db.get()
     return _fin_db
 
-def set_user_db(conn: sqlite3.Connection) -> None:
+def set_user_db(conn: Union[ConnectionPool, sqlite3.Connection]) -> None:
     global _user_db
     _user_db = conn
 
 def get_user_db() -> sqlite3.Connection:
     if _user_db is None:
         raise RuntimeError("⚠️ user_db is not initialized")
+    if isinstance(_user_db, ConnectionPool):
+        return _user_db.get()
     return _user_db
 
 def set_tickers(tickers: List[str]) -> None:
@@ -283,12 +134,42 @@ def get_model_params(arg, symbol: str) -> Optional[str]:
         case _:
             return None
         
-def set_model(model_instance, symbol: str) -> None:
-    global _model
-    _model[symbol] = model_instance
+def set_model_cache_limits(max_count: int, max_bytes: int = 0) -> None:
+    global _model_cache_max_count, _model_cache_max_bytes
+    _model_cache_max_count = max(1, int(max_count))
+    _model_cache_max_bytes = max(0, int(max_bytes))
+
+def set_model(model_instance, symbol: str, size_bytes: int = 0) -> List[str]:
+    """Put a model in the LRU cache and evict the coldest ones over the count/memory ceiling. Returns evicted symbols."""
+    evicted = []
+    with _model_lock:
+        _model[symbol] = model_instance
+        _model.move_to_end(symbol)
+        _model_sizes[symbol] = size_bytes
+        # always keep the model just inserted, even if it alone exceeds the memory ceiling
+        while len(_model) > 1 and (len(_model) > _model_cache_max_count or (_model_cache_max_bytes and sum(_model_sizes.values()) > _model_cache_max_bytes)):
+            cold_symbol, _ = _model.popitem(last=False)
+            _model_sizes.pop(cold_symbol, None)
+            evicted.append(cold_symbol)
+    return evicted
 
 def get_model(symbol: str):
-    return _model.get(symbol)
+    """Return a cached model and mark it as recently used, or None if it is not resident."""
+    with _model_lock:
+        model_instance = _model.get(symbol)
+        if model_instance is not None:
+            _model.move_to_end(symbol)
+        return model_instance
+
+def get_model_cache_info() -> dict:
+    with _model_lock:
+        return {
+            "models": list(_model.keys()),
+            "count": len(_model),
+            "bytes": sum(_model_sizes.values()),
+            "max_count": _model_cache_max_count,
+            "max_bytes": _model_cache_max_bytes,
+        }
 
 def set_failed_tickers(tickers: List[str]) -> None:
     global _failed_tickers
@@ -296,4 +177,46 @@ def set_failed_tickers(tickers: List[str]) -> None:
 
 def get_failed_tickers() -> List[str]:
     global _failed_tickers
-    return _failed_tickers
\ No newline at end of file
+    return _failed_tickers
+
+def bump_data_version(data_changed: bool = True) -> int:
+    """Mark financial data as changed, returns the new version; data_changed=False drops read caches without moving the update time."""
+    global _data_version, _data_updated_at
+    with _data_version_lock:
+        _data_version += 1
+        if data_changed:
+            _data_updated_at = time.time()
+        return _data_version
+
+def get_data_version() -> int:
+    return _data_version
+
+def set_data_updated_at(updated_at: float) -> None:
+    # startup seed from the stored data, never moves the time back behind a write of this process
+    global _data_updated_at
+    with _data_version_lock:
+        if _data_version == 0:
+            _data_updated_at = updated_at
+
+def get_data_updated_at() -> float:
+    """Epoch timestamp of the last write that changed financial.db data, or of process start before it is seeded."""
+    return _data_updated_at
+
+def get_boot_nonce() -> str:
+    return _boot_nonce
+
+def set_startup_step_status(step: str, status: str, seconds: Optional[float] = None) -> None:
+    with _startup_lock:
+        _startup_steps[step] = {"status": status, "seconds": seconds}
+
+def get_startup_steps() -> dict:
+    """Return a copy of the per-step startup status and wall-time."""
+    with _startup_lock:
+        return {step: dict(info) for step, info in _startup_steps.items()}
+
+def set_startup_ready(ready: bool) -> None:
+    global _startup_ready
+    _startup_ready = ready
+
+def is_startup_ready() -> bool:
+    return _startup_ready
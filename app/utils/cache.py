@@ -0,0 +1,154 @@
+# app/utils/cache.py
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+from app.utils.app_state import get_boot_nonce, get_data_updated_at, get_data_version
+
+# cached responses kept across all read endpoints, least recently used are evicted first
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+# estimated memory of all cached payloads, and of one payload; larger results (e.g. full-history query-all) are served but not kept
+RESPONSE_CACHE_MAX_MB = int(os.getenv("RESPONSE_CACHE_MAX_MB", "256"))
+RESPONSE_CACHE_MAX_ENTRY_MB = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_MB", "16"))
+
+def normalize_params(params: Dict[str, Any]) -> Tuple:
+    # sorted by name, lists become tuples and None (parameter left out) is dropped, so equal queries share a key
+    return tuple((name, tuple(value) if isinstance(value, list) else value) for name, value in sorted(params.items()) if value is not None)
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory of a payload in bytes; long lists are extrapolated from their first elements."""
+    if isinstance(value, (bytes, bytearray, str)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        # keys are column names shared by every row, only the slots in the dict itself are counted for them
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        sample = value[:8]
+        if not sample:
+            return sys.getsizeof(value)
+        return sys.getsizeof(value) + len(value) * sum(estimate_size(item) for item in sample) // len(sample)
+    if hasattr(value, "memory_usage"):  # DataFrame
+        return int(value.memory_usage(deep=False).sum())
+    return sys.getsizeof(value)
+
+class ResponseCache:
+    """
+    LRU cache for read endpoint payloads, bounded by entry count and estimated bytes.
+    Entries belong to one data version; the first lookup after bump_data_version() drops them all.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int = 0, max_entry_bytes: int = 0):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(0, max_bytes)  # 0 means count ceiling only
+        self.max_entry_bytes = max(0, max_entry_bytes)  # 0 means any payload may be stored
+        self._entries: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._sizes: Dict[Tuple, int] = {}
+        self._bytes = 0
+        self._version = get_data_version()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.oversize = 0
+
+    def _sync_version(self) -> None:
+        # called with the lock held
+        version = get_data_version()
+        if version != self._version:
+            self._clear()
+            self._version = version
+
+    def _clear(self) -> None:
+        # called with the lock held
+        self._entries.clear()
+        self._sizes.clear()
+        self._bytes = 0
+
+    def get_or_compute(self, namespace: str, params: Dict[str, Any], compute: Callable[[], Any]) -> Any:
+        """Return the cached payload for (namespace, params), computing and storing it on a miss. Errors are not cached."""
+        key = (namespace, normalize_params(params))
+        with self._lock:
+            self._sync_version()
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            version = self._version
+        # computed outside the lock so slow queries do not block other endpoints
+        value = compute()
+        size = estimate_size(value)
+        if self.max_entry_bytes and size > self.max_entry_bytes:
+            with self._lock:
+                self.oversize += 1
+            return value
+        with self._lock:
+            self._sync_version()
+            if version == self._version:  # data changed while computing, the result may already be stale
+                self._bytes += size - self._sizes.get(key, 0)
+                self._entries[key] = value
+                self._sizes[key] = size
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes and len(self._entries) > 1):
+                    evicted, _ = self._entries.popitem(last=False)
+                    self._bytes -= self._sizes.pop(evicted)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "skipped_oversize": self.oversize,
+                "data_version": self._version,
+            }
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_MB * 1024 * 1024, RESPONSE_CACHE_MAX_ENTRY_MB * 1024 * 1024)
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # weak comparison as in RFC 9110, "*" matches any current representation
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+def conditional_response(request: Request, response: Response, namespace: str, params: Dict[str, Any]) -> Optional[Response]:
+    """
+    設定 ETag（資料版本 + 開機識別 + 查詢參數）與 Last-Modified（最後寫入時間），並檢查條件式請求。
+    :param request: 目前的請求
+    :param response: 端點的 Response 參數，驗證標頭會寫入其中
+    :param namespace: 端點名稱，與快取相同
+    :param params: 查詢參數
+    :return: 客戶端資料仍是最新時回傳 304 Response，否則為 None（照常查詢資料庫）
+    """
+    digest = hashlib.sha1(repr((get_boot_nonce(), get_data_version(), namespace, normalize_params(params))).encode()).hexdigest()
+    etag = f'"{digest}"'
+    updated_at = int(get_data_updated_at())  # HTTP dates have second resolution
+    headers = {"ETag": etag, "Last-Modified": formatdate(updated_at, usegmt=True), "Cache-Control": "no-cache"}
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match wins over If-Modified-Since when both are sent
+        return Response(status_code=304, headers=headers) if _etag_matches(if_none_match, etag) else None
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            if updated_at <= parsedate_to_datetime(if_modified_since).timestamp():
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass  # unparsable date, answer with the full body
+    return None
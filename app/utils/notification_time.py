@@ -0,0 +1,46 @@
+# app/utils/notification_time.py
+import calendar
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+# next_fire_at is stored as local "YYYY-MM-DD HH:MM" text, so string order is time order
+FIRE_TIME_FORMAT = "%Y-%m-%d %H:%M"
+# a fire time missed by more than this many minutes (e.g. server was down) is rescheduled without sending
+NOTIFICATION_CATCHUP_MINUTES = int(os.getenv("NOTIFICATION_CATCHUP_MINUTES", "5"))
+
+def compute_next_fire_time(frequency: str, time_of_day: str, day_of_week: Optional[str] = None, date_of_month: Optional[int] = None, now: Optional[datetime] = None) -> Optional[str]:
+    """
+    依通知設定計算 now 所在分鐘之後的下一次通知時間：daily 每天 time_of_day，weekly 每週 day_of_week 的 time_of_day，
+    monthly 每月 date_of_month 的 time_of_day，日期超過當月天數時使用當月最後一天（例如 31 日在二月為 28 或 29 日）。
+    :param frequency: "daily"、"weekly" 或 "monthly"
+    :param time_of_day: 通知時間 HH:MM
+    :param day_of_week: weekly 使用的星期，例如 "Monday"
+    :param date_of_month: monthly 使用的日期 1-31
+    :param now: 基準時間，None 表示目前時間
+    :return: "YYYY-MM-DD HH:MM"，設定不完整或無效時為 None
+    """
+    try:
+        at = datetime.strptime(time_of_day, "%H:%M")
+    except (TypeError, ValueError):
+        return None
+    if frequency == "weekly" and not day_of_week:
+        return None
+    if frequency == "monthly" and not date_of_month:
+        return None
+    if frequency not in ("daily", "weekly", "monthly"):
+        return None
+
+    now = (now or datetime.now()).replace(second=0, microsecond=0)
+    # a monthly setting repeats within 31 days of any month end, one year covers every case
+    for offset in range(367):
+        day = now.date() + timedelta(days=offset)
+        candidate = datetime(day.year, day.month, day.day, at.hour, at.minute)
+        if candidate <= now:
+            continue
+        if frequency == "weekly" and day.strftime("%A") != day_of_week:
+            continue
+        if frequency == "monthly" and day.day != min(int(date_of_month), calendar.monthrange(day.year, day.month)[1]):
+            continue
+        return candidate.strftime(FIRE_TIME_FORMAT)
+    return None
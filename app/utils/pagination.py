@@ -0,0 +1,20 @@
+# app/utils/pagination.py
+import base64
+import json
+from typing import Tuple
+
+# keyset cursor of the paged price endpoints: the (symbol, date) of the last row already returned,
+# encoded so clients treat it as an opaque token
+def encode_cursor(symbol: str, date: str) -> str:
+    raw = json.dumps([symbol, date], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: str) -> Tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        symbol, date = json.loads(raw)
+        if not isinstance(symbol, str) or not isinstance(date, str):
+            raise ValueError
+        return symbol, date
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {token}") from e
@@ -1,10 +1,110 @@
 # app/utils/pandas_helper.py
-import pandas as pd
+import os
+import re
 import sqlite3
+import time
+from functools import lru_cache
+from itertools import chain
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from app.db.statements import get_sql
+
+PRICE_COLUMNS = ["symbol", "date", "open", "high", "low", "close", "volume"]
+PRICE_TABLES = {"stock_price", "index_price"}
+
+# rows bound into one multi-row INSERT, fewer statement executions than one row per execute
+BULK_ROWS_PER_STATEMENT = int(os.getenv("BULK_ROWS_PER_STATEMENT", "200"))
+
+@lru_cache(maxsize=256)
+def _multi_row_sql(sql_template: str, n_rows: int) -> str:
+    # repeat the "VALUES (?, ...)" group n_rows times, anything after it (e.g. ON CONFLICT) is kept
+    match = re.search(r"VALUES\s*(\([^)]*\))", sql_template)
+    return sql_template[:match.start(1)] + ", ".join([match.group(1)] * n_rows) + sql_template[match.end(1):]
+
+def bulk_load_prices(df: pd.DataFrame, table: str, conn: sqlite3.Connection) -> Dict[str, object]:
+    """
+    以多列 INSERT 的 executemany 將多支股票的價格一次寫入，整批一個 transaction，每支股票一個 SAVEPOINT。
+    已存在相同 (symbol, date) 時，任一值不同即以新資料覆寫（重新下載、分割調整後的修正），相同則不寫入。
+    若連線已有未提交的 transaction，整批改在其中的 SAVEPOINT 內寫入，不會替呼叫者提交，由呼叫者 commit。
+    :param df: 長格式價格資料，欄位 symbol, date, open, high, low, close, volume，同一 symbol 的列需相鄰
+    :param table: "stock_price" 或 "index_price"
+    :param conn: SQLite 連線
+    :return: {"rows": 寫入筆數, "loaded": [symbol], "skipped": {symbol: 原因}}
+    """
+    if table not in PRICE_TABLES:
+        raise ValueError(f"Bulk loading is not supported for table {table}")
+    result = {"rows": 0, "loaded": [], "skipped": {}}
+    if df.empty:
+        return result
+    started = time.perf_counter()
+    sql_template = get_sql(f"upsert_{table}_data")
+
+    # NumPy column arrays converted to Python scalars once, sqlite3 cannot bind numpy integers
+    columns = [df[col].to_numpy() for col in PRICE_COLUMNS]
+    columns = [col.tolist() for col in columns[:2]] + [col.astype(float).tolist() for col in columns[2:6]] + [columns[6].astype(np.int64).tolist()]
+    symbols = columns[0]
+    close = df["close"].to_numpy(dtype=float)
+    # start offset of every symbol's run of rows
+    starts = np.flatnonzero(np.r_[True, df["symbol"].to_numpy()[1:] != df["symbol"].to_numpy()[:-1]])
+    ends = np.r_[starts[1:], len(df)]
+    # vectorized validation: a symbol whose closes are all zero has no valid data
+    valid = np.add.reduceat(np.abs(close), starts) > 0
+
+    # never commit a transaction the caller left open: nest the batch in a savepoint and let the caller commit
+    nested = conn.in_transaction
+    try:
+        conn.execute("SAVEPOINT bulk_load" if nested else "BEGIN")
+        for start, end, ok in zip(starts, ends, valid):
+            symbol = symbols[start]
+            if not ok:
+                result["skipped"][symbol] = "No valid data after processing"
+                continue
+            conn.execute("SAVEPOINT load_symbol")
+            changes = conn.total_changes
+            try:
+                params = list(chain.from_iterable(zip(*(col[start:end] for col in columns))))
+                width = len(PRICE_COLUMNS) * BULK_ROWS_PER_STATEMENT
+                full = len(params) // width
+                if full:
+                    conn.executemany(_multi_row_sql(sql_template, BULK_ROWS_PER_STATEMENT), (params[i * width:(i + 1) * width] for i in range(full)))
+                rest = params[full * width:]
+                if rest:
+                    conn.execute(_multi_row_sql(sql_template, len(rest) // len(PRICE_COLUMNS)), rest)
+                conn.execute("RELEASE SAVEPOINT load_symbol")
+                result["rows"] += conn.total_changes - changes  # rows actually written, unchanged duplicates are not counted
+                result["loaded"].append(symbol)
+            except sqlite3.Error as e:
+                # undo only this symbol, the rest of the batch still commits
+                conn.execute("ROLLBACK TO SAVEPOINT load_symbol")
+                conn.execute("RELEASE SAVEPOINT load_symbol")
+                result["skipped"][symbol] = str(e)
+        if nested:
+            conn.execute("RELEASE SAVEPOINT bulk_load")
+        else:
+            conn.commit()
+    except Exception:
+        if nested:
+            # undo only the batch, the caller's earlier statements stay pending
+            conn.execute("ROLLBACK TO SAVEPOINT bulk_load")
+            conn.execute("RELEASE SAVEPOINT bulk_load")
+        else:
+            conn.rollback()
+        raise
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"✅ Bulk loaded {result['rows']} rows for {len(result['loaded'])} symbols into {table} in {elapsed:.2f}s ({result['rows'] / elapsed:.0f} rows/s)")
+    for symbol, reason in result["skipped"].items():
+        print(f"⭕️ Skipping {symbol} due to error: {reason}")
+    return result
 
-def append_df(ticker, df: pd.DataFrame, table: str, conn: sqlite3.Connection, chunksize: int = 1000) -> None:
+def append_df(ticker, df: pd.DataFrame, table: str, conn: sqlite3.Connection) -> Dict[str, object]:
     # validate data
-    if df.empty or df['close'].sum() == 0:
+    if df.empty or not df['close'].to_numpy().any():
         raise ValueError(f"No valid data after processing for {ticker}")
-    df.to_sql(table, conn, if_exists="append", index=False, method="multi", chunksize=chunksize) # append to stock_price table, no index, multi insert, chunk size 1000 for large data
-    conn.commit()
+    result = bulk_load_prices(df, table, conn)
+    if ticker in result["skipped"]:
+        raise ValueError(result["skipped"][ticker])
+    return result
@@ -0,0 +1,85 @@
+# app/utils/response_format.py
+import csv
+import io
+import json
+from typing import Any, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from fastapi import HTTPException, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# format= values accepted by the /prices endpoints, records is the original list-of-dicts layout;
+# ndjson and csv are streamed from a database cursor instead of being built in memory
+RESPONSE_FORMATS = ("records", "columnar", "arrow", "ndjson", "csv")
+STREAM_FORMATS = ("ndjson", "csv")
+FORMAT_PATTERN = "^(records|columnar|arrow|ndjson|csv)$"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def frame_payload(df: pd.DataFrame, fmt: str = "records") -> Any:
+    """
+    將查詢結果 DataFrame 轉成指定格式的內容，可直接放入回應快取。
+    :param df: 查詢結果
+    :param fmt: "records"（list of dict）、"columnar"（{欄位: [值]}）或 "arrow"（Arrow IPC stream bytes）
+    :return: records/columnar 為 dict，arrow 為 bytes
+    """
+    if fmt == "arrow":
+        try:
+            import pyarrow as pa  # optional dependency, only needed for the binary format
+        except ImportError:
+            raise HTTPException(status_code=400, detail="format=arrow requires pyarrow to be installed")
+        table = pa.Table.from_pandas(df, preserve_index=False)  # reuses the numeric column buffers
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    if fmt == "columnar":
+        return {"count": len(df), "data": {col: df[col].tolist() for col in df.columns}}  # one list per column instead of one dict per row
+    result = df.to_dict(orient="records") # 將 DataFrame 轉為 JSON 格式輸出
+    return {"count": len(result), "data": result}
+
+def _carried_headers(response: Optional[Response]) -> Optional[dict]:
+    # a returned Response replaces the injected one, so carry its headers over (its content-length is for an empty body)
+    if response is None:
+        return None
+    return {key: value for key, value in response.headers.items() if key != "content-length"}
+
+def format_response(payload: Any, fmt: str = "records", response: Optional[Response] = None) -> Any:
+    """
+    依格式回傳：records 維持原本由 FastAPI 編碼的 dict，columnar 直接序列化略過逐筆編碼，arrow 為二進位串流。
+    :param payload: frame_payload 的結果
+    :param fmt: 回應格式
+    :param response: 端點的 Response 參數，其中已設定的標頭（例如 ETag）會一併帶上
+    """
+    if fmt == "records":
+        return payload
+    headers = _carried_headers(response)
+    if fmt == "arrow":
+        return Response(content=payload, media_type=ARROW_MEDIA_TYPE, headers=headers)
+    return JSONResponse(content=payload, headers=headers)
+
+def _encode_chunks(columns: List[str], chunks: Iterator[List[tuple]], fmt: str) -> Iterator[str]:
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(columns)
+        for rows in chunks:
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()  # header only, the query returned no rows
+        return
+    for rows in chunks:
+        yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows)
+
+def stream_response(result: Tuple[List[str], Iterator[List[tuple]]], fmt: str, response: Optional[Response] = None) -> StreamingResponse:
+    """
+    將 (欄位名稱, 分批 rows) 以 NDJSON 或 CSV 分段輸出，每批編碼後立即送出，不保留整個結果。
+    :param result: stream_stock_price / stream_index_price 的結果
+    :param fmt: "ndjson" 或 "csv"
+    :param response: 端點的 Response 參數，其中已設定的標頭（例如 ETag）會一併帶上
+    """
+    columns, chunks = result
+    return StreamingResponse(_encode_chunks(columns, chunks, fmt), media_type=STREAM_MEDIA_TYPES[fmt], headers=_carried_headers(response))